@@ -1,23 +1,27 @@
 import json
 from math import exp
-from time import time, sleep
 
 import requests
 
 from .errors import AuthenticationError, handle_error
+from .ratelimit import TokenBucket, shared_token_bucket
 
 
 class GazelleAPI:
   """
   Methods for interacting with Gazelle-based trackers like RED and OPS.
+
+  Requests are limited to one every `rate_limit` seconds on average, with up to `burst` sent back-to-back.
+  Pass a `rate_limiter` to share one limit between several instances and a `cache` to reuse `find_torrent`
+  responses between runs.
   """
 
-  def __init__(self, site_url, tracker_url, auth_header, rate_limit):
+  def __init__(self, site_url, tracker_url, auth_header, rate_limit, burst=1, rate_limiter=None, cache=None):
     self._s = requests.session()
     self._s.headers.update(auth_header)
-    self._rate_limit = rate_limit
+    self._rate_limiter = rate_limiter or TokenBucket.from_delay(rate_limit, burst)
     self._timeout = 15
-    self._last_used = 0
+    self.cache = cache
 
     self._max_retries = 20
     self._max_retry_time = 600
@@ -40,7 +44,17 @@ class GazelleAPI:
     return r
 
   def find_torrent(self, torrent_hash: str) -> dict:
-    return self.__get("torrent", hash=torrent_hash)
+    if self.cache is not None:
+      cached_response = self.cache.get(self.sitename, torrent_hash)
+      if cached_response is not None:
+        return cached_response
+
+    response = self.__get("torrent", hash=torrent_hash)
+
+    if self.cache is not None:
+      self.cache.set(self.sitename, torrent_hash, response)
+
+    return response
 
   @property
   def announce_url(self) -> str:
@@ -53,33 +67,33 @@ class GazelleAPI:
     current_retries = 1
 
     while current_retries <= self._max_retries:
-      now = time()
-      if (now - self._last_used) > self._rate_limit:
-        self._last_used = now
-        params["action"] = action
-
-        try:
-          response = self._s.get(self.api_url, params=params, timeout=self._timeout)
-
-          return json.loads(response.text)
-        except requests.exceptions.Timeout as e:
-          err = "Request timed out", e
-        except requests.exceptions.ConnectionError as e:
-          err = "Unable to connect", e
-        except requests.exceptions.RequestException as e:
-          err = "Request failed", f"{type(e).__name__}: {e}"
-        except json.JSONDecodeError as e:
-          err = "JSON decoding of response failed", e
-
-        handle_error(
-          description=err[0],
-          exception_details=err[1],
-          wait_time=self._retry_wait_time(current_retries),
-          extra_description=f" (attempt {current_retries}/{self._max_retries})",
-        )
-        current_retries += 1
-      else:
-        sleep(0.2)
+      self._rate_limiter.acquire()
+      params["action"] = action
+
+      try:
+        response = self._s.get(self.api_url, params=params, timeout=self._timeout)
+
+        return json.loads(response.text)
+      except requests.exceptions.Timeout as e:
+        err = "Request timed out", e
+      except requests.exceptions.ConnectionError as e:
+        err = "Unable to connect", e
+      except requests.exceptions.RequestException as e:
+        err = "Request failed", f"{type(e).__name__}: {e}"
+      except json.JSONDecodeError as e:
+        err = "JSON decoding of response failed", e
+
+      # Backing off through the rate limiter holds back every other user of the tracker too,
+      # including other fertilizer processes, rather than just this request
+      wait_time = self._retry_wait_time(current_retries)
+      self._rate_limiter.backoff(wait_time)
+      handle_error(
+        description=err[0],
+        exception_details=err[1],
+        wait_time=wait_time,
+        extra_description=f" (attempt {current_retries}/{self._max_retries})",
+      )
+      current_retries += 1
 
     handle_error(description="Maximum number of retries reached", should_raise=True)
 
@@ -94,24 +108,30 @@ class GazelleAPI:
 
 
 class OpsAPI(GazelleAPI):
-  def __init__(self, api_key, delay_in_seconds=2):
+  SITE_URL = "https://orpheus.network"
+
+  def __init__(self, api_key, delay_in_seconds=2, burst=1):
     super().__init__(
-      site_url="https://orpheus.network",
+      site_url=self.SITE_URL,
       tracker_url="https://home.opsfet.ch",
       auth_header={"Authorization": f"token {api_key}"},
       rate_limit=delay_in_seconds,
+      rate_limiter=shared_token_bucket(self.SITE_URL, delay_in_seconds, burst, account=api_key),
     )
 
     self.sitename = "OPS"
 
 
 class RedAPI(GazelleAPI):
-  def __init__(self, api_key, delay_in_seconds=2):
+  SITE_URL = "https://redacted.sh"
+
+  def __init__(self, api_key, delay_in_seconds=2, burst=1):
     super().__init__(
-      site_url="https://redacted.sh",
+      site_url=self.SITE_URL,
       tracker_url="https://flacsfor.me",
       auth_header={"Authorization": api_key},
       rate_limit=delay_in_seconds,
+      rate_limiter=shared_token_bucket(self.SITE_URL, delay_in_seconds, burst, account=api_key),
     )
 
     self.sitename = "RED"
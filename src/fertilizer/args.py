@@ -55,6 +55,36 @@ def parse_args(args=None):
     default=False,
   )
 
+  options.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    help="number of worker processes used to decode and hash torrents when scanning a directory",
+    default=1,
+  )
+
+  options.add_argument(
+    "--incremental",
+    action="store_true",
+    help="when scanning a directory, skips torrents that haven't changed since the last scan and whose outcome still holds",
+    default=False,
+  )
+
+  options.add_argument(
+    "--recheck-not-found-after",
+    type=float,
+    metavar="DAYS",
+    help="with --incremental, how many days to wait before looking up a torrent that wasn't found again. Defaults to the not_found_cache_days setting",
+    default=None,
+  )
+
+  options.add_argument(
+    "--incomplete-sources",
+    choices=["skip", "defer"],
+    help="with torrent injection enabled, skips torrents that are incomplete or missing in your torrent client before looking them up, or defers them to the end of the scan",
+    default=None,
+  )
+
   options.add_argument(
     "-v",
     "--verbose",
@@ -76,4 +106,10 @@ def parse_args(args=None):
   if parsed.server and not parsed.input_directory:
     parser.error("--server requires --input-directory")
 
+  if parsed.jobs < 1:
+    parser.error("--jobs must be at least 1")
+
+  if parsed.recheck_not_found_after is not None and parsed.recheck_not_found_after < 0:
+    parser.error("--recheck-not-found-after must not be negative")
+
   return parsed
@@ -1,10 +1,9 @@
 import json
 import base64
-import requests
 from pathlib import Path
 
 from ..filesystem import sane_join
-from ..parser import get_bencoded_data, calculate_infohash
+from ..parser import calculate_infohash_from_file
 from ..errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from .torrent_client import TorrentClient
 from requests.exceptions import RequestException
@@ -15,11 +14,13 @@ class Deluge(TorrentClient):
   ERROR_CODES = {
     "NO_AUTH": 1,
   }
+  TORRENT_INFO_FIELDS = ["name", "state", "progress", "save_path", "label", "total_remaining"]
+  # Requests that are safe to send again if a proxy fails them
+  READ_ONLY_METHODS = ("web.update_ui", "core.get_enabled_plugins", "label.get_labels")
 
-  def __init__(self, rpc_url):
-    super().__init__()
+  def __init__(self, rpc_url, pool_size=TorrentClient.DEFAULT_POOL_SIZE, retries=TorrentClient.DEFAULT_RETRIES):
+    super().__init__(pool_size, retries)
     self._rpc_url = rpc_url
-    self._deluge_cookie = None
     self._deluge_request_id = 0
     self._label_plugin_enabled = False
 
@@ -29,21 +30,16 @@ class Deluge(TorrentClient):
 
     return connection_response
 
-  def get_torrent_info(self, infohash):
-    infohash = infohash.lower()
-    params = [
-      [
-        "name",
-        "state",
-        "progress",
-        "save_path",
-        "label",
-        "total_remaining",
-      ],
-      {"hash": infohash},
-    ]
+  def get_all_torrent_info(self):
+    response = self.__wrap_request("web.update_ui", [self.TORRENT_INFO_FIELDS, {}])
+    if "torrents" not in response:
+      raise TorrentClientError("Client returned unexpected response (object missing)")
+
+    return {infohash.lower(): self.__format_torrent_info(torrent) for infohash, torrent in response["torrents"].items()}
 
-    response = self.__wrap_request("web.update_ui", params)
+  def _fetch_torrent_info(self, infohash):
+    infohash = infohash.lower()
+    response = self.__wrap_request("web.update_ui", [self.TORRENT_INFO_FIELDS, {"hash": infohash}])
     if "torrents" in response:
       torrent = response["torrents"].get(infohash)
 
@@ -52,22 +48,52 @@ class Deluge(TorrentClient):
     else:
       raise TorrentClientError("Client returned unexpected response (object missing)")
 
-    torrent_completed = (
-      (torrent["state"] == "Paused" and (torrent["progress"] == 100 or not torrent["total_remaining"]))
-      or torrent["state"] == "Seeding"
-      or torrent["progress"] == 100
-      or not torrent["total_remaining"]
+    return self.__format_torrent_info(torrent)
+
+  def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
+    _, source_torrent_info, params = self.__prepare_injection(
+      source_torrent_infohash, new_torrent_filepath, save_path_override
     )
 
-    return {
-      "complete": torrent_completed,
-      "label": torrent.get("label"),
-      "save_path": torrent["save_path"],
-      "content_path": sane_join(torrent["save_path"], torrent["name"]),
-    }
+    new_torrent_infohash = self.__wrap_request("core.add_torrent_file", params)
+    self.__label_injected_torrent(new_torrent_infohash, source_torrent_info, params)
 
-  def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
-    new_torrent_infohash = calculate_infohash(get_bencoded_data(new_torrent_filepath)).lower()
+    return new_torrent_infohash
+
+  def inject_torrents(self, injections):
+    if len(injections) <= 1:
+      return super().inject_torrents(injections)
+
+    results, prepared = self._prepare_injections(injections, self.__prepare_injection)
+    if not prepared:
+      return results
+
+    try:
+      # `core.add_torrent_files` only reports the errors it ran into, not which torrents they belong to,
+      # so when there are any the client is asked which of the torrents it now has
+      errors = self.__wrap_request("core.add_torrent_files", [[params for *_, params in prepared]])
+      if errors:
+        added_infohashes = self.__find_torrents([new_torrent_infohash for _, new_torrent_infohash, *_ in prepared])
+    except Exception as e:
+      for index, *_ in prepared:
+        results[index] = e
+      return results
+
+    for index, new_torrent_infohash, source_torrent_info, params in prepared:
+      if errors and new_torrent_infohash not in added_infohashes:
+        results[index] = TorrentClientError(f"Deluge failed to add torrent ({new_torrent_infohash}): {errors}")
+        continue
+
+      try:
+        self.__label_injected_torrent(new_torrent_infohash, source_torrent_info, params)
+        results[index] = new_torrent_infohash
+      except Exception as e:
+        results[index] = e
+
+    return results
+
+  def __prepare_injection(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
+    new_torrent_infohash = calculate_infohash_from_file(new_torrent_filepath).lower()
     new_torrent_already_exists = self.__does_torrent_exist_in_client(new_torrent_infohash)
 
     if new_torrent_already_exists:
@@ -78,21 +104,48 @@ class Deluge(TorrentClient):
     if not source_torrent_info["complete"]:
       raise TorrentClientError("Cannot inject a torrent that is not complete")
 
+    save_path = save_path_override if save_path_override else source_torrent_info["save_path"]
     params = [
       f"{Path(new_torrent_filepath).stem}.fertilizer.torrent",
       base64.b64encode(open(new_torrent_filepath, "rb").read()).decode("utf-8"),
       {
-        "download_location": save_path_override if save_path_override else source_torrent_info["save_path"],
+        "download_location": save_path,
         "seed_mode": True,
         "add_paused": False,
       },
     ]
 
-    new_torrent_infohash = self.__wrap_request("core.add_torrent_file", params)
+    return new_torrent_infohash, source_torrent_info, params
+
+  def __label_injected_torrent(self, new_torrent_infohash, source_torrent_info, params):
     newtorrent_label = self._determine_label(source_torrent_info)
     self.__set_label(new_torrent_infohash, newtorrent_label)
+    self._remember_injected_torrent(
+      new_torrent_infohash, source_torrent_info, params[2]["download_location"], newtorrent_label
+    )
 
-    return new_torrent_infohash
+  def __find_torrents(self, infohashes):
+    response = self.__wrap_request("web.update_ui", [["name"], {"id": infohashes}])
+    if "torrents" not in response:
+      raise TorrentClientError("Client returned unexpected response (object missing)")
+
+    return {infohash.lower() for infohash in response["torrents"]}
+
+  @staticmethod
+  def __format_torrent_info(torrent):
+    torrent_completed = (
+      (torrent["state"] == "Paused" and (torrent["progress"] == 100 or not torrent["total_remaining"]))
+      or torrent["state"] == "Seeding"
+      or torrent["progress"] == 100
+      or not torrent["total_remaining"]
+    )
+
+    return {
+      "complete": torrent_completed,
+      "label": torrent.get("label"),
+      "save_path": torrent["save_path"],
+      "content_path": sane_join(torrent["save_path"], torrent["name"]),
+    }
 
   def __authenticate(self):
     _href, _username, password = self._extract_credentials_from_url(self._rpc_url)
@@ -133,12 +186,11 @@ class Deluge(TorrentClient):
 
     headers = CaseInsensitiveDict()
     headers["Content-Type"] = "application/json"
-    if self._deluge_cookie:
-      headers["Cookie"] = self._deluge_cookie
 
     try:
-      response = requests.post(
+      response = self._post(
         href,
+        retry_on_status=method in self.READ_ONLY_METHODS,
         json={
           "method": method,
           "params": params,
@@ -169,7 +221,7 @@ class Deluge(TorrentClient):
 
   def __handle_response_headers(self, headers):
     if "Set-Cookie" in headers:
-      self._deluge_cookie = headers["Set-Cookie"].split(";")[0]
+      self._session.headers["Cookie"] = headers["Set-Cookie"].split(";")[0]
 
   def __does_torrent_exist_in_client(self, infohash):
     try:
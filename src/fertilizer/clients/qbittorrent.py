@@ -1,25 +1,34 @@
 import json
 import requests
 from pathlib import Path
-from requests.structures import CaseInsensitiveDict
 
 from ..utils import url_join
-from ..parser import get_bencoded_data, calculate_infohash
+from ..parser import calculate_infohash_from_file
 from ..errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from .torrent_client import TorrentClient
 
 
 class Qbittorrent(TorrentClient):
-  def __init__(self, qbit_url):
-    super().__init__()
+  # Requests that are safe to send again if a proxy fails them
+  READ_ONLY_PATHS = ("torrents/info",)
+
+  def __init__(self, qbit_url, pool_size=TorrentClient.DEFAULT_POOL_SIZE, retries=TorrentClient.DEFAULT_RETRIES):
+    super().__init__(pool_size, retries)
     self._qbit_url_parts = self._extract_credentials_from_url(qbit_url, "/api/v2")
-    self._qbit_cookie = None
 
   def setup(self):
     self.__authenticate()
     return self
 
-  def get_torrent_info(self, infohash):
+  def get_all_torrent_info(self):
+    response = self.__wrap_request("torrents/info")
+
+    if response:
+      return {torrent["hash"].lower(): self.__format_torrent_info(torrent) for torrent in json.loads(response)}
+    else:
+      raise TorrentClientError("Client returned unexpected response")
+
+  def _fetch_torrent_info(self, infohash):
     response = self.__wrap_request("torrents/info", data={"hashes": infohash})
 
     if response:
@@ -28,28 +37,48 @@ class Qbittorrent(TorrentClient):
       if not parsed_response:
         raise TorrentClientError(f"Torrent not found in client ({infohash})")
 
-      torrent = parsed_response[0]
-      torrent_completed = torrent["progress"] == 1.0 or torrent["state"] == "pausedUP" or torrent["completion_on"] > 0
-
-      return {
-        "complete": torrent_completed,
-        "label": torrent["category"],
-        "save_path": torrent["save_path"],
-        "content_path": torrent["content_path"],
-      }
+      return self.__format_torrent_info(parsed_response[0])
     else:
       raise TorrentClientError("Client returned unexpected response")
 
   def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
+    new_torrent_infohash, _, source_torrent_info, params = self.__prepare_injection(
+      source_torrent_infohash, new_torrent_filepath, save_path_override
+    )
+    (result,) = self.__add_torrents(params, [(new_torrent_infohash, new_torrent_filepath, source_torrent_info)])
+    if isinstance(result, Exception):
+      raise result
+
+    return result
+
+  def inject_torrents(self, injections):
+    results, prepared = self._prepare_injections(injections, self.__prepare_injection)
+
+    # A single `torrents/add` request takes any number of files, but they all share the same options
+    batches = {}
+    for index, new_torrent_infohash, new_torrent_filepath, source_torrent_info, params in prepared:
+      batch = batches.setdefault((params["savepath"], params["category"]), (params, []))
+      batch[1].append((index, new_torrent_infohash, new_torrent_filepath, source_torrent_info))
+
+    for params, batch in batches.values():
+      try:
+        batch_results = self.__add_torrents(params, [torrent[1:] for torrent in batch])
+      except Exception as e:
+        batch_results = [e] * len(batch)
+
+      for (index, *_), result in zip(batch, batch_results):
+        results[index] = result
+
+    return results
+
+  def __prepare_injection(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
     source_torrent_info = self.get_torrent_info(source_torrent_infohash)
-    new_torrent_infohash = calculate_infohash(get_bencoded_data(new_torrent_filepath)).lower()
+    new_torrent_infohash = calculate_infohash_from_file(new_torrent_filepath).lower()
     new_torrent_already_exists = self.__does_torrent_exist_in_client(new_torrent_infohash)
 
     if new_torrent_already_exists:
       raise TorrentExistsInClientError(f"New torrent already exists in client ({new_torrent_infohash})")
 
-    injection_filename = f"{Path(new_torrent_filepath).stem}.fertilizer.torrent"
-    torrents = {"torrents": (injection_filename, open(new_torrent_filepath, "rb"), "application/x-bittorrent")}
     params = {
       "autoTMM": False,
       "category": self._determine_label(source_torrent_info),
@@ -57,9 +86,58 @@ class Qbittorrent(TorrentClient):
       "savepath": save_path_override if save_path_override else source_torrent_info["save_path"],
     }
 
-    self.__wrap_request("torrents/add", data=params, files=torrents)
+    return new_torrent_infohash, new_torrent_filepath, source_torrent_info, params
+
+  def __add_torrents(self, params, torrents):
+    files = [
+      (
+        "torrents",
+        (
+          f"{Path(new_torrent_filepath).stem}.fertilizer.torrent",
+          Path(new_torrent_filepath).read_bytes(),
+          "application/x-bittorrent",
+        ),
+      )
+      for _, new_torrent_filepath, _ in torrents
+    ]
+
+    response = self.__wrap_request("torrents/add", data=params, files=files)
+
+    # qBittorrent answers "Fails." only if none of the torrents were added and "Ok." if any of them were,
+    # so unless a single torrent was added the client is asked which of them it now has
+    if response == "Ok." and len(torrents) == 1:
+      added_infohashes = {torrents[0][0]}
+    else:
+      added_infohashes = self.__find_torrents([new_torrent_infohash for new_torrent_infohash, *_ in torrents])
+
+    results = []
+    for new_torrent_infohash, _, source_torrent_info in torrents:
+      if new_torrent_infohash not in added_infohashes:
+        results.append(TorrentClientError(f"qBittorrent failed to add torrent ({new_torrent_infohash}): {response}"))
+        continue
+
+      self._remember_injected_torrent(new_torrent_infohash, source_torrent_info, params["savepath"], params["category"])
+      results.append(new_torrent_infohash)
+
+    return results
 
-    return new_torrent_infohash
+  def __find_torrents(self, infohashes):
+    response = self.__wrap_request("torrents/info", data={"hashes": "|".join(infohashes)})
+    if not response:
+      raise TorrentClientError("Client returned unexpected response")
+
+    return {torrent["hash"].lower() for torrent in json.loads(response)}
+
+  @staticmethod
+  def __format_torrent_info(torrent):
+    torrent_completed = torrent["progress"] == 1.0 or torrent["state"] == "pausedUP" or torrent["completion_on"] > 0
+
+    return {
+      "complete": torrent_completed,
+      "label": torrent["category"],
+      "save_path": torrent["save_path"],
+      "content_path": torrent["content_path"],
+    }
 
   def __authenticate(self):
     href, username, password = self._qbit_url_parts
@@ -72,15 +150,17 @@ class Qbittorrent(TorrentClient):
 
       # This method specifically does not use the __wrap_request method
       # because we want to avoid an infinite loop of re-authenticating
-      response = requests.post(f"{href}/auth/login", data=payload)
+      response = self._session.post(f"{href}/auth/login", data=payload)
       response.raise_for_status()
     except requests.RequestException as e:
       raise TorrentClientAuthenticationError(f"qBittorrent login failed: {e}")
 
-    self._qbit_cookie = response.cookies.get_dict().get("SID")
-    if not self._qbit_cookie:
+    qbit_cookie = response.cookies.get_dict().get("SID")
+    if not qbit_cookie:
       raise TorrentClientAuthenticationError("qBittorrent login failed: Invalid username or password")
 
+    self._session.headers["Cookie"] = f"SID={qbit_cookie}"
+
   def __wrap_request(self, path, data=None, files=None):
     try:
       return self.__request(path, data, files)
@@ -92,18 +172,13 @@ class Qbittorrent(TorrentClient):
     href, _username, _password = self._qbit_url_parts
 
     try:
-      response = requests.post(
-        url_join(href, path),
-        headers=CaseInsensitiveDict({"Cookie": f"SID={self._qbit_cookie}"}),
-        data=data,
-        files=files,
-      )
+      response = self._post(url_join(href, path), retry_on_status=path in self.READ_ONLY_PATHS, data=data, files=files)
 
       response.raise_for_status()
 
       return response.text
     except requests.RequestException as e:
-      if e.response.status_code == 403:
+      if e.response is not None and e.response.status_code == 403:
         print(e.response.text)
         raise TorrentClientAuthenticationError("Failed to authenticate with qBittorrent")
 
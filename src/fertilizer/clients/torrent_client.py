@@ -1,21 +1,198 @@
+import os
+from contextlib import contextmanager
 from urllib.parse import urlparse, unquote
 
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from fertilizer.errors import TorrentClientError, TorrentExistsInClientError
+from fertilizer.filesystem import sane_join
 from fertilizer.utils import url_join
 
 
 class TorrentClient:
-  def __init__(self):
+  DEFAULT_POOL_SIZE = 10
+  DEFAULT_RETRIES = 3
+
+  def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES):
     self.torrent_label = "fertilizer"
+    self._snapshot = None
+    self._session = self.__build_session(pool_size, retries, retry_on_status=True)
+    # Holds no state of its own: requests sent through it carry the main session's cookies, headers and auth
+    self._single_send_session = self.__build_session(pool_size, retries, retry_on_status=False)
 
   def setup(self):
     raise NotImplementedError
 
-  def get_torrent_info(self, *_args, **_kwargs):
+  def get_torrent_info(self, infohash):
+    """
+    Returns the client's details of a torrent. While a `snapshot` is open, this is a dictionary
+    lookup rather than a request to the client.
+
+    Raises:
+      `TorrentClientError`: if the torrent isn't in the client.
+    """
+
+    if self._snapshot is None:
+      return self._fetch_torrent_info(infohash)
+
+    torrent_info = self._snapshot.get(infohash.lower())
+    if torrent_info is None:
+      raise TorrentClientError(f"Torrent not found in client ({infohash})")
+
+    return torrent_info
+
+  def get_all_torrent_info(self):
+    """
+    Fetches the details of every torrent in the client with a single request.
+
+    Returns:
+      A dict of lowercase infohash -> torrent details, in the format returned by `get_torrent_info`.
+    """
+
     raise NotImplementedError
 
+  @contextmanager
+  def snapshot(self):
+    """
+    Fetches the client's whole torrent list once and answers `get_torrent_info` from it until the context exits.
+
+    Torrents injected through this client while the snapshot is open are added to it. Torrents added to the
+    client in any other way aren't seen until the next snapshot. Nested snapshots reuse the outer one.
+    """
+
+    if self._snapshot is not None:
+      yield self._snapshot
+      return
+
+    self._snapshot = self.get_all_torrent_info()
+
+    try:
+      yield self._snapshot
+    finally:
+      self._snapshot = None
+
+  def refresh_snapshot(self):
+    """
+    Re-fetches the torrent list of the open snapshot in place. Does nothing if no snapshot is open.
+    """
+
+    if self._snapshot is not None:
+      self._snapshot.update(self.get_all_torrent_info())
+
   def inject_torrent(self, *_args, **_kwargs):
     raise NotImplementedError
 
+  def inject_torrents(self, injections):
+    """
+    Injects several torrents at once. Clients that can add many torrents per request override this to do so,
+    the rest inject them one at a time.
+
+    Args:
+      `injections` (`list`): `(source_torrent_infohash, new_torrent_filepath, save_path_override)` tuples,
+        matching the arguments of `inject_torrent`.
+    Returns:
+      A list with, for each injection in order, the new torrent's infohash or the exception that stopped
+      it from being injected.
+    """
+
+    results = []
+    for injection in injections:
+      try:
+        results.append(self.inject_torrent(*injection))
+      except Exception as e:
+        results.append(e)
+
+    return results
+
+  def _fetch_torrent_info(self, *_args, **_kwargs):
+    raise NotImplementedError
+
+  def _remember_injected_torrent(self, infohash, source_torrent_info, save_path, label):
+    if self._snapshot is None:
+      return
+
+    self._snapshot[infohash.lower()] = {
+      **source_torrent_info,
+      "label": label,
+      "save_path": save_path,
+      "content_path": sane_join(save_path, os.path.basename(os.path.normpath(source_torrent_info["content_path"]))),
+    }
+
+  def _prepare_injections(self, injections, prepare):
+    """
+    Runs the per-torrent checks of a batch of injections before anything is sent to the client.
+
+    Args:
+      `injections` (`list`): As for `inject_torrents`.
+      `prepare` (`function`): Takes the arguments of one injection and returns a tuple starting with the new
+        torrent's infohash, raising if it can't be injected.
+    Returns:
+      A tuple of the `inject_torrents` results, holding the errors so far, and a list of
+      `(index, *prepared)` tuples for the injections that passed.
+    """
+
+    results = [None] * len(injections)
+    prepared = []
+    batch_infohashes = set()
+
+    for index, injection in enumerate(injections):
+      try:
+        new_torrent_infohash, *details = prepare(*injection)
+
+        if new_torrent_infohash in batch_infohashes:
+          raise TorrentExistsInClientError(f"New torrent already exists in client ({new_torrent_infohash})")
+      except Exception as e:
+        results[index] = e
+        continue
+
+      batch_infohashes.add(new_torrent_infohash)
+      prepared.append((index, new_torrent_infohash, *details))
+
+    return results, prepared
+
+  def _post(self, url, retry_on_status=False, **kwargs) -> requests.Response:
+    """
+    Sends a POST request to the client.
+
+    Requests are retried when the connection to the client couldn't be made. A proxy can answer 502 or 503
+    after the client has already acted on a request (e.g. added a torrent), so only read-only requests, which
+    set `retry_on_status`, are retried on those as well.
+    """
+
+    if retry_on_status:
+      return self._session.post(url, **kwargs)
+
+    headers = CaseInsensitiveDict(self._session.headers)
+    headers.update(kwargs.pop("headers", None) or {})
+
+    return self._single_send_session.post(
+      url, headers=headers, cookies=self._session.cookies, auth=kwargs.pop("auth", self._session.auth), **kwargs
+    )
+
+  @staticmethod
+  def __build_session(pool_size, retries, retry_on_status):
+    # Timed out reads are never retried, since the client may already have acted on the request
+    retry = Retry(
+      total=retries,
+      connect=retries,
+      read=0,
+      status=retries if retry_on_status else 0,
+      status_forcelist=(502, 503) if retry_on_status else None,
+      allowed_methods=None,
+      backoff_factor=0.5,
+      raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
   def _extract_credentials_from_url(self, url, base_path=None):
     parsed_url = urlparse(url)
     username = unquote(parsed_url.username) if parsed_url.username else ""
@@ -6,10 +6,9 @@ from http import HTTPStatus
 import requests
 
 from requests.auth import HTTPBasicAuth
-from requests.structures import CaseInsensitiveDict
 
 from ..filesystem import sane_join
-from ..parser import get_bencoded_data, calculate_infohash
+from ..parser import calculate_infohash_from_file
 from ..errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from .torrent_client import TorrentClient
 
@@ -26,47 +25,34 @@ class StatusEnum(Enum):
 
 class TransmissionBt(TorrentClient):
   X_TRANSMISSION_SESSION_ID = "X-Transmission-Session-Id"
+  TORRENT_INFO_FIELDS = ["labels", "downloadDir", "percentDone", "status", "doneDate", "name"]
+  # Requests that are safe to send again if a proxy fails them
+  READ_ONLY_METHODS = ("torrent-get",)
 
-  def __init__(self, rpc_url):
-    super().__init__()
+  def __init__(self, rpc_url, pool_size=TorrentClient.DEFAULT_POOL_SIZE, retries=TorrentClient.DEFAULT_RETRIES):
+    super().__init__(pool_size, retries)
     transmission_url_parts = self._extract_credentials_from_url(rpc_url, "transmission/rpc")
     self._base_url = transmission_url_parts[0]
-    self._basic_auth = HTTPBasicAuth(transmission_url_parts[1], transmission_url_parts[2])
-    self._transmission_session_id = None
+    self._session.auth = HTTPBasicAuth(transmission_url_parts[1], transmission_url_parts[2])
 
   def setup(self):
     self.__authenticate()
     return self
 
-  def get_torrent_info(self, infohash):
-    response = self.__wrap_request(
-      "torrent-get",
-      arguments={"fields": ["labels", "downloadDir", "percentDone", "status", "doneDate", "name"], "ids": [infohash]},
-    )
+  def get_all_torrent_info(self):
+    response = self.__wrap_request("torrent-get", arguments={"fields": [*self.TORRENT_INFO_FIELDS, "hashString"]})
+    torrents = self.__parse_torrents(response)
 
-    if response:
-      try:
-        parsed_response = json.loads(response)
-      except json.JSONDecodeError as json_parse_error:
-        raise TorrentClientError("Client returned malformed json response") from json_parse_error
-
-      if not parsed_response.get("arguments", {}).get("torrents", []):
-        raise TorrentClientError(f"Torrent not found in client ({infohash})")
-
-      torrent = parsed_response["arguments"]["torrents"][0]
-      torrent_completed = (torrent["percentDone"] == 1.0 or torrent["doneDate"] > 0) and torrent["status"] in [
-        StatusEnum.SEEDING.value,
-        StatusEnum.QUEUED_SEED.value,
-      ]
-
-      return {
-        "complete": torrent_completed,
-        "label": torrent["labels"],
-        "save_path": torrent["downloadDir"],
-        "content_path": sane_join(torrent["downloadDir"], torrent["name"]),
-      }
-    else:
-      raise TorrentClientError("Client returned unexpected response")
+    return {torrent["hashString"].lower(): self.__format_torrent_info(torrent) for torrent in torrents}
+
+  def _fetch_torrent_info(self, infohash):
+    response = self.__wrap_request("torrent-get", arguments={"fields": self.TORRENT_INFO_FIELDS, "ids": [infohash]})
+    torrents = self.__parse_torrents(response)
+
+    if not torrents:
+      raise TorrentClientError(f"Torrent not found in client ({infohash})")
+
+    return self.__format_torrent_info(torrents[0])
 
   def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
     source_torrent_info = self.get_torrent_info(source_torrent_infohash)
@@ -74,39 +60,70 @@ class TransmissionBt(TorrentClient):
     if not source_torrent_info["complete"]:
       raise TorrentClientError("Cannot inject a torrent that is not complete")
 
-    new_torrent_infohash = calculate_infohash(get_bencoded_data(new_torrent_filepath)).lower()
+    new_torrent_infohash = calculate_infohash_from_file(new_torrent_filepath).lower()
     new_torrent_already_exists = self.__does_torrent_exist_in_client(new_torrent_infohash)
     if new_torrent_already_exists:
       raise TorrentExistsInClientError(f"New torrent already exists in client ({new_torrent_infohash})")
 
+    save_path = save_path_override if save_path_override else source_torrent_info["save_path"]
     self.__wrap_request(
       "torrent-add",
       arguments={
-        "download-dir": save_path_override if save_path_override else source_torrent_info["save_path"],
+        "download-dir": save_path,
         "metainfo": base64.b64encode(open(new_torrent_filepath, "rb").read()).decode("utf-8"),
         "labels": source_torrent_info["label"],
       },
     )
+    self._remember_injected_torrent(new_torrent_infohash, source_torrent_info, save_path, source_torrent_info["label"])
 
     return new_torrent_infohash
 
+  @staticmethod
+  def __parse_torrents(response):
+    if not response:
+      raise TorrentClientError("Client returned unexpected response")
+
+    try:
+      parsed_response = json.loads(response)
+    except json.JSONDecodeError as json_parse_error:
+      raise TorrentClientError("Client returned malformed json response") from json_parse_error
+
+    return parsed_response.get("arguments", {}).get("torrents", [])
+
+  @staticmethod
+  def __format_torrent_info(torrent):
+    torrent_completed = (torrent["percentDone"] == 1.0 or torrent["doneDate"] > 0) and torrent["status"] in [
+      StatusEnum.SEEDING.value,
+      StatusEnum.QUEUED_SEED.value,
+    ]
+
+    return {
+      "complete": torrent_completed,
+      "label": torrent["labels"],
+      "save_path": torrent["downloadDir"],
+      "content_path": sane_join(torrent["downloadDir"], torrent["name"]),
+    }
+
   def __authenticate(self):
     try:
       # This method specifically does not use the __wrap_request method
       # because we want to avoid an infinite loop of re-authenticating
-      response = requests.post(self._base_url, auth=self._basic_auth)
+      response = self._session.post(self._base_url)
       # TransmissionBt returns a 409 status code if the session id is invalid
       # (which it is on your first request) and includes a new session id in the response headers.
       if response.status_code == HTTPStatus.CONFLICT:
-        self._transmission_session_id = response.headers.get(self.X_TRANSMISSION_SESSION_ID)
+        transmission_session_id = response.headers.get(self.X_TRANSMISSION_SESSION_ID)
       else:
         response.raise_for_status()
+        transmission_session_id = None
     except requests.RequestException as e:
       raise TorrentClientAuthenticationError(f"TransmissionBt login failed: {e}")
 
-    if not self._transmission_session_id:
+    if not transmission_session_id:
       raise TorrentClientAuthenticationError("TransmissionBt login failed: Invalid username or password")
 
+    self._session.headers[self.X_TRANSMISSION_SESSION_ID] = transmission_session_id
+
   def __wrap_request(self, method, arguments, files=None):
     try:
       return self.__request(method, arguments, files)
@@ -116,10 +133,9 @@ class TransmissionBt(TorrentClient):
 
   def __request(self, method, arguments=None, files=None):
     try:
-      response = requests.post(
+      response = self._post(
         self._base_url,
-        auth=self._basic_auth,
-        headers=CaseInsensitiveDict({self.X_TRANSMISSION_SESSION_ID: self._transmission_session_id}),
+        retry_on_status=method in self.READ_ONLY_METHODS,
         json={"method": method, "arguments": arguments},
         files=files,
       )
@@ -128,7 +144,7 @@ class TransmissionBt(TorrentClient):
 
       return response.text
     except requests.RequestException as e:
-      if e.response.status_code == HTTPStatus.CONFLICT:
+      if e.response is not None and e.response.status_code == HTTPStatus.CONFLICT:
         raise TorrentClientAuthenticationError("Failed to authenticate with TransmissionBt")
 
       raise TorrentClientError(f"TransmissionBt request to '{self._base_url}' for method '{method}' failed: {e}")
@@ -13,7 +13,8 @@ class Config:
     file_config = {}
     if os.path.exists(config_filepath):
       with open(config_filepath, "r", encoding="utf-8") as f:
-        file_config = {key: str(value) for key, value in json.loads(f.read()).items() if value}
+        # Only missing values are dropped, so that e.g. a 0 or false still overrides the defaults
+        file_config = {key: str(value) for key, value in json.loads(f.read()).items() if value not in (None, "")}
 
     formatted_env_vars = {
       key: value
@@ -26,6 +27,18 @@ class Config:
         "transmission_rpc_url": env_vars.get("TRANSMISSION_RPC_URL"),
         "qbittorrent_url": env_vars.get("QBITTORRENT_URL"),
         "injection_link_directory": env_vars.get("INJECTION_LINK_DIRECTORY"),
+        "not_found_cache_days": env_vars.get("NOT_FOUND_CACHE_DAYS"),
+        "client_pool_size": env_vars.get("CLIENT_POOL_SIZE"),
+        "client_retries": env_vars.get("CLIENT_RETRIES"),
+        "injection_batch_size": env_vars.get("INJECTION_BATCH_SIZE"),
+        "link_workers": env_vars.get("LINK_WORKERS"),
+        "webhook_workers": env_vars.get("WEBHOOK_WORKERS"),
+        "server_workers": env_vars.get("SERVER_WORKERS"),
+        "server_queue_size": env_vars.get("SERVER_QUEUE_SIZE"),
+        "server_timeout": env_vars.get("SERVER_TIMEOUT"),
+        "link_torrent_files_only": True
+        if env_vars.get("LINK_TORRENT_FILES_ONLY", "").lower().strip() == "true"
+        else False,
       }.items()
       if value
     }
@@ -66,3 +79,43 @@ class Config:
   @property
   def injection_link_directory(self) -> str | None:
     return self._config.get("injection_link_directory")
+
+  @property
+  def not_found_cache_days(self) -> float:
+    return self._config.get("not_found_cache_days", 7)
+
+  @property
+  def client_pool_size(self) -> int:
+    return self._config.get("client_pool_size", 10)
+
+  @property
+  def client_retries(self) -> int:
+    return self._config.get("client_retries", 3)
+
+  @property
+  def injection_batch_size(self) -> int:
+    return self._config.get("injection_batch_size", 10)
+
+  @property
+  def link_workers(self) -> int:
+    return self._config.get("link_workers", 8)
+
+  @property
+  def link_torrent_files_only(self) -> bool:
+    return self._config.get("link_torrent_files_only", False)
+
+  @property
+  def webhook_workers(self) -> int:
+    return self._config.get("webhook_workers", 2)
+
+  @property
+  def server_workers(self) -> int:
+    return self._config.get("server_workers", 8)
+
+  @property
+  def server_queue_size(self) -> int:
+    return self._config.get("server_queue_size", 64)
+
+  @property
+  def server_timeout(self) -> int:
+    return self._config.get("server_timeout", 30)
@@ -20,6 +20,16 @@ class ConfigValidator:
       "qbittorrent_url": self.__is_valid_qbit_url,
       "inject_torrents": self.__is_boolean,
       "injection_link_directory": assert_path_exists,
+      "not_found_cache_days": self.__is_non_negative_number,
+      "client_pool_size": self.__is_positive_integer,
+      "client_retries": self.__is_non_negative_integer,
+      "injection_batch_size": self.__is_positive_integer,
+      "link_workers": self.__is_positive_integer,
+      "link_torrent_files_only": self.__is_boolean,
+      "webhook_workers": self.__is_positive_integer,
+      "server_workers": self.__is_positive_integer,
+      "server_queue_size": self.__is_non_negative_integer,
+      "server_timeout": self.__is_positive_integer,
     }
 
   @staticmethod
@@ -116,6 +126,24 @@ class ConfigValidator:
       return coerced == "true"
     raise ValueError('value is not boolean ("true" or "false")')
 
+  @staticmethod
+  def __is_non_negative_number(value):
+    if re.fullmatch(r"\d+(\.\d+)?", value.strip()):
+      return float(value)
+    raise ValueError(f"Invalid number ({value}): Must be 0 or greater")
+
+  @staticmethod
+  def __is_positive_integer(value):
+    if value.strip().isdigit() and int(value) >= 1:
+      return int(value)
+    raise ValueError(f"Invalid number ({value}): Must be a whole number of 1 or greater")
+
+  @staticmethod
+  def __is_non_negative_integer(value):
+    if value.strip().isdigit():
+      return int(value)
+    raise ValueError(f"Invalid number ({value}): Must be a whole number of 0 or greater")
+
   @staticmethod
   def __is_valid_port(port):
     if port.isdigit() and 1 <= int(port) <= 65535:
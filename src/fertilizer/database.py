@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import threading
+
+
+class Database:
+  """
+  Thread-safe wrapper around the SQLite file fertilizer keeps its persistent state in.
+  """
+
+  STATE_DIRECTORY = ".fertilizer"
+  STATE_FILENAME = "state.db"
+
+  def __init__(self, filepath: str):
+    parent_dir = os.path.dirname(filepath)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    self.filepath = filepath
+    self._lock = threading.RLock()
+    self._connection = sqlite3.connect(filepath, timeout=30, check_same_thread=False)
+    self._connection.execute("PRAGMA journal_mode=WAL")
+
+  @classmethod
+  def for_directory(cls, directory: str) -> "Database":
+    """
+    Opens the state database that lives alongside the files of `directory`.
+    """
+
+    return cls(os.path.join(directory, cls.STATE_DIRECTORY, cls.STATE_FILENAME))
+
+  def execute(self, sql: str, params=()) -> list[tuple]:
+    with self._lock, self._connection:
+      return self._connection.execute(sql, params).fetchall()
+
+  def executemany(self, sql: str, rows) -> None:
+    with self._lock, self._connection:
+      self._connection.executemany(sql, rows)
+
+  def close(self) -> None:
+    with self._lock:
+      self._connection.close()
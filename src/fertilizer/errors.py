@@ -55,3 +55,7 @@ class TorrentClientAuthenticationError(Exception):
 
 class TorrentInjectionError(Exception):
   pass
+
+
+class JobQueueFullError(Exception):
+  pass
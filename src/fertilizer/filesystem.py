@@ -22,10 +22,52 @@ def assert_path_exists(path: str) -> str:
   return path
 
 
-def list_files_of_extension(input_directory: str, extension: str = ".torrent") -> list[str]:
-  return [
-    os.path.join(input_directory, filename) for filename in os.listdir(input_directory) if filename.endswith(extension)
-  ]
+def walk_files_of_extension(
+  directory: str,
+  extension: str = ".torrent",
+  excluded_directories: list[str] | None = None,
+):
+  """
+  Recursively yields the files of `directory` and its subdirectories that end with `extension`.
+
+  Files are yielded as they're found rather than collected up front, in name order within each directory.
+  The stat result comes from the `os.DirEntry`, so callers don't have to `stat` each file again.
+  Files aren't filtered by modification time: a cutoff would miss files copied in with their old mtime, so
+  incremental scans compare each file's size and mtime with the scan ledger instead.
+
+  Args:
+    `directory` (`str`): The directory to walk.
+    `extension` (`str`, optional): The file extension to match. Defaults to ".torrent".
+    `excluded_directories` (`list[str]`, optional): Directories that won't be descended into.
+  Yields:
+    Tuples of the path of each file and its `os.stat_result`.
+  """
+
+  excluded_directories = {os.path.realpath(path) for path in excluded_directories or []}
+  yield from __walk_directory(directory, extension, excluded_directories)
+
+
+def __walk_directory(directory, extension, excluded_directories):
+  if os.path.realpath(directory) in excluded_directories:
+    return
+
+  try:
+    with os.scandir(directory) as it:
+      entries = sorted(it, key=lambda entry: entry.name)
+  except (FileNotFoundError, PermissionError, NotADirectoryError):
+    return
+
+  subdirectories = []
+
+  for entry in entries:
+    # Symlinked directories aren't followed so that a link cycle can't make the walk endless
+    if entry.is_dir(follow_symlinks=False):
+      subdirectories.append(entry.path)
+    elif entry.name.endswith(extension) and entry.is_file():
+      yield entry.path, entry.stat()
+
+  for subdirectory in subdirectories:
+    yield from __walk_directory(subdirectory, extension, excluded_directories)
 
 
 def replace_extension(filepath: str, new_extension: str) -> str:
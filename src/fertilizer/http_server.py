@@ -0,0 +1,133 @@
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+from werkzeug.serving import BaseWSGIServer
+
+DEFAULT_SERVER_WORKERS = 8
+DEFAULT_SERVER_QUEUE_SIZE = 64
+DEFAULT_SERVER_TIMEOUT = 30
+
+# How long a rejected connection gets to send its request before it's closed
+REJECTION_READ_TIMEOUT = 0.1
+# Rejected connections waiting to be closed beyond this many are closed right away
+MAX_PENDING_REJECTIONS = 64
+
+__overloaded_body = json.dumps({"status": "error", "message": "Server is overloaded, try again later"}).encode()
+OVERLOADED_RESPONSE = (
+  b"HTTP/1.1 429 Too Many Requests\r\n"
+  b"Content-Type: application/json\r\n"
+  b"Content-Length: " + str(len(__overloaded_body)).encode() + b"\r\n"
+  b"Retry-After: 1\r\n"
+  b"Connection: close\r\n"
+  b"\r\n" + __overloaded_body
+)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+  """
+  A WSGI server with a bounded worker pool, built on Werkzeug's HTTP server.
+
+  The listening thread only accepts connections; each one is then handled on a fixed pool of `workers` threads.
+  At most `queue_size` accepted connections wait for a free worker, and any beyond that are answered with
+  `429 Too Many Requests` straight away instead of piling up. Connections that stay idle for
+  `connection_timeout` seconds (e.g. a client that stops sending) are closed.
+
+  Each connection serves a single request and is then closed (Werkzeug always sends `Connection: close`),
+  which suits webhook callers that make one request at a time.
+
+  `shutdown` stops accepting connections and `drain` then waits for every accepted one to be handled.
+  """
+
+  multithread = True
+
+  def __init__(
+    self,
+    host: str,
+    port: int,
+    app,
+    workers: int = DEFAULT_SERVER_WORKERS,
+    queue_size: int = DEFAULT_SERVER_QUEUE_SIZE,
+    connection_timeout: float = DEFAULT_SERVER_TIMEOUT,
+  ):
+    super().__init__(host, port, app)
+    self.workers = workers
+    self.queue_size = queue_size
+    # Not `timeout`, which `socketserver` uses as the poll timeout of `handle_request`
+    self.connection_timeout = connection_timeout
+
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fertilizer-http")
+    self._slots = threading.BoundedSemaphore(workers + queue_size)
+    # Closing a rejected connection waits for its request, which mustn't hold up accepting the next one
+    self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fertilizer-http-reject")
+    self._closing_slots = threading.BoundedSemaphore(MAX_PENDING_REJECTIONS)
+
+  def process_request(self, request, client_address):
+    if not self._slots.acquire(blocking=False):
+      self.log("warning", "Rejecting connection from %s: all workers are busy and the queue is full", client_address[0])
+      self.__reject(request)
+      return
+
+    request.settimeout(self.connection_timeout)
+
+    try:
+      self._executor.submit(self.__process_request, request, client_address)
+    except RuntimeError:
+      # The server is draining and no longer takes new work
+      self._slots.release()
+      self.shutdown_request(request)
+
+  def stop(self) -> None:
+    """
+    Makes `serve_forever` return without blocking the caller, so it can be used from a signal handler.
+    """
+
+    threading.Thread(target=self.shutdown, name="fertilizer-http-shutdown", daemon=True).start()
+
+  def drain(self) -> None:
+    """
+    Waits for every accepted connection, including queued ones, to be handled, then stops the workers.
+    """
+
+    self._executor.shutdown(wait=True)
+    self._closer.shutdown(wait=True)
+
+  def __process_request(self, request, client_address):
+    try:
+      self.finish_request(request, client_address)
+    except Exception:
+      self.handle_error(request, client_address)
+    finally:
+      self.shutdown_request(request)
+      self._slots.release()
+
+  def __reject(self, request):
+    # The response fits in a fresh socket's send buffer, so sending it never blocks the accepting thread
+    with suppress(OSError):
+      request.setblocking(False)
+      request.send(OVERLOADED_RESPONSE)
+      request.shutdown(socket.SHUT_WR)
+
+    if not self._closing_slots.acquire(blocking=False):
+      self.shutdown_request(request)
+      return
+
+    try:
+      self._closer.submit(self.__close_rejected, request)
+    except RuntimeError:
+      # The server is draining and no longer takes new work
+      self._closing_slots.release()
+      self.shutdown_request(request)
+
+  def __close_rejected(self, request):
+    try:
+      # Reading the request first means closing the connection doesn't reset it before the client gets the response
+      with suppress(OSError):
+        request.settimeout(REJECTION_READ_TIMEOUT)
+        request.recv(65536)
+
+      self.shutdown_request(request)
+    finally:
+      self._closing_slots.release()
@@ -0,0 +1,372 @@
+import os
+import threading
+from time import time_ns
+
+from .database import Database
+from .parser import (
+  ORIGIN_TRACKER_KEY_PATHS,
+  calculate_infohash_from_bytes,
+  get_bencoded_values,
+  get_origin_tracker,
+  get_source,
+)
+
+
+class InfohashIndex:
+  """
+  Persistent index of the .torrent files in a directory, keyed by infohash.
+
+  Each file is recorded with its size, mtime, infohash, origin tracker and source flag. A file is only
+  decoded again when its size or mtime changes. A directory is only listed again when its own mtime changes
+  (i.e. files were added, removed or renamed); otherwise just the files already known in it are `stat`ed,
+  which still catches files rewritten in place. Refreshing an unchanged tree therefore never decodes anything.
+  Behaves like a read-only `dict` of infohash -> filepath for lookups.
+  """
+
+  # Directory mtimes this close to "now" may still change within the same timestamp tick,
+  # so they're never trusted as a sign that the directory is unchanged.
+  RACY_MTIME_WINDOW_NS = 2_000_000_000
+
+  def __init__(self, directory: str, extension: str = ".torrent", database: Database | None = None):
+    self.directory = directory
+    self.extension = extension
+    self._db = database or Database.for_directory(directory)
+    self.__create_tables()
+
+  def refresh(self) -> "InfohashIndex":
+    """
+    Brings the index in line with the files on disk.
+
+    Returns:
+      The index itself, for chaining.
+    """
+
+    self.__sync_directory("")
+    return self
+
+  def get(self, infohash: str, default=None) -> str | None:
+    rows = self._db.execute("SELECT path FROM infohash_index WHERE infohash = ? LIMIT 1", (infohash,))
+    if not rows:
+      return default
+
+    filepath = self.__absolute_path(rows[0][0])
+    if not os.path.exists(filepath):
+      self._db.execute("DELETE FROM infohash_index WHERE path = ?", (rows[0][0],))
+      return default
+
+    return filepath
+
+  def __contains__(self, infohash: str) -> bool:
+    return self.get(infohash) is not None
+
+  def __getitem__(self, infohash: str) -> str:
+    filepath = self.get(infohash)
+    if filepath is None:
+      raise KeyError(infohash)
+
+    return filepath
+
+  def __setitem__(self, infohash: str, filepath: str) -> None:
+    _, tracker, source = self.__describe_file(filepath)
+    self.add(infohash, filepath, tracker, source)
+
+  def add(self, infohash: str, filepath: str, tracker: str | None, source: str | None) -> None:
+    """
+    Records a torrent file whose details are already known (e.g. one that was just written), without reading it.
+
+    Args:
+      `infohash` (`str`): The torrent's infohash.
+      `filepath` (`str`): The path of the file. Files outside the indexed directory are ignored.
+      `tracker` (`str`): The short name of the torrent's origin tracker (e.g. "OPS").
+      `source` (`str`): The torrent's source flag.
+    """
+
+    relative_path = os.path.relpath(filepath, self.directory)
+    if relative_path.startswith(os.pardir):
+      return
+
+    stat = os.stat(filepath)
+    self.__upsert(
+      [(relative_path, os.path.dirname(relative_path), stat.st_size, stat.st_mtime_ns, infohash, tracker, source)]
+    )
+
+  def __len__(self) -> int:
+    return self._db.execute("SELECT COUNT(*) FROM infohash_index WHERE infohash IS NOT NULL")[0][0]
+
+  def items(self) -> list[tuple[str, str]]:
+    rows = self._db.execute("SELECT infohash, path FROM infohash_index WHERE infohash IS NOT NULL")
+    return [(infohash, self.__absolute_path(path)) for infohash, path in rows]
+
+  def close(self) -> None:
+    self._db.close()
+
+  def __create_tables(self):
+    self._db.execute(
+      """
+      CREATE TABLE IF NOT EXISTS infohash_index (
+        path TEXT PRIMARY KEY,
+        directory TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        infohash TEXT,
+        tracker TEXT,
+        source TEXT
+      )
+      """
+    )
+    self._db.execute("CREATE INDEX IF NOT EXISTS infohash_index_infohash ON infohash_index (infohash)")
+    self._db.execute("CREATE INDEX IF NOT EXISTS infohash_index_directory ON infohash_index (directory)")
+    self._db.execute(
+      """
+      CREATE TABLE IF NOT EXISTS infohash_index_directories (
+        path TEXT PRIMARY KEY,
+        parent TEXT,
+        mtime_ns INTEGER
+      )
+      """
+    )
+
+  def __sync_directory(self, relative_dir):
+    absolute_dir = self.__absolute_path(relative_dir)
+
+    try:
+      mtime_ns = os.stat(absolute_dir).st_mtime_ns
+    except FileNotFoundError:
+      self.__forget_directory(relative_dir)
+      return
+
+    known = self._db.execute("SELECT mtime_ns FROM infohash_index_directories WHERE path = ?", (relative_dir,))
+
+    if known and known[0][0] == mtime_ns:
+      self.__recheck_known_files(relative_dir)
+      rows = self._db.execute("SELECT path FROM infohash_index_directories WHERE parent = ?", (relative_dir,))
+      subdirectories = [row[0] for row in rows]
+    else:
+      subdirectories = self.__rescan_directory(relative_dir, absolute_dir, mtime_ns)
+
+    for subdirectory in subdirectories:
+      self.__sync_directory(subdirectory)
+
+  def __recheck_known_files(self, relative_dir):
+    # Rewriting a file in place doesn't touch its directory's mtime, so known files are checked one by one
+    removed_files = []
+    changed_rows = []
+
+    for path, size, mtime in self._db.execute(
+      "SELECT path, size, mtime_ns FROM infohash_index WHERE directory = ?", (relative_dir,)
+    ):
+      absolute_path = self.__absolute_path(path)
+
+      try:
+        stat = os.stat(absolute_path)
+      except FileNotFoundError:
+        removed_files.append((path,))
+        continue
+
+      if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+        infohash, tracker, source = self.__describe_file(absolute_path)
+        changed_rows.append((path, relative_dir, stat.st_size, stat.st_mtime_ns, infohash, tracker, source))
+
+    self._db.executemany("DELETE FROM infohash_index WHERE path = ?", removed_files)
+    self.__upsert(changed_rows)
+
+  def __rescan_directory(self, relative_dir, absolute_dir, mtime_ns):
+    known_files = {
+      path: (size, mtime)
+      for path, size, mtime in self._db.execute(
+        "SELECT path, size, mtime_ns FROM infohash_index WHERE directory = ?", (relative_dir,)
+      )
+    }
+    seen_files = set()
+    subdirectories = []
+    changed_rows = []
+
+    with os.scandir(absolute_dir) as entries:
+      for entry in entries:
+        relative_path = os.path.join(relative_dir, entry.name)
+
+        if entry.is_dir():
+          if entry.name != Database.STATE_DIRECTORY:
+            subdirectories.append(relative_path)
+        elif entry.is_file() and entry.name.endswith(self.extension):
+          stat = entry.stat()
+          seen_files.add(relative_path)
+
+          if known_files.get(relative_path) != (stat.st_size, stat.st_mtime_ns):
+            infohash, tracker, source = self.__describe_file(entry.path)
+            changed_rows.append(
+              (relative_path, relative_dir, stat.st_size, stat.st_mtime_ns, infohash, tracker, source)
+            )
+
+    removed_files = [(path,) for path in known_files if path not in seen_files]
+    self._db.executemany("DELETE FROM infohash_index WHERE path = ?", removed_files)
+    self.__upsert(changed_rows)
+
+    known_subdirectories = self._db.execute(
+      "SELECT path FROM infohash_index_directories WHERE parent = ?", (relative_dir,)
+    )
+    for (known_subdirectory,) in known_subdirectories:
+      if known_subdirectory not in subdirectories:
+        self.__forget_directory(known_subdirectory)
+
+    self._db.executemany(
+      "INSERT OR IGNORE INTO infohash_index_directories (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+      [(subdirectory, relative_dir) for subdirectory in subdirectories],
+    )
+    self._db.execute(
+      "INSERT OR REPLACE INTO infohash_index_directories (path, parent, mtime_ns) VALUES (?, ?, ?)",
+      (relative_dir, os.path.dirname(relative_dir) if relative_dir else None, self.__trusted_mtime(mtime_ns)),
+    )
+
+    return subdirectories
+
+  def __forget_directory(self, relative_dir):
+    prefix = os.path.join(relative_dir, "")
+
+    self._db.execute(
+      "DELETE FROM infohash_index WHERE directory = ? OR substr(directory, 1, ?) = ?",
+      (relative_dir, len(prefix), prefix),
+    )
+    self._db.execute(
+      "DELETE FROM infohash_index_directories WHERE path = ? OR substr(path, 1, ?) = ?",
+      (relative_dir, len(prefix), prefix),
+    )
+
+  def __upsert(self, rows):
+    self._db.executemany(
+      """
+      INSERT OR REPLACE INTO infohash_index (path, directory, size, mtime_ns, infohash, tracker, source)
+      VALUES (?, ?, ?, ?, ?, ?, ?)
+      """,
+      rows,
+    )
+
+  def __absolute_path(self, relative_path):
+    return os.path.join(self.directory, relative_path) if relative_path else self.directory
+
+  def __trusted_mtime(self, mtime_ns):
+    return mtime_ns if (time_ns() - mtime_ns) > self.RACY_MTIME_WINDOW_NS else None
+
+  @staticmethod
+  def __describe_file(filepath):
+    # Files that can't be decoded are still recorded (without an infohash)
+    # so they aren't re-read on every refresh
+    try:
+      with open(filepath, "rb") as f:
+        data = f.read()
+
+      infohash = calculate_infohash_from_bytes(data)
+      torrent_data = get_bencoded_values(data, ORIGIN_TRACKER_KEY_PATHS)
+      tracker = get_origin_tracker(torrent_data)
+      source = get_source(torrent_data)
+    except Exception:
+      return None, None, None
+
+    return (
+      infohash,
+      tracker.site_shortname() if tracker else None,
+      bytes(source).decode("utf-8", errors="replace") if source is not None else None,
+    )
+
+
+class MemoryInfohashIndex(dict):
+  """
+  A plain `dict` of infohash -> filepath with the same `add` as `InfohashIndex`, for lookups that don't need to
+  persist (e.g. a single torrent generated without an output directory index).
+  """
+
+  def add(self, infohash: str, filepath: str, tracker: str | None, source: str | None) -> None:
+    self[infohash] = filepath
+
+
+class ResidentInfohashIndex:
+  """
+  In-memory copy of an `InfohashIndex`, for long-running processes like the webhook server.
+
+  Lookups are plain dictionary reads instead of database queries. Adding a torrent updates the persistent
+  index and the in-memory copy under one lock, so a lookup never sees one without the other. A background
+  thread refreshes the persistent index from disk every `reconcile_interval` seconds and swaps in a fresh
+  copy, which picks up files that were added or removed by anything else.
+  Behaves like a `dict` of infohash -> filepath, the same as `InfohashIndex`.
+  """
+
+  DEFAULT_RECONCILE_INTERVAL = 300
+
+  def __init__(self, index: InfohashIndex, reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL):
+    self.index = index
+    self.reconcile_interval = reconcile_interval
+
+    self._entries = {}
+    self._lock = threading.Lock()
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self) -> "ResidentInfohashIndex":
+    """
+    Loads the index and starts reconciling it in the background.
+
+    Returns:
+      The index itself, for chaining.
+    """
+
+    self.reconcile()
+    self._thread = threading.Thread(target=self.__reconcile_periodically, name="fertilizer-index", daemon=True)
+    self._thread.start()
+
+    return self
+
+  def stop(self) -> None:
+    self._stopped.set()
+    if self._thread:
+      self._thread.join()
+
+  def reconcile(self) -> None:
+    """
+    Brings the index in line with the files on disk.
+    """
+
+    # The (slow) refresh runs outside the lock so lookups carry on meanwhile. Only reading the result
+    # and swapping it in is locked, so a torrent added during the refresh isn't lost by the swap.
+    self.index.refresh()
+
+    with self._lock:
+      self._entries = dict(self.index.items())
+
+  def get(self, infohash: str, default=None) -> str | None:
+    filepath = self._entries.get(infohash)
+    # Files removed since the last reconcile are missed rather than returned
+    if filepath is None or not os.path.exists(filepath):
+      return default
+
+    return filepath
+
+  def __contains__(self, infohash: str) -> bool:
+    return self.get(infohash) is not None
+
+  def __getitem__(self, infohash: str) -> str:
+    filepath = self.get(infohash)
+    if filepath is None:
+      raise KeyError(infohash)
+
+    return filepath
+
+  def __setitem__(self, infohash: str, filepath: str) -> None:
+    with self._lock:
+      self.index[infohash] = filepath
+      self._entries[infohash] = filepath
+
+  def add(self, infohash: str, filepath: str, tracker: str | None, source: str | None) -> None:
+    with self._lock:
+      self.index.add(infohash, filepath, tracker, source)
+      self._entries[infohash] = filepath
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __reconcile_periodically(self):
+    while not self._stopped.wait(self.reconcile_interval):
+      try:
+        self.reconcile()
+      except Exception:
+        # A failed reconcile leaves the previous copy in place until the next attempt
+        pass
@@ -1,12 +1,33 @@
 import os
-import shutil
+import threading
 
 from .clients.deluge import Deluge
 from .clients.qbittorrent import Qbittorrent
 from .clients.transmission import TransmissionBt
 from .config import Config
 from .errors import TorrentInjectionError
-from .parser import calculate_infohash, get_bencoded_data
+from .linker import Linker, LinkStats
+from .parser import FILE_MANIFEST_KEY_PATHS, calculate_infohash_from_bytes, get_bencoded_values, get_file_manifest
+
+
+class ClientInfohashes:
+  """
+  Set-like view of the torrents in a torrent client that asks the client about each infohash as it's checked.
+
+  This suits single torrents (e.g. a webhook), where fetching the client's whole torrent list isn't worth it. Infohashes
+  the client can't be asked about count as missing, so a failing client never stops a torrent from being looked up.
+  """
+
+  def __init__(self, client):
+    self.client = client
+
+  def __contains__(self, infohash) -> bool:
+    try:
+      self.client.get_torrent_info(infohash)
+    except Exception:
+      return False
+
+    return True
 
 
 class Injection:
@@ -14,24 +35,106 @@ class Injection:
     self.config = self.__validate_config(config)
     self.linking_directory = config.injection_link_directory
     self.client = self.__determine_torrent_client(config)
+    self.batch_size = config.injection_batch_size
+    self.linker = Linker(config.link_workers)
+    self.link_stats = LinkStats()
+    self.link_torrent_files_only = config.link_torrent_files_only
+    self._queue = []
+    self._queue_lock = threading.Lock()
 
   def setup(self):
     self.client.setup()
     return self
 
+  def snapshot(self):
+    """
+    Context manager that holds a snapshot of the torrent client's torrents so that the injections made
+    within it don't each have to query the client. See `TorrentClient.snapshot`.
+    """
+
+    return self.client.snapshot()
+
+  def client_infohashes(self) -> ClientInfohashes:
+    """
+    Returns a set-like view of the infohashes in the torrent client, to recognise torrents that are already in it
+    before any tracker API call is spent on them.
+    """
+
+    return ClientInfohashes(self.client)
+
+  def refresh_snapshot(self):
+    self.client.refresh_snapshot()
+
   def inject_torrent(self, source_torrent_filepath, new_torrent_filepath, new_tracker):
-    source_torrent_data = get_bencoded_data(source_torrent_filepath)
-    source_torrent_file_or_dir = self.__determine_source_torrent_data_location(source_torrent_data)
-    output_location = self.__determine_output_location(source_torrent_file_or_dir, new_tracker)
-    self.__link_files_to_output_location(source_torrent_file_or_dir, output_location)
-    output_parent_directory = os.path.dirname(os.path.normpath(output_location))
+    source_torrent_infohash, output_parent_directory = self.__link_torrent_data(source_torrent_filepath, new_tracker)
 
     return self.client.inject_torrent(
-      calculate_infohash(source_torrent_data),
+      source_torrent_infohash,
       new_torrent_filepath,
       save_path_override=output_parent_directory,
     )
 
+  def queue_torrent(self, source_torrent_filepath, new_torrent_filepath, new_tracker, key=None) -> list[tuple]:
+    """
+    Links the torrent's data right away and queues the torrent to be added to the client together with others.
+    Once `batch_size` torrents are queued they're all sent to the client, using as few requests as it allows.
+
+    Args:
+      `source_torrent_filepath` (`str`): The path to the source .torrent file.
+      `new_torrent_filepath` (`str`): The path to the .torrent file to inject.
+      `new_tracker` (`str`): The shortname of the tracker the new torrent is for.
+      `key` (optional): Passed back with the torrent's result to tell the results apart.
+    Returns:
+      The results of the batch sent by this call, if any. See `flush`.
+    Raises:
+      The errors of `inject_torrent` that come up before the client is asked to add the torrent.
+    """
+
+    source_torrent_infohash, output_parent_directory = self.__link_torrent_data(source_torrent_filepath, new_tracker)
+
+    with self._queue_lock:
+      self._queue.append((key, (source_torrent_infohash, new_torrent_filepath, output_parent_directory)))
+
+      if len(self._queue) < self.batch_size:
+        return []
+
+      batch, self._queue = self._queue, []
+
+    return self.__inject_batch(batch)
+
+  def flush(self) -> list[tuple]:
+    """
+    Sends every queued torrent to the client.
+
+    Returns:
+      A list of `(key, result)` tuples, one per torrent, where `result` is either the new torrent's infohash
+      or the exception that stopped it from being injected.
+    """
+
+    with self._queue_lock:
+      batch, self._queue = self._queue, []
+
+    return self.__inject_batch(batch)
+
+  def __inject_batch(self, batch):
+    if not batch:
+      return []
+
+    results = self.client.inject_torrents([injection for _, injection in batch])
+    return [(key, result) for (key, _), result in zip(batch, results)]
+
+  def __link_torrent_data(self, source_torrent_filepath, new_tracker):
+    with open(source_torrent_filepath, "rb") as f:
+      source_torrent_data = f.read()
+
+    source_torrent_infohash = calculate_infohash_from_bytes(source_torrent_data)
+    source_torrent_file_or_dir = self.__determine_source_torrent_data_location(source_torrent_infohash)
+    output_location = self.__determine_output_location(source_torrent_file_or_dir, new_tracker)
+    manifest = self.__determine_file_manifest(source_torrent_data)
+    self.__link_files_to_output_location(source_torrent_file_or_dir, output_location, manifest)
+
+    return source_torrent_infohash, os.path.dirname(os.path.normpath(output_location))
+
   @staticmethod
   def __validate_config(config: Config):
     if not config.inject_torrents:
@@ -47,16 +150,18 @@ class Injection:
 
   @staticmethod
   def __determine_torrent_client(config: Config):
+    session_options = {"pool_size": config.client_pool_size, "retries": config.client_retries}
+
     if config.deluge_rpc_url:
-      return Deluge(config.deluge_rpc_url)
+      return Deluge(config.deluge_rpc_url, **session_options)
     elif config.transmission_rpc_url:
-      return TransmissionBt(config.transmission_rpc_url)
+      return TransmissionBt(config.transmission_rpc_url, **session_options)
     elif config.qbittorrent_url:
-      return Qbittorrent(config.qbittorrent_url)
+      return Qbittorrent(config.qbittorrent_url, **session_options)
 
   # If the torrent is a single bare file, this returns the path _to that file_
   # If the torrent is one or many files in a directory, this returns the topmost directory path
-  def __determine_source_torrent_data_location(self, torrent_data):
+  def __determine_source_torrent_data_location(self, infohash):
     # Note on torrent file structures:
     # --------
     # From my testing, all torrents have a `name` stored at `[b"info"][b"name"]`. This appears to always
@@ -76,7 +181,6 @@ class Injection:
     # directory (which in our case is the `name`).
     #
     # See also: https://en.wikipedia.org/wiki/Torrent_file#File_struct
-    infohash = calculate_infohash(torrent_data)
     torrent_info_from_client = self.client.get_torrent_info(infohash)
     proposed_torrent_data_location = torrent_info_from_client["content_path"]
 
@@ -93,14 +197,17 @@ class Injection:
 
     return os.path.join(tracker_output_directory, os.path.basename(source_torrent_file_or_dir))
 
-  @staticmethod
-  def __link_files_to_output_location(source_torrent_file_or_dir, output_location):
-    if os.path.exists(output_location):
-      raise TorrentInjectionError(f"Cannot link given torrent since it's already been linked: {output_location}")
-
-    if os.path.isfile(source_torrent_file_or_dir):
-      os.link(source_torrent_file_or_dir, output_location)
-    elif os.path.isdir(source_torrent_file_or_dir):
-      shutil.copytree(source_torrent_file_or_dir, output_location, copy_function=os.link)
+  # Only the files the torrent lists are linked, leaving out anything else that was added to
+  # the torrent's directory (artwork, logs, etc.), which the torrent client would never look at
+  def __determine_file_manifest(self, source_torrent_data):
+    if not self.link_torrent_files_only:
+      return None
+
+    return get_file_manifest(get_bencoded_values(source_torrent_data, FILE_MANIFEST_KEY_PATHS))
+
+  # Whatever is already linked at the output location (e.g. by an earlier, interrupted run) is kept
+  # and only the missing files are linked
+  def __link_files_to_output_location(self, source_torrent_file_or_dir, output_location, manifest=None):
+    self.link_stats.add(self.linker.link(source_torrent_file_or_dir, output_location, manifest))
 
     return output_location
@@ -0,0 +1,147 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from .errors import JobQueueFullError
+
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_MAX_PENDING_JOBS = 1000
+DEFAULT_MAX_FINISHED_JOBS = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class Job:
+  """
+  A unit of work queued on a `JobQueue`, along with its status and, once done, its result or error.
+  """
+
+  def __init__(self, func, args):
+    self.id = uuid.uuid4().hex
+    self.status = QUEUED
+    self.result = None
+    self.error = None
+    self.created_at = time()
+    self.started_at = None
+    self.finished_at = None
+
+    self._func = func
+    self._args = args
+    self._done = threading.Event()
+
+  @property
+  def done(self) -> bool:
+    return self._done.is_set()
+
+  def wait(self, timeout: float | None = None) -> bool:
+    """
+    Blocks until the job is done or `timeout` seconds have passed.
+
+    Returns:
+      `True` if the job is done.
+    """
+
+    return self._done.wait(timeout)
+
+  def to_dict(self) -> dict:
+    return {
+      "id": self.id,
+      "status": self.status,
+      "created_at": self.created_at,
+      "started_at": self.started_at,
+      "finished_at": self.finished_at,
+    }
+
+  def _run(self):
+    self.status = RUNNING
+    self.started_at = time()
+
+    try:
+      self.result = self._func(*self._args)
+      self.status = FINISHED
+    except Exception as e:
+      self.error = e
+      self.status = FAILED
+    finally:
+      self.finished_at = time()
+      self._done.set()
+
+
+class JobQueue:
+  """
+  Runs jobs in the background on a fixed number of worker threads and keeps them around to be looked up by id.
+
+  At most `max_pending` jobs may be waiting or running at once; submitting more raises `JobQueueFullError`
+  rather than letting the backlog grow without limit. Only the latest `max_finished` finished jobs are kept.
+  """
+
+  def __init__(
+    self,
+    workers: int = DEFAULT_JOB_WORKERS,
+    max_pending: int = DEFAULT_MAX_PENDING_JOBS,
+    max_finished: int = DEFAULT_MAX_FINISHED_JOBS,
+  ):
+    self.workers = workers
+    self.max_pending = max_pending
+    self.max_finished = max_finished
+
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fertilizer-job")
+    self._jobs = {}
+    self._finished_ids = OrderedDict()
+    self._pending_count = 0
+    self._lock = threading.Lock()
+
+  def submit(self, func, *args) -> Job:
+    """
+    Queues `func(*args)` to run on a worker thread.
+
+    Returns:
+      The queued `Job`.
+    Raises:
+      `JobQueueFullError`: if `max_pending` jobs are already waiting or running.
+    """
+
+    job = Job(func, args)
+
+    with self._lock:
+      if self._pending_count >= self.max_pending:
+        raise JobQueueFullError(f"Too many queued jobs (limit is {self.max_pending}), try again later")
+
+      self._pending_count += 1
+      self._jobs[job.id] = job
+
+    self._executor.submit(self.__run, job)
+
+    return job
+
+  def get(self, job_id: str) -> Job | None:
+    with self._lock:
+      return self._jobs.get(job_id)
+
+  @property
+  def pending_count(self) -> int:
+    with self._lock:
+      return self._pending_count
+
+  def shutdown(self, wait: bool = True) -> None:
+    """
+    Stops accepting work. With `wait`, blocks until every queued job has run.
+    """
+
+    self._executor.shutdown(wait=wait)
+
+  def __run(self, job):
+    job._run()
+
+    with self._lock:
+      self._pending_count -= 1
+      self._finished_ids[job.id] = None
+
+      while len(self._finished_ids) > self.max_finished:
+        expired_id, _ = self._finished_ids.popitem(last=False)
+        self._jobs.pop(expired_id, None)
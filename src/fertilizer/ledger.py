@@ -0,0 +1,101 @@
+import os
+from collections import namedtuple
+from time import time
+
+from .database import Database
+
+GENERATED = "generated"
+ALREADY_EXISTS = "already_exists"
+NOT_FOUND = "not_found"
+SKIPPED = "skipped"
+ERROR = "error"
+INCOMPLETE = "incomplete"
+
+# Outcomes that won't change unless the file itself does. Errors and incomplete sources are always
+# retried and not found torrents are re-checked once they're old enough.
+FINAL_OUTCOMES = (GENERATED, ALREADY_EXISTS, SKIPPED)
+# Outcomes with a torrent that still has to be injected if the scan that recorded them didn't inject it
+INJECTABLE_OUTCOMES = (GENERATED, ALREADY_EXISTS)
+
+LedgerEntry = namedtuple(
+  "LedgerEntry", ["size", "mtime_ns", "infohash", "outcome", "scanned_at", "injected"], defaults=(False,)
+)
+
+
+class ScanLedger:
+  """
+  Persistent record of the outcome of the last scan of each input torrent, keyed by path.
+
+  Alongside the outcome each entry stores the file's size, mtime and infohash, so a later scan can tell
+  whether the file changed and reuse its infohash instead of reading it again, and whether the scan
+  injected the torrent into a client.
+  """
+
+  def __init__(self, database: Database):
+    self._db = database
+    self.__create_tables()
+
+  def entries(self) -> dict[str, LedgerEntry]:
+    rows = self._db.execute("SELECT path, size, mtime_ns, infohash, outcome, scanned_at, injected FROM scan_ledger")
+    return {row[0]: LedgerEntry(*row[1:6], bool(row[6])) for row in rows}
+
+  def record(self, filepath: str, outcome: str, infohash: str | None = None, injected: bool = False) -> None:
+    try:
+      stat = os.stat(filepath)
+    except OSError:
+      return
+
+    self._db.execute(
+      """
+      INSERT OR REPLACE INTO scan_ledger (path, size, mtime_ns, infohash, outcome, scanned_at, injected)
+      VALUES (?, ?, ?, ?, ?, ?, ?)
+      """,
+      (filepath, stat.st_size, stat.st_mtime_ns, infohash, outcome, time(), int(injected)),
+    )
+
+  @staticmethod
+  def is_unchanged(entry: LedgerEntry, stat: os.stat_result) -> bool:
+    return entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns
+
+  @staticmethod
+  def is_settled(entry: LedgerEntry, not_found_recheck_age: float, injecting: bool = False) -> bool:
+    """
+    Checks whether a file's last outcome still holds, assuming the file hasn't changed since.
+
+    Args:
+      `entry` (`LedgerEntry`): The ledger entry of the file.
+      `not_found_recheck_age` (`float`): How many seconds a not found outcome holds for.
+      `injecting` (`bool`, optional): Whether this scan injects torrents. If so, torrents that were generated
+        by a scan that didn't inject them aren't settled yet. Defaults to False.
+    Returns:
+      `True` if the file doesn't need to be scanned again.
+    """
+
+    if injecting and entry.outcome in INJECTABLE_OUTCOMES and not entry.injected:
+      return False
+    if entry.outcome in FINAL_OUTCOMES:
+      return True
+    if entry.outcome == NOT_FOUND:
+      return time() - entry.scanned_at < not_found_recheck_age
+
+    return False
+
+  def __create_tables(self):
+    self._db.execute(
+      """
+      CREATE TABLE IF NOT EXISTS scan_ledger (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        infohash TEXT,
+        outcome TEXT NOT NULL,
+        scanned_at REAL NOT NULL,
+        injected INTEGER NOT NULL DEFAULT 0
+      )
+      """
+    )
+
+    # Ledgers from before injections were recorded count as not injected
+    columns = [row[1] for row in self._db.execute("PRAGMA table_info(scan_ledger)")]
+    if "injected" not in columns:
+      self._db.execute("ALTER TABLE scan_ledger ADD COLUMN injected INTEGER NOT NULL DEFAULT 0")
@@ -0,0 +1,216 @@
+import os
+import shutil
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import suppress
+from pathlib import Path
+from time import monotonic
+
+from .errors import TorrentInjectionError
+
+DEFAULT_LINK_WORKERS = 8
+
+LinkResult = namedtuple("LinkResult", ["link_count", "elapsed", "existing_count"], defaults=[0])
+
+
+class Linker:
+  """
+  Hardlinks torrent data (a single file or a whole directory tree) to a new location.
+
+  The directory skeleton is created first and the files are then linked from a thread pool, so filesystems
+  with a high per-call latency (e.g. network storage) work on many links at once instead of one after another.
+  If anything fails part way, every file and directory created so far is removed again before the error is raised.
+
+  Linking is idempotent: files that are already hardlinked at the destination (same device and inode as the
+  source) are left as they are, so re-running an interrupted link only creates the missing files.
+  """
+
+  def __init__(self, workers: int = DEFAULT_LINK_WORKERS):
+    self.workers = workers
+
+  def link(self, source: str, destination: str, manifest: list[tuple[str, int]] | None = None) -> LinkResult:
+    """
+    Links `source` to `destination`, skipping anything that's already linked there.
+
+    Args:
+      `source` (`str`): The file or directory to link.
+      `destination` (`str`): Where the link (or the top directory of the linked tree) is created.
+      `manifest` (`list`, optional): `(relative_path, size)` tuples as returned by `get_file_manifest`.
+        If given, only these files are linked and their sizes are checked before anything is created.
+        Otherwise everything under `source` is linked.
+    Returns:
+      A `LinkResult` with the number of files linked, the seconds it took and the number of files that
+      were already linked.
+    Raises:
+      `TorrentInjectionError`: if a file of the manifest is missing or has the wrong size, or if a different
+        file is in the way at the destination.
+      `OSError`: if a directory or link couldn't be created. Anything created by this call is removed again.
+    """
+
+    start_time = monotonic()
+    if manifest is None:
+      directories, links = self.__plan(source, destination)
+    else:
+      directories, links = self.__plan_from_manifest(source, destination, manifest)
+
+    created_directories = []
+    created_links = []
+    existing_links = []
+
+    try:
+      for _, directory in directories:
+        if self.__make_directory(directory):
+          created_directories.append(directory)
+
+      self.__link_files(links, created_links, existing_links)
+
+      # Like `shutil.copytree`, directory metadata is copied once their contents are in place
+      for source_directory, directory in reversed(directories):
+        shutil.copystat(source_directory, directory)
+    except BaseException:
+      self.__roll_back(created_directories, created_links)
+      raise
+
+    return LinkResult(len(created_links), monotonic() - start_time, len(existing_links))
+
+  @staticmethod
+  def __plan(source, destination):
+    if not os.path.isdir(source):
+      return [], [(source, destination)]
+
+    directories = []
+    links = []
+
+    for directory, _, filenames in os.walk(source, followlinks=True):
+      relative_directory = os.path.relpath(directory, source)
+      destination_directory = os.path.normpath(os.path.join(destination, relative_directory))
+      directories.append((directory, destination_directory))
+
+      for filename in filenames:
+        links.append((os.path.join(directory, filename), os.path.join(destination_directory, filename)))
+
+    return directories, links
+
+  @staticmethod
+  def __plan_from_manifest(source, destination, manifest):
+    directories = {}
+    links = []
+
+    for relative_path, size in manifest:
+      source_path = os.path.join(source, relative_path) if relative_path else source
+
+      try:
+        source_size = os.stat(source_path).st_size
+      except FileNotFoundError:
+        raise TorrentInjectionError(f"Torrent data is missing a file: {source_path}")
+
+      if source_size != size:
+        raise TorrentInjectionError(
+          f"Torrent data doesn't match the torrent: {source_path} is {source_size} bytes, expected {size}"
+        )
+
+      if not relative_path:
+        links.append((source_path, destination))
+        continue
+
+      # Parents are added before their subdirectories so they're created first
+      relative_directory = ""
+      directories.setdefault(relative_directory, (source, destination))
+      for part in Path(relative_path).parent.parts:
+        relative_directory = os.path.join(relative_directory, part)
+        directories.setdefault(
+          relative_directory, (os.path.join(source, relative_directory), os.path.join(destination, relative_directory))
+        )
+
+      links.append((source_path, os.path.join(destination, relative_path)))
+
+    return list(directories.values()), links
+
+  def __link_files(self, links, created_links, existing_links):
+    if self.workers <= 1 or len(links) <= 1:
+      for source, destination in links:
+        (created_links if self.__link_file(source, destination) else existing_links).append(destination)
+      return
+
+    with ThreadPoolExecutor(max_workers=min(self.workers, len(links))) as executor:
+      futures = {executor.submit(self.__link_file, source, destination): destination for source, destination in links}
+      error = None
+
+      for future in as_completed(futures):
+        try:
+          created = future.result()
+        except Exception as e:
+          if error is None:
+            error = e
+            for pending_future in futures:
+              pending_future.cancel()
+          continue
+
+        (created_links if created else existing_links).append(futures[future])
+
+    if error is not None:
+      raise error
+
+  @staticmethod
+  def __make_directory(directory):
+    try:
+      os.mkdir(directory)
+      return True
+    except FileExistsError:
+      if os.path.isdir(directory):
+        return False
+
+      raise TorrentInjectionError(f"Cannot link given torrent since a file is in the way: {directory}")
+
+  @staticmethod
+  def __link_file(source, destination):
+    # Linking is attempted first so that new files (the common case) cost a single syscall.
+    # Only when something is already there do the two get compared.
+    try:
+      os.link(source, destination)
+      return True
+    except FileExistsError:
+      if os.path.samestat(os.stat(source), os.lstat(destination)):
+        return False
+
+      raise TorrentInjectionError(f"Cannot link given torrent since a different file is in the way: {destination}")
+
+  @staticmethod
+  def __roll_back(created_directories, created_links):
+    for link in created_links:
+      with suppress(OSError):
+        os.unlink(link)
+
+    for directory in reversed(created_directories):
+      with suppress(OSError):
+        os.rmdir(directory)
+
+
+class LinkStats:
+  """
+  Thread-safe running totals of the links made by a `Linker`, for reporting.
+  """
+
+  def __init__(self):
+    self.torrent_count = 0
+    self.link_count = 0
+    self.existing_count = 0
+    self.elapsed = 0.0
+    self._lock = threading.Lock()
+
+  def add(self, result: LinkResult) -> None:
+    with self._lock:
+      self.torrent_count += 1
+      self.link_count += result.link_count
+      self.existing_count += result.existing_count
+      self.elapsed += result.elapsed
+
+  def report(self) -> str:
+    torrent_plural = "torrent" if self.torrent_count == 1 else "torrents"
+    existing = f" ({self.existing_count} already linked)" if self.existing_count else ""
+
+    return (
+      f"*\tLinked {self.link_count} files{existing} for {self.torrent_count} {torrent_plural} "
+      f"in {self.elapsed:.2f} seconds"
+    )
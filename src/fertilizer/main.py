@@ -9,6 +9,8 @@ from fertilizer.config import Config
 from fertilizer.injection import Injection
 from fertilizer.scanner import scan_torrent_directory, scan_torrent_file
 from fertilizer.config_validator import ConfigValidator
+from fertilizer.database import Database
+from fertilizer.response_cache import SECONDS_PER_DAY, ResponseCache
 from fertilizer.webserver import run_webserver
 
 
@@ -28,13 +30,43 @@ def cli_entrypoint(args):
     red_api, ops_api = command_log_wrapper(
       "Verifying API keys:", should_print, lambda: validator.verify_api_keys(config)
     )
+    red_api.cache = ops_api.cache = ResponseCache(
+      Database.for_directory(args.output_directory), not_found_ttl=config.not_found_cache_days * SECONDS_PER_DAY
+    )
 
     if args.server:
-      run_webserver(args.input_directory, args.output_directory, red_api, ops_api, injector, port=config.server_port)
+      run_webserver(
+        args.input_directory,
+        args.output_directory,
+        red_api,
+        ops_api,
+        injector,
+        port=config.server_port,
+        webhook_workers=config.webhook_workers,
+        server_workers=config.server_workers,
+        server_queue_size=config.server_queue_size,
+        server_timeout=config.server_timeout,
+      )
     elif args.input_file:
       print(scan_torrent_file(args.input_file, args.output_directory, red_api, ops_api, injector))
     elif args.input_directory:
-      print(scan_torrent_directory(args.input_directory, args.output_directory, red_api, ops_api, injector))
+      recheck_not_found_after = args.recheck_not_found_after
+      if recheck_not_found_after is None:
+        recheck_not_found_after = config.not_found_cache_days
+
+      print(
+        scan_torrent_directory(
+          args.input_directory,
+          args.output_directory,
+          red_api,
+          ops_api,
+          injector,
+          jobs=args.jobs,
+          incremental=args.incremental,
+          not_found_recheck_age=recheck_not_found_after * SECONDS_PER_DAY,
+          incomplete_sources=args.incomplete_sources,
+        )
+      )
   except Exception as e:
     if args.verbose:
       print(traceback.format_exc())
@@ -1,5 +1,6 @@
-import copy
 import os
+import uuid
+from contextlib import suppress
 from hashlib import sha1
 from typing import Type
 
@@ -9,6 +10,18 @@ from .errors import TorrentDecodingError
 from .trackers import RedTracker, OpsTracker
 from .utils import flatten
 
+DICT_TOKEN = ord("d")
+LIST_TOKEN = ord("l")
+INT_TOKEN = ord("i")
+END_TOKEN = ord("e")
+ZERO_TOKEN = ord("0")
+NINE_TOKEN = ord("9")
+SOURCE_KEY = b"source"
+# Everything `get_origin_tracker` looks at, for use with `get_partial_bencoded_data`
+ORIGIN_TRACKER_KEY_PATHS = [(b"info", b"source"), (b"announce",), (b"trackers",)]
+# Everything `get_file_manifest` looks at, for use with `get_bencoded_values`
+FILE_MANIFEST_KEY_PATHS = [(b"info", b"length"), (b"info", b"files")]
+
 
 def is_valid_infohash(infohash: str) -> bool:
   if not isinstance(infohash, str) or len(infohash) != 40:
@@ -33,6 +46,44 @@ def get_name(torrent_data: dict) -> bytes | None:
     return None
 
 
+def get_file_manifest(torrent_data: dict) -> list[tuple[str, int]]:
+  """
+  Lists the files of a torrent and their sizes.
+
+  Paths are relative to the torrent's content, i.e. the directory named after `info.name`. A single-file
+  torrent lists only the content itself, with an empty path. Padding files (BEP 47) aren't listed since
+  they don't exist on disk.
+
+  Args:
+    `torrent_data` (`dict`): The (fully or partially) decoded torrent.
+  Returns:
+    A list of `(relative_path, size)` tuples.
+  Raises:
+    `TorrentDecodingError`: if the torrent doesn't list any files or lists a path outside of its content.
+  """
+
+  info = torrent_data.get(b"info", {})
+
+  if b"files" not in info:
+    if b"length" not in info:
+      raise TorrentDecodingError("Torrent data does not list any files")
+
+    return [("", info[b"length"])]
+
+  manifest = []
+  for file in info[b"files"]:
+    if b"p" in bytes(file.get(b"attr", b"")):
+      continue
+
+    path_parts = [os.fsdecode(bytes(part)) for part in file[b"path"]]
+    if not path_parts or any(part in ("", os.curdir, os.pardir) or os.sep in part for part in path_parts):
+      raise TorrentDecodingError(f"Torrent lists an invalid file path: {path_parts}")
+
+    manifest.append((os.path.join(*path_parts), file[b"length"]))
+
+  return manifest
+
+
 def get_announce_url(torrent_data: dict) -> list[bytes] | None:
   from_announce = torrent_data.get(b"announce")
   if from_announce:
@@ -49,6 +100,9 @@ def get_origin_tracker(torrent_data: dict) -> Type[RedTracker] | Type[OpsTracker
   source = get_source(torrent_data) or b""
   announce_url = get_announce_url(torrent_data) or []
 
+  # Values from `get_partial_bencoded_data` are memoryviews, which don't support substring checks
+  announce_url = [bytes(url) for url in announce_url]
+
   if source in RedTracker.source_flags_for_search() or any(RedTracker.announce_url() in url for url in announce_url):
     return RedTracker
 
@@ -65,29 +119,248 @@ def calculate_infohash(torrent_data: dict) -> str:
     raise TorrentDecodingError("Torrent data does not contain 'info' key")
 
 
+def calculate_infohash_from_bytes(data: bytes) -> str:
+  """
+  Calculates the infohash of raw torrent file contents without decoding them.
+
+  The SHA1 is taken over the exact bytes of the `info` value as they appear in the file (the same bytes
+  torrent clients hash), so the large `pieces` string is never copied or re-encoded.
+  """
+
+  start, end = find_info_span(data)
+  return sha1(memoryview(data)[start:end]).hexdigest().upper()
+
+
+def calculate_infohash_from_file(filename: str) -> str:
+  with open(filename, "rb") as f:
+    return calculate_infohash_from_bytes(f.read())
+
+
+def find_info_span(data: bytes) -> tuple[int, int]:
+  """
+  Finds the byte offsets of the top-level `info` dictionary in bencoded torrent data.
+
+  Returns:
+    A tuple of the start (inclusive) and end (exclusive) offsets of the `info` value.
+  Raises:
+    `TorrentDecodingError`: if the data isn't a bencoded dictionary or has no `info` dictionary.
+  """
+
+  try:
+    if data[0] != DICT_TOKEN:
+      raise TorrentDecodingError("Error decoding torrent file")
+
+    position = 1
+    while data[position] != END_TOKEN:
+      key_start, key_end = __find_string_span(data, position)
+      value_end = __skip_bencoded_value(data, key_end)
+
+      if data[key_start:key_end] == b"info":
+        if data[key_end] != DICT_TOKEN:
+          raise TorrentDecodingError("Torrent data does not contain 'info' key")
+        return key_end, value_end
+
+      position = value_end
+  except (IndexError, ValueError) as e:
+    raise TorrentDecodingError("Error decoding torrent file") from e
+
+  raise TorrentDecodingError("Torrent data does not contain 'info' key")
+
+
 def recalculate_hash_for_new_source(torrent_data: dict, new_source: (bytes | str)) -> str:
-  torrent_data = copy.deepcopy(torrent_data)
-  torrent_data[b"info"][b"source"] = new_source
+  return calculate_source_variant_hashes(torrent_data, [new_source])[new_source]
+
+
+def calculate_source_variant_hashes(torrent_data: dict, new_sources: list[bytes | str]) -> dict:
+  """
+  Calculates the infohash the torrent would have with each of `new_sources` as its source flag.
+
+  Every key of the info dictionary other than `source` is encoded once. Keys that sort before `source`
+  (which includes `pieces`) are fed into a single SHA1 state that is then copied for each candidate,
+  so adding a candidate only costs hashing the source value and the few keys that sort after it.
+
+  Returns:
+    A dictionary of each new source to its infohash, in the order given.
+  """
+
+  try:
+    info = torrent_data[b"info"]
+  except KeyError:
+    raise TorrentDecodingError("Torrent data does not contain 'info' key")
+
+  prefix_hash = sha1(b"d")
+  suffix = []
+
+  for key, value in sorted(info.items()):
+    if key == SOURCE_KEY:
+      continue
+
+    encoded_item = bencoder.encode(key) + bencoder.encode(value)
+    if key < SOURCE_KEY:
+      prefix_hash.update(encoded_item)
+    else:
+      suffix.append(encoded_item)
+
+  encoded_suffix = b"".join(suffix) + b"e"
+  variant_hashes = {}
 
-  return calculate_infohash(torrent_data)
+  for new_source in new_sources:
+    variant_hash = prefix_hash.copy()
+    variant_hash.update(bencoder.encode(SOURCE_KEY) + bencoder.encode(new_source))
+    variant_hash.update(encoded_suffix)
+    variant_hashes[new_source] = variant_hash.hexdigest().upper()
+
+  return variant_hashes
 
 
 def get_bencoded_data(filename: str) -> dict | None:
   try:
     with open(filename, "rb") as f:
-      data = bencoder.decode(f.read())
+      return decode_bencoded_data(f.read())
+  except Exception:
+    return None
+
+
+def decode_bencoded_data(data: bytes) -> dict | None:
+  try:
+    return bencoder.decode(data)
+  except Exception:
+    return None
 
-    return data
+
+def get_partial_bencoded_data(filename: str, key_paths: list[tuple[bytes, ...]]) -> dict | None:
+  try:
+    with open(filename, "rb") as f:
+      return get_bencoded_values(f.read(), key_paths)
   except Exception:
     return None
 
 
+def get_bencoded_values(data: bytes, key_paths: list[tuple[bytes, ...]]) -> dict:
+  """
+  Decodes only the values at `key_paths` from a bencoded dictionary, skipping over everything else.
+
+  The result is shaped like the fully decoded data but only contains the requested keys (and the
+  dictionaries leading to them). Byte strings are returned as memoryview slices of `data` rather than
+  copies, so large values like `pieces` are never materialized unless they're asked for.
+
+  Args:
+    `data` (`bytes`): The bencoded data.
+    `key_paths` (`list`): The paths to decode, e.g. `[(b"info", b"source"), (b"announce",)]`.
+  Returns:
+    A partially decoded dictionary.
+  Raises:
+    `TorrentDecodingError`: if the data is not a bencoded dictionary.
+  """
+
+  try:
+    if data[0] != DICT_TOKEN:
+      raise TorrentDecodingError("Error decoding torrent file")
+
+    return __decode_key_paths(data, memoryview(data), 0, key_paths)[0]
+  except (IndexError, ValueError) as e:
+    raise TorrentDecodingError("Error decoding torrent file") from e
+
+
 def save_bencoded_data(filepath: str, torrent_data: dict) -> str:
+  """
+  Writes bencoded data to `filepath` atomically: the data goes to a temporary file next to it first, which
+  then replaces `filepath` in one step. Readers (and concurrent writers) never see a partially written file.
+  """
+
   parent_dir = os.path.dirname(filepath)
   if parent_dir:
     os.makedirs(parent_dir, exist_ok=True)
 
-  with open(filepath, "wb") as f:
-    f.write(bencoder.encode(torrent_data))
+  # Hidden and without the .torrent extension, so directory scans never pick it up
+  temporary_filepath = os.path.join(parent_dir, f".{os.path.basename(filepath)}.{uuid.uuid4().hex}.tmp")
+
+  try:
+    with open(temporary_filepath, "xb") as f:
+      f.write(bencoder.encode(torrent_data))
+
+    os.replace(temporary_filepath, filepath)
+  except BaseException:
+    with suppress(OSError):
+      os.remove(temporary_filepath)
+    raise
 
   return filepath
+
+
+def __find_string_span(data: bytes, position: int) -> tuple[int, int]:
+  colon = data.index(b":", position)
+  start = colon + 1
+  end = start + int(data[position:colon])
+
+  if end > len(data):
+    raise ValueError("String extends past the end of the data")
+
+  return start, end
+
+
+def __skip_bencoded_value(data: bytes, position: int) -> int:
+  token = data[position]
+
+  if token == INT_TOKEN:
+    return data.index(b"e", position) + 1
+  if token == LIST_TOKEN or token == DICT_TOKEN:
+    position += 1
+    while data[position] != END_TOKEN:
+      position = __skip_bencoded_value(data, position)
+    return position + 1
+  if ZERO_TOKEN <= token <= NINE_TOKEN:
+    return __find_string_span(data, position)[1]
+
+  raise ValueError(f"Unexpected token at offset {position}")
+
+
+def __decode_key_paths(data: bytes, view: memoryview, position: int, key_paths) -> tuple[dict, int]:
+  wanted = {}
+  for key_path in key_paths:
+    wanted.setdefault(key_path[0], []).append(key_path[1:])
+
+  result = {}
+  position += 1
+
+  while data[position] != END_TOKEN:
+    key_start, key_end = __find_string_span(data, position)
+    remaining_paths = wanted.get(data[key_start:key_end])
+
+    if remaining_paths is None:
+      position = __skip_bencoded_value(data, key_end)
+    elif not all(remaining_paths):
+      result[data[key_start:key_end]], position = __decode_bencoded_value(data, view, key_end)
+    elif data[key_end] == DICT_TOKEN:
+      result[data[key_start:key_end]], position = __decode_key_paths(data, view, key_end, remaining_paths)
+    else:
+      position = __skip_bencoded_value(data, key_end)
+
+  return result, position + 1
+
+
+def __decode_bencoded_value(data: bytes, view: memoryview, position: int):
+  token = data[position]
+
+  if token == INT_TOKEN:
+    end = data.index(b"e", position)
+    return int(data[position + 1 : end]), end + 1
+  if token == LIST_TOKEN:
+    items = []
+    position += 1
+    while data[position] != END_TOKEN:
+      item, position = __decode_bencoded_value(data, view, position)
+      items.append(item)
+    return items, position + 1
+  if token == DICT_TOKEN:
+    items = {}
+    position += 1
+    while data[position] != END_TOKEN:
+      key_start, key_end = __find_string_span(data, position)
+      items[data[key_start:key_end]], position = __decode_bencoded_value(data, view, key_end)
+    return items, position + 1
+  if ZERO_TOKEN <= token <= NINE_TOKEN:
+    start, end = __find_string_span(data, position)
+    return view[start:end], end
+
+  raise ValueError(f"Unexpected token at offset {position}")
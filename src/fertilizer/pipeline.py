@@ -0,0 +1,143 @@
+import logging
+import threading
+from queue import Queue
+from time import time
+
+DEFAULT_QUEUE_SIZE = 64
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+  """
+  A step of a pipeline: worker threads that take items off a bounded queue and pass them to `handler`.
+
+  Putting an item into a full queue blocks, so a slow stage applies back-pressure to the stages feeding it.
+  `handler` is responsible for its own error handling and for passing items on to the next stage. Should it
+  raise anyway, the item is counted as failed and passed to `on_error` along with the exception (or logged if
+  there's no `on_error`), and the worker carries on with the next item.
+  """
+
+  def __init__(self, name: str, handler, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE, on_error=None):
+    self.name = name
+    self.workers = workers
+    self.processed = 0
+    self.failed = 0
+    self.peak_queue_depth = 0
+    self.start_time = None
+    self.end_time = None
+
+    self._handler = handler
+    self._on_error = on_error
+    self._queue = Queue(maxsize=queue_size)
+    self._lock = threading.Lock()
+    self._threads = []
+
+  def start(self) -> "Stage":
+    self.start_time = time()
+    self._threads = [
+      threading.Thread(target=self.__work, name=f"fertilizer-{self.name}-{i}", daemon=True) for i in range(self.workers)
+    ]
+
+    for thread in self._threads:
+      thread.start()
+
+    return self
+
+  def put(self, item) -> None:
+    self._queue.put(item)
+
+    with self._lock:
+      self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+
+  @property
+  def queue_depth(self) -> int:
+    return self._queue.qsize()
+
+  def join(self) -> None:
+    """
+    Waits for every item queued so far to be handled, leaving the workers running.
+    """
+
+    self._queue.join()
+
+  def finish(self) -> None:
+    """
+    Waits for every queued item to be handled, then stops the workers.
+    """
+
+    for _ in self._threads:
+      self._queue.put(_STOP)
+
+    for thread in self._threads:
+      thread.join()
+
+    self.end_time = time()
+
+  def throughput(self) -> float:
+    elapsed = (self.end_time or time()) - (self.start_time or time())
+    return self.processed / elapsed if elapsed > 0 else 0.0
+
+  def report(self) -> str:
+    failed = f", {self.failed} failed" if self.failed else ""
+
+    return (
+      f"*\t{self.name}: {self.processed} processed ({self.throughput():.2f}/s){failed}, "
+      f"peak queue depth {self.peak_queue_depth}"
+    )
+
+  def __work(self):
+    while True:
+      item = self._queue.get()
+      if item is _STOP:
+        self._queue.task_done()
+        return
+
+      try:
+        self._handler(item)
+        succeeded = True
+      except Exception as e:
+        # A worker that died here would leave the rest of its queue unhandled and `join` waiting forever
+        succeeded = False
+        self.__handle_error(item, e)
+      finally:
+        self._queue.task_done()
+
+      with self._lock:
+        if succeeded:
+          self.processed += 1
+        else:
+          self.failed += 1
+
+  def __handle_error(self, item, error):
+    if self._on_error is not None:
+      try:
+        self._on_error(item, error)
+        return
+      except Exception:
+        pass
+
+    logger.exception(f"{self.name} stage failed to handle {item!r}", exc_info=error)
+
+
+class Pipeline:
+  """
+  A set of stages that run concurrently, listed in the order items flow through them.
+  """
+
+  def __init__(self, stages: list[Stage]):
+    self.stages = stages
+
+  def start(self) -> "Pipeline":
+    for stage in self.stages:
+      stage.start()
+
+    return self
+
+  def finish(self) -> None:
+    # Items only ever move forward, so once a stage has drained nothing new can reach it
+    # and the following stage can be drained in turn
+    for stage in self.stages:
+      stage.finish()
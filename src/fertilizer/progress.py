@@ -39,20 +39,55 @@ class Progress:
     self.not_found = Status("Not found", Fore.LIGHTRED_EX, total)
     self.error = Status("Errors", Fore.RED, total)
     self.skipped = Status("Skipped", Fore.LIGHTBLACK_EX, total)
+    self.incomplete = Status("Incomplete in client", Fore.LIGHTMAGENTA_EX, total)
+    self.unchanged = Status("Unchanged since last scan", Fore.LIGHTBLACK_EX, total)
+    self.stages = []
+    self.link_stats = None
+
+  def add_to_total(self, count: int) -> None:
+    """
+    Grows the total, for scans that find their torrents as they go rather than up front.
+    """
+
+    self.total += count
+    for status in self.__statuses():
+      status.total = self.total
+
+  def track_stages(self, stages) -> None:
+    """
+    Includes the throughput and queue depth of each pipeline stage in the report.
+    """
+
+    self.stages = stages
+
+  def track_links(self, link_stats) -> None:
+    """
+    Includes how many files were hardlinked for injection, and how long it took, in the report.
+    """
+
+    self.link_stats = link_stats
 
   def report(self) -> str:
     divider = f"\n{'-' * 50}"
     time_taken = time() - self.start_time
     torrent_plural = "torrent" if self.total == 1 else "torrents"
-    messages = "\n".join(
-      x.report()
-      for x in (
-        self.generated,
-        self.already_exists,
-        self.not_found,
-        self.error,
-        self.skipped,
-      )
-    )
+    messages = "\n".join(x.report() for x in self.__statuses())
+
+    stage_messages = ""
+    if self.stages:
+      stage_messages = "\nPipeline stages:\n" + "\n".join(stage.report() for stage in self.stages)
+    if self.link_stats:
+      stage_messages += f"\nHardlinks:\n{self.link_stats.report()}"
 
-    return f"{divider}\nAnalyzed {self.total} local {torrent_plural} in {time_taken:.2f} seconds:\n{messages}{divider}"
+    return f"{divider}\nAnalyzed {self.total} local {torrent_plural} in {time_taken:.2f} seconds:\n{messages}{stage_messages}{divider}"
+
+  def __statuses(self):
+    return (
+      self.generated,
+      self.already_exists,
+      self.not_found,
+      self.error,
+      self.skipped,
+      self.incomplete,
+      self.unchanged,
+    )
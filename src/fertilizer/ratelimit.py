@@ -0,0 +1,232 @@
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+from hashlib import sha256
+from time import monotonic, sleep, time
+
+try:
+  import fcntl
+except ImportError:  # pragma: no cover - Windows
+  fcntl = None
+
+
+class TokenBucket:
+  """
+  Thread-safe token bucket rate limiter.
+
+  The bucket holds up to `burst` tokens and refills at `rate` tokens per second. Each call to `acquire` takes
+  a token. When the bucket is empty the caller reserves the next token and sleeps until exactly the moment
+  it becomes available, so waiting callers are served in the order they arrived without polling.
+  A `rate` of 0 disables limiting altogether.
+  """
+
+  _clock = staticmethod(monotonic)
+
+  def __init__(self, rate: float, burst: int = 1):
+    if rate < 0:
+      raise ValueError("rate must not be negative")
+    if burst < 1:
+      raise ValueError("burst must be at least 1")
+
+    self.rate = rate
+    self.burst = burst
+
+    self._tokens = float(burst)
+    self._updated_at = self._clock()
+    self._backoff_until = 0.0
+    self._lock = threading.Lock()
+
+  @classmethod
+  def from_delay(cls, delay_in_seconds: float, burst: int = 1, **kwargs) -> "TokenBucket":
+    """
+    Builds a bucket that allows one call every `delay_in_seconds` on average.
+    """
+
+    return cls(rate=1 / delay_in_seconds if delay_in_seconds > 0 else 0, burst=burst, **kwargs)
+
+  def acquire(self) -> float:
+    """
+    Takes a token, blocking until one is available and any backoff has passed.
+
+    Returns:
+      The number of seconds spent waiting.
+    """
+
+    wait_time = self._reserve()
+    if wait_time > 0:
+      sleep(wait_time)
+
+    return wait_time
+
+  def backoff(self, seconds: float) -> None:
+    """
+    Holds back every caller of this bucket for at least `seconds`, e.g. after the remote side reported an error.
+    """
+
+    with self._lock:
+      self._extend_backoff(seconds)
+
+  def _reserve(self):
+    with self._lock:
+      return self._take_token()
+
+  def _extend_backoff(self, seconds):
+    self._backoff_until = max(self._backoff_until, self._clock() + seconds)
+
+  def _take_token(self):
+    now = self._clock()
+    start = max(now, self._backoff_until)
+    if self.rate == 0:
+      return start - now
+
+    elapsed = max(0.0, start - self._updated_at)
+    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+    self._updated_at = start
+    # Taking the token before it exists is what reserves it: the deficit tells this caller how long
+    # to sleep and pushes every later caller further back in the queue
+    self._tokens -= 1
+
+    return (start - now) + max(0.0, -self._tokens / self.rate)
+
+
+class FileTokenBucket(TokenBucket):
+  """
+  A `TokenBucket` whose state lives in a file, so that every local process using the same file shares one budget.
+
+  The state is read and written under an exclusive `flock`, which also makes backoffs visible to all processes.
+  If the file can't be opened (e.g. it was replaced by a symlink, which is never followed), this process
+  keeps to the limit on its own instead of failing.
+  """
+
+  _clock = staticmethod(time)
+
+  def __init__(self, filepath: str, rate: float, burst: int = 1):
+    super().__init__(rate, burst)
+    self.filepath = filepath
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+  def backoff(self, seconds: float) -> None:
+    with self._lock, self.__locked_state():
+      self._extend_backoff(seconds)
+
+  def _reserve(self):
+    with self._lock, self.__locked_state():
+      return self._take_token()
+
+  @contextmanager
+  def __locked_state(self):
+    try:
+      fd = os.open(self.filepath, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    except OSError:
+      # The in-memory state of the last successful read carries on
+      yield
+      return
+
+    try:
+      try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+      except OSError:
+        yield
+        return
+
+      self.__load_state(fd)
+      yield
+      with suppress(OSError):
+        self.__save_state(fd)
+    finally:
+      os.close(fd)
+
+  def __load_state(self, fd):
+    try:
+      state = json.loads(os.pread(fd, 4096, 0))
+      self._tokens = float(state["tokens"])
+      self._updated_at = float(state["updated_at"])
+      self._backoff_until = float(state["backoff_until"])
+    except (ValueError, KeyError, TypeError):
+      # A new or unreadable state file starts out as a full bucket
+      self._tokens = float(self.burst)
+      self._updated_at = self._clock()
+      self._backoff_until = 0.0
+
+  def __save_state(self, fd):
+    state = {"tokens": self._tokens, "updated_at": self._updated_at, "backoff_until": self._backoff_until}
+
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, json.dumps(state).encode(), 0)
+
+
+__shared_buckets = {}
+__shared_buckets_lock = threading.Lock()
+
+
+def shared_token_bucket(key: str, delay_in_seconds: float, burst: int = 1, account: str = "") -> TokenBucket:
+  """
+  Returns the bucket shared by every caller using the same `key`, `account` and limits, creating it on first use.
+
+  Where file locking is available the bucket is backed by a state file in a private per-user directory, so the
+  limit also holds across separate fertilizer processes of the same user. Otherwise, or if that directory
+  can't be used, it's only shared within this process.
+
+  Args:
+    `key` (`str`): What the limit applies to, usually a tracker's site URL.
+    `delay_in_seconds` (`float`): The average delay between calls. 0 disables limiting.
+    `burst` (`int`): How many calls may be made back-to-back before the delay kicks in.
+    `account` (`str`): Who the limit applies to, e.g. an API key. Only a hash of it ends up in the file name,
+      so accounts with separate budgets don't share one.
+  Returns:
+    The shared `TokenBucket`.
+  """
+
+  with __shared_buckets_lock:
+    bucket_key = (key, delay_in_seconds, burst, account)
+
+    if bucket_key not in __shared_buckets:
+      __shared_buckets[bucket_key] = __build_shared_bucket(key, delay_in_seconds, burst, account)
+
+    return __shared_buckets[bucket_key]
+
+
+def shared_state_directory() -> str:
+  """
+  Returns (creating it if needed) the directory holding this user's rate limit state: `$XDG_RUNTIME_DIR/fertilizer`
+  if set, otherwise a `fertilizer-<uid>` directory in the temp directory.
+
+  Raises:
+    `PermissionError`: if the directory is a symlink, belongs to another user or is accessible by others.
+  """
+
+  runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+  if runtime_directory:
+    directory = os.path.join(runtime_directory, "fertilizer")
+  else:
+    directory = os.path.join(tempfile.gettempdir(), f"fertilizer-{os.getuid()}")
+
+  os.makedirs(directory, mode=0o700, exist_ok=True)
+
+  # Anybody can create directories in the temp directory, so one made by someone else must not be trusted
+  directory_stat = os.lstat(directory)
+  if not stat.S_ISDIR(directory_stat.st_mode) or directory_stat.st_uid != os.getuid() or directory_stat.st_mode & 0o077:
+    raise PermissionError(f"Rate limit state directory is not private to this user: {directory}")
+
+  return directory
+
+
+def __build_shared_bucket(key, delay_in_seconds, burst, account):
+  if fcntl is None:
+    return TokenBucket.from_delay(delay_in_seconds, burst)
+
+  try:
+    directory = shared_state_directory()
+  except OSError:
+    return TokenBucket.from_delay(delay_in_seconds, burst)
+
+  filename = re.sub(r"[^A-Za-z0-9.-]+", "_", re.sub(r"^\w+://", "", key))
+  if account:
+    filename += "-" + sha256(account.encode()).hexdigest()[:16]
+
+  return FileTokenBucket.from_delay(delay_in_seconds, burst, filepath=os.path.join(directory, f"{filename}.ratelimit"))
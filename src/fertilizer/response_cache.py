@@ -0,0 +1,66 @@
+import json
+from time import time
+
+from .database import Database
+
+NOT_FOUND_ERRORS = ("bad hash parameter", "bad parameters")
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class ResponseCache:
+  """
+  Persistent cache of tracker `torrent` lookups, keyed by tracker and infohash.
+
+  Torrents that were found are kept indefinitely since an infohash can't start pointing at a different torrent.
+  Torrents that weren't found are kept for `not_found_ttl` seconds as they may be uploaded later.
+  Any other response (e.g. an unknown API error) is never cached.
+  """
+
+  def __init__(self, database: Database, not_found_ttl: float):
+    self.not_found_ttl = not_found_ttl
+    self._db = database
+    self.__create_tables()
+
+  def get(self, tracker: str, infohash: str) -> dict | None:
+    rows = self._db.execute(
+      "SELECT response, found, fetched_at FROM api_responses WHERE tracker = ? AND infohash = ?",
+      (tracker, infohash),
+    )
+    if not rows:
+      return None
+
+    response, found, fetched_at = rows[0]
+    if not found and time() - fetched_at >= self.not_found_ttl:
+      return None
+
+    return json.loads(response)
+
+  def set(self, tracker: str, infohash: str, response: dict) -> None:
+    if response.get("status") == "success":
+      found = True
+    elif response.get("error") in NOT_FOUND_ERRORS:
+      found = False
+    else:
+      return
+
+    self._db.execute(
+      """
+      INSERT OR REPLACE INTO api_responses (tracker, infohash, response, found, fetched_at)
+      VALUES (?, ?, ?, ?, ?)
+      """,
+      (tracker, infohash, json.dumps(response), found, time()),
+    )
+
+  def __create_tables(self):
+    self._db.execute(
+      """
+      CREATE TABLE IF NOT EXISTS api_responses (
+        tracker TEXT NOT NULL,
+        infohash TEXT NOT NULL,
+        response TEXT NOT NULL,
+        found INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (tracker, infohash)
+      )
+      """
+    )
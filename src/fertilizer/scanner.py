@@ -1,4 +1,10 @@
+import multiprocessing
 import os
+import threading
+from contextlib import nullcontext, suppress
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import deque
+from itertools import chain, islice
 
 from .api import RedAPI, OpsAPI
 from .errors import (
@@ -8,11 +14,34 @@ from .errors import (
   TorrentAlreadyExistsError,
   TorrentExistsInClientError,
 )
-from .filesystem import mkdir_p, list_files_of_extension, assert_path_exists
+from .database import Database
+from .filesystem import mkdir_p, walk_files_of_extension, assert_path_exists
+from .index import InfohashIndex
 from .injection import Injection
-from .parser import get_bencoded_data, calculate_infohash
+from .ledger import ALREADY_EXISTS, ERROR, GENERATED, INCOMPLETE, INJECTABLE_OUTCOMES, NOT_FOUND, SKIPPED, ScanLedger
+from .parser import calculate_infohash_from_file
+from .pipeline import Pipeline, Stage
 from .progress import Progress
-from .torrent import generate_new_torrent_from_file
+from .singleflight import SOURCE_TORRENT_FLIGHTS, SingleFlight
+from .trackers import RedTracker, OpsTracker
+from .torrent import (
+  calculate_reciprocal_hashes,
+  find_existing_torrent,
+  find_torrent_on_tracker,
+  generate_new_torrent_from_file,
+  get_tracker_api,
+  save_new_torrent,
+)
+
+# Below this many files the cost of starting worker processes outweighs the hashing itself
+PARALLEL_HASHING_THRESHOLD = 256
+MAX_HASHING_CHUNK_SIZE = 64
+# How many input torrents are hashed ahead of the pipeline, so matching torrents among them are recognised
+INPUT_BATCH_SIZE = 256
+DEFAULT_NOT_FOUND_RECHECK_AGE = 7 * 24 * 60 * 60
+
+SKIP_INCOMPLETE_SOURCES = "skip"
+DEFER_INCOMPLETE_SOURCES = "defer"
 
 
 def scan_torrent_file(
@@ -21,16 +50,26 @@ def scan_torrent_file(
   red_api: RedAPI,
   ops_api: OpsAPI,
   injector: Injection | None,
+  output_infohashes: dict | None = None,
+  flights: SingleFlight = SOURCE_TORRENT_FLIGHTS,
 ) -> str:
   """
   Scans a single .torrent file and generates a new one using the tracker API.
 
+  Concurrent scans of the same source torrent (e.g. a webhook fired twice, or a webhook during a directory scan)
+  are deduplicated by its infohash: only one of them looks the torrent up, writes it and injects it, and the
+  others get its result.
+
   Args:
     `source_torrent_path` (`str`): The path to the .torrent file.
     `output_directory` (`str`): The directory to save the new .torrent files.
     `red_api` (`RedAPI`): The pre-configured RED tracker API.
     `ops_api` (`OpsAPI`): The pre-configured OPS tracker API.
     `injector` (`Injection`): The pre-configured torrent Injection object.
+    `output_infohashes` (`InfohashIndex`, optional): The index of the output directory, for callers
+      that keep one around (e.g. a `ResidentInfohashIndex`). Defaults to refreshing the index from disk.
+    `flights` (`SingleFlight`, optional): Where concurrent scans are deduplicated. Defaults to the one shared
+      by the whole process.
   Returns:
     str: The path to the new .torrent file.
   Raises:
@@ -39,16 +78,43 @@ def scan_torrent_file(
   source_torrent_path = assert_path_exists(source_torrent_path)
   output_directory = mkdir_p(output_directory)
 
-  output_torrents = list_files_of_extension(output_directory, ".torrent")
-  output_infohashes = __collect_infohashes_from_files(output_torrents)
+  try:
+    source_infohash = calculate_infohash_from_file(source_torrent_path)
+  except Exception:
+    # Undecodable torrents fail the same way for every caller, so there's nothing to share
+    source_infohash = None
+
+  args = (source_torrent_path, output_directory, red_api, ops_api, injector, output_infohashes)
+  if source_infohash is None:
+    _, new_torrent_filepath, _ = __scan_torrent_file(*args)
+  else:
+    _, new_torrent_filepath, _ = flights.do(source_infohash, __scan_torrent_file, *args)
+
+  return new_torrent_filepath
+
+
+def __scan_torrent_file(source_torrent_path, output_directory, red_api, ops_api, injector, output_infohashes):
+  if output_infohashes is not None:
+    return __generate_and_inject(source_torrent_path, output_directory, red_api, ops_api, injector, output_infohashes)
 
-  new_tracker, new_torrent_filepath, _ = generate_new_torrent_from_file(
+  output_infohashes = InfohashIndex(output_directory)
+  try:
+    output_infohashes.refresh()
+    return __generate_and_inject(source_torrent_path, output_directory, red_api, ops_api, injector, output_infohashes)
+  finally:
+    output_infohashes.close()
+
+
+def __generate_and_inject(source_torrent_path, output_directory, red_api, ops_api, injector, output_infohashes):
+  new_tracker, new_torrent_filepath, was_previously_generated = generate_new_torrent_from_file(
     source_torrent_path,
     output_directory,
     red_api,
     ops_api,
     input_infohashes={},
     output_infohashes=output_infohashes,
+    # Torrents that are already in the client are recognised before any tracker API call is spent on them
+    client_infohashes=injector.client_infohashes() if injector else None,
   )
 
   if injector:
@@ -58,7 +124,8 @@ def scan_torrent_file(
       new_tracker.site_shortname(),
     )
 
-  return new_torrent_filepath
+  # Shaped like the outcome of a `DirectoryScan` item so both can follow each other's flights
+  return new_tracker, new_torrent_filepath, was_previously_generated
 
 
 def scan_torrent_directory(
@@ -67,9 +134,18 @@ def scan_torrent_directory(
   red_api: RedAPI,
   ops_api: OpsAPI,
   injector: Injection | None,
+  jobs: int = 1,
+  incremental: bool = False,
+  not_found_recheck_age: float = DEFAULT_NOT_FOUND_RECHECK_AGE,
+  incomplete_sources: str | None = None,
 ) -> str:
   """
-  Scans a directory for .torrent files and generates new ones using the tracker APIs.
+  Scans a directory and its subdirectories for .torrent files and generates new ones using the tracker APIs.
+
+  The output directory is never scanned, even if it's inside the input directory. The outcome for every input torrent is recorded in a scan ledger kept in the output directory.
+
+  Torrents go through the scan as the input directory is walked, so lookups start without waiting for the whole
+  walk to finish.
 
   Args:
     `input_directory` (`str`): The directory containing the .torrent files.
@@ -77,6 +153,14 @@ def scan_torrent_directory(
     `red_api` (`RedAPI`): The pre-configured RED tracker API.
     `ops_api` (`OpsAPI`): The pre-configured OPS tracker API.
     `injector` (`Injection`): The pre-configured torrent Injection object.
+    `jobs` (`int`, optional): The number of worker processes used to decode and hash torrents. Defaults to 1.
+    `incremental` (`bool`, optional): Whether to skip torrents that haven't changed since the last scan
+      and whose outcome still holds. Defaults to False.
+    `not_found_recheck_age` (`float`, optional): In incremental mode, how many seconds to wait before
+      looking up a torrent that wasn't found again. Defaults to 7 days.
+    `incomplete_sources` (`str`, optional): What to do with torrents that are incomplete or missing in the torrent
+      client when injection is enabled. "skip" leaves them out before any tracker lookup, "defer" moves them to
+      the end of the scan and checks them against the client again then. Defaults to None (no check).
   Returns:
     str: A report of the scan.
   Raises:
@@ -86,76 +170,548 @@ def scan_torrent_directory(
   input_directory = assert_path_exists(input_directory)
   output_directory = mkdir_p(output_directory)
 
-  input_torrents = list_files_of_extension(input_directory, ".torrent")
-  output_torrents = list_files_of_extension(output_directory, ".torrent")
-  input_infohashes = __collect_infohashes_from_files(input_torrents)
-  output_infohashes = __collect_infohashes_from_files(output_torrents)
+  # The ledger and the output index share the state database, which is closed once the scan is over
+  database = Database.for_directory(output_directory)
+  pool = None
+  # Filled in as the input directory is walked, while the scan is already under way
+  input_infohashes = {}
 
-  p = Progress(len(input_torrents))
+  p = Progress(0)
+  if injector:
+    p.track_links(injector.link_stats)
 
-  for i, source_torrent_path in enumerate(input_torrents, 1):
-    basename = os.path.basename(source_torrent_path)
-    print(f"({i}/{p.total}) {basename}")
+  try:
+    ledger = ScanLedger(database)
+    output_infohashes = InfohashIndex(output_directory, database=database).refresh()
 
-    try:
-      new_tracker, new_torrent_filepath, was_previously_generated = generate_new_torrent_from_file(
-        source_torrent_path,
+    input_files = walk_files_of_extension(input_directory, ".torrent", excluded_directories=[output_directory])
+    # Only walk as far ahead as it takes to tell whether starting worker processes is worth it
+    head = list(islice(input_files, PARALLEL_HASHING_THRESHOLD)) if jobs > 1 else []
+    # Worker processes are only started once a torrent actually has to be read (e.g. not when an incremental
+    # scan finds everything unchanged)
+    pool = _LazyProcessPool(jobs) if jobs > 1 and len(head) >= PARALLEL_HASHING_THRESHOLD else None
+
+    scan_items = __generate_scan_items(
+      chain(head, input_files),
+      ledger.entries(),
+      input_infohashes,
+      p,
+      pool,
+      jobs,
+      incremental,
+      not_found_recheck_age,
+      bool(injector),
+    )
+
+    # The snapshot's keys are the client's infohashes, so torrents that are already in the client are
+    # recognised before any tracker API call is spent on them
+    with injector.snapshot() if injector else nullcontext() as client_torrents:
+      scan = DirectoryScan(
         output_directory,
         red_api,
         ops_api,
+        injector,
         input_infohashes,
         output_infohashes,
+        p,
+        jobs if pool else 1,
+        ledger,
+        client_torrents=client_torrents,
+        incomplete_sources=incomplete_sources if injector else None,
+        pool=pool,
       )
+      scan.run(scan_items)
+  finally:
+    if pool:
+      pool.shutdown(cancel_futures=True)
+    database.close()
 
-      if injector:
-        injector.inject_torrent(
-          source_torrent_path,
-          new_torrent_filepath,
-          new_tracker.site_shortname(),
-        )
+  return p.report()
+
+
+def __generate_scan_items(
+  input_files,
+  ledger_entries: dict,
+  input_infohashes: dict,
+  progress: Progress,
+  pool: "_LazyProcessPool | None",
+  jobs: int,
+  incremental: bool,
+  not_found_recheck_age: float,
+  injecting: bool,
+):
+  def files_to_hash():
+    for filepath, stat in input_files:
+      entry = ledger_entries.get(filepath)
+      yield filepath, entry if entry and ScanLedger.is_unchanged(entry, stat) else None
+
+  number = 0
+
+  for batch in __batched(__hash_files(files_to_hash(), pool, jobs), INPUT_BATCH_SIZE):
+    progress.add_to_total(len(batch))
+
+    # A whole batch is known before any of it goes through the pipeline, so a torrent and its counterpart from
+    # the other tracker in the same batch both count as already existing. Counterparts found in later batches
+    # are caught before the tracker lookup if it hasn't started yet, and otherwise once the walk is done.
+    for filepath, _, infohash in batch:
+      if infohash:
+        input_infohashes[infohash] = filepath
+
+    for filepath, unchanged_entry, infohash in batch:
+      number += 1
 
-      if was_previously_generated:
-        if injector:
-          p.already_exists.print("Torrent was previously generated but was injected into your torrent client.")
-        else:
-          p.already_exists.print("Torrent was previously generated.")
+      if incremental and unchanged_entry and ScanLedger.is_settled(unchanged_entry, not_found_recheck_age, injecting):
+        progress.unchanged.increment()
       else:
-        p.generated.print(
-          f"Torrent can be cross-seeded to {new_tracker.site_shortname()}; successfully generated as '{new_torrent_filepath}'."
-        )
-    except TorrentDecodingError as e:
-      p.error.print(str(e))
-      continue
-    except UnknownTrackerError as e:
-      p.skipped.print(str(e))
-      continue
-    except TorrentAlreadyExistsError as e:
-      p.already_exists.print(str(e))
-      continue
-    except TorrentExistsInClientError as e:
-      p.already_exists.print(str(e))
-      continue
-    except TorrentNotFoundError as e:
-      p.not_found.print(str(e))
-      continue
+        yield ScanItem(number, filepath, infohash)
+
+
+def __hash_files(files, pool: "_LazyProcessPool | None", jobs: int):
+  if not pool:
+    yield from map(__hash_file, files)
+    return
+
+  chunk_size = max(1, min(MAX_HASHING_CHUNK_SIZE, PARALLEL_HASHING_THRESHOLD // (jobs * 4)))
+  pending = deque()
+
+  # Only a couple of chunks per worker are read ahead, so hashes come back while the walk carries on
+  for chunk in __batched(files, chunk_size):
+    # Chunks whose infohashes are all in the ledger are settled here rather than by a worker
+    if any(__needs_reading(file) for file in chunk):
+      pending.append(pool.submit(__hash_chunk, chunk))
+    else:
+      pending.append(__hash_chunk(chunk))
+
+    if len(pending) > jobs * 2:
+      yield from __chunk_result(pending.popleft())
+
+  while pending:
+    yield from __chunk_result(pending.popleft())
+
+
+def __chunk_result(chunk) -> list:
+  return chunk.result() if isinstance(chunk, Future) else chunk
+
+
+def __hash_chunk(files: list) -> list:
+  return [__hash_file(file) for file in files]
+
+
+def __needs_reading(file: tuple) -> bool:
+  # Unchanged files whose infohash is already in the ledger don't have to be read again
+  _, unchanged_entry = file
+  return not (unchanged_entry and unchanged_entry.infohash)
+
+
+def __hash_file(file: tuple) -> tuple:
+  filepath, unchanged_entry = file
+
+  if not __needs_reading(file):
+    return filepath, unchanged_entry, unchanged_entry.infohash
+
+  try:
+    return filepath, unchanged_entry, calculate_infohash_from_file(filepath)
+  except Exception:
+    return filepath, unchanged_entry, None
+
+
+def __batched(iterable, size: int):
+  iterator = iter(iterable)
+  while batch := list(islice(iterator, size)):
+    yield batch
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+  # Worker processes are started by a clean server process (or spawned) rather than forked from this one.
+  # Pools start their workers lazily, from whichever thread submits first, and forking while other threads
+  # (pipeline stages, the index reconciler, HTTP clients) hold locks can deadlock the child.
+  start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+  return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+
+
+class _LazyProcessPool:
+  """
+  A process pool that's only created when the first task is submitted to it.
+  """
+
+  def __init__(self, workers: int):
+    self.workers = workers
+    self._pool = None
+    self._lock = threading.Lock()
+
+  def submit(self, fn, *args) -> Future:
+    with self._lock:
+      if self._pool is None:
+        self._pool = _process_pool(self.workers)
+
+    return self._pool.submit(fn, *args)
+
+  def shutdown(self, cancel_futures: bool = False) -> None:
+    with self._lock:
+      if self._pool is not None:
+        self._pool.shutdown(cancel_futures=cancel_futures)
+
+
+def _calculate_reciprocal_hashes_without_data(source_torrent_path: str) -> tuple:
+  # The decoded torrent (pieces and all) is dropped here so it isn't sent back from worker
+  # processes or held in the lookup queues. It's decoded again only if a new torrent gets written.
+  _, new_tracker, all_possible_hashes = calculate_reciprocal_hashes(source_torrent_path)
+  return new_tracker, all_possible_hashes
+
+
+class ScanItem:
+  """
+  A single input torrent and everything learned about it as it moves through a `DirectoryScan`.
+  """
+
+  def __init__(self, number: int, source_torrent_path: str, source_infohash: str | None = None):
+    self.number = number
+    self.source_torrent_path = source_torrent_path
+    self.source_infohash = source_infohash
+    self.new_tracker = None
+    self.all_possible_hashes = None
+    self.new_source = None
+    self.new_hash = None
+    self.api_response = None
+    self.new_torrent_filepath = None
+    self.was_previously_generated = False
+    self.leads_flight = False
+
+
+class DirectoryScan:
+  """
+  Runs a directory scan as a pipeline of concurrent stages connected by bounded queues:
+
+    hashing -> RED lookup / OPS lookup -> writing -> injection
+
+  Hashing decodes and classifies each torrent and checks it against the local infohashes, the lookup
+  stages query the reciprocal tracker, writing saves the new .torrent file and injection queues it to be added
+  to the torrent client in batches (the last, partial batch is sent once the pipeline has drained). Every
+  stage has its own threads, so decoding and injection carry on while lookups wait for the tracker rate
+  limit. Torrents that were generated before skip straight to injection.
+
+  `input_infohashes` may keep growing while the scan runs (e.g. while the input directory is walked), and is
+  checked again right before each lookup. Nothing is written or injected until every item has been fed to the
+  scan: torrents that get that far are held until then and checked against the complete input infohashes, so
+  a counterpart that turns up late in the walk still makes them a duplicate.
+
+  Lookups are grouped by reciprocal tracker so RED and OPS are queried at the same time, each at its own
+  rate limit. Their queues are unbounded (items only carry hashes at that point) so a long run of torrents
+  for one tracker never leaves the other tracker idle.
+  """
+
+  def __init__(
+    self,
+    output_directory: str,
+    red_api: RedAPI,
+    ops_api: OpsAPI,
+    injector: Injection | None,
+    input_infohashes: dict,
+    output_infohashes: dict,
+    progress: Progress,
+    jobs: int = 1,
+    ledger: ScanLedger | None = None,
+    client_torrents: dict | None = None,
+    incomplete_sources: str | None = None,
+    flights: SingleFlight = SOURCE_TORRENT_FLIGHTS,
+    pool: _LazyProcessPool | None = None,
+  ):
+    self.output_directory = output_directory
+    self.red_api = red_api
+    self.ops_api = ops_api
+    self.injector = injector
+    self.input_infohashes = input_infohashes
+    self.output_infohashes = output_infohashes
+    self.progress = progress
+    self.jobs = jobs
+    self.ledger = ledger
+    self.client_torrents = client_torrents
+    self.incomplete_sources = incomplete_sources
+    self.flights = flights
+
+    self._pool = pool
+    self._report_lock = threading.Lock()
+    self._deferred_items = []
+    self._held_items = []
+    self._all_items_fed = False
+    self._led_flights = set()
+    self._followed_flights = []
+    # Anything a stage fails to handle is reported like any other error, which also lands the item's flight
+    on_error = self.__report_error
+    self.hashing = Stage("Hashing", self.__hash, workers=jobs, on_error=on_error)
+    self.lookups = {
+      tracker: Stage(f"{tracker.site_shortname()} lookup", self.__lookup, queue_size=0, on_error=on_error)
+      for tracker in (RedTracker, OpsTracker)
+    }
+    self.writing = Stage("Writing", self.__write, on_error=on_error)
+    self.injection = Stage("Injection", self.__inject, on_error=on_error)
+    self.pipeline = Pipeline([self.hashing, *self.lookups.values(), self.writing, self.injection])
+    progress.track_stages(self.pipeline.stages)
+
+  def run(self, items) -> None:
+    """
+    Feeds `items` through the pipeline as they come, so they may be produced lazily (e.g. by a directory walk),
+    and returns once every one of them has been handled.
+    """
+
+    self.pipeline.start()
+
+    try:
+      for item in items:
+        self.hashing.put(item)
+
+      self.__release_held_items()
+
+      if self.incomplete_sources == DEFER_INCOMPLETE_SOURCES:
+        self.hashing.join()
+        self.__resume_deferred_items()
+
+      self.pipeline.finish()
+
+      # Torrents still waiting for a full injection batch
+      if self.injector:
+        self.__report_injections(self.injector.flush())
+
+      self.__land_remaining_flights()
+
+      # Duplicates of torrents that were being generated elsewhere (e.g. by a webhook) are only reported
+      # once that finishes
+      for flight in self._followed_flights:
+        with suppress(Exception):
+          flight.wait()
+    finally:
+      self.__land_remaining_flights()
+
+  def __land_remaining_flights(self):
+    # Nothing may be left waiting on torrents this scan didn't get to finish
+    with self._report_lock:
+      keys, self._led_flights = self._led_flights, set()
+
+    for key in keys:
+      self.flights.land(key, error=Exception("The scan ended before this torrent was processed"))
+
+  def __take_off(self, item):
+    # Torrents whose source is already being worked on (a duplicate in the input directory, or a
+    # webhook for the same torrent) don't go through the pipeline again but share that outcome
+    if not item.source_infohash:
+      return True
+
+    flight, item.leads_flight = self.flights.join(item.source_infohash)
+
+    if item.leads_flight:
+      with self._report_lock:
+        self._led_flights.add(item.source_infohash)
+    else:
+      with self._report_lock:
+        self._followed_flights.append(flight)
+      flight.on_land(lambda flight: self.__follow(item, flight))
+
+    return item.leads_flight
+
+  def __land(self, item, **outcome):
+    if not item.leads_flight:
+      return
+
+    item.leads_flight = False
+    with self._report_lock:
+      self._led_flights.discard(item.source_infohash)
+    self.flights.land(item.source_infohash, **outcome)
+
+  def __follow(self, item, flight):
+    if flight.error is not None:
+      self.__report_error(item, flight.error)
+    elif flight.abandoned:
+      self.__report_incomplete(item)
+    else:
+      item.new_tracker, item.new_torrent_filepath, item.was_previously_generated = flight.result
+      self.__report_success(item)
+
+  def __hash(self, item):
+    if not self.__take_off(item):
+      return
+
+    try:
+      if self._pool:
+        future = self._pool.submit(_calculate_reciprocal_hashes_without_data, item.source_torrent_path)
+        item.new_tracker, item.all_possible_hashes = future.result()
+      else:
+        item.new_tracker, item.all_possible_hashes = _calculate_reciprocal_hashes_without_data(item.source_torrent_path)
+
+      existing_torrent_filepath = find_existing_torrent(
+        item.all_possible_hashes, self.input_infohashes, self.output_infohashes, self.client_torrents
+      )
     except Exception as e:
-      p.error.print(str(e))
-      continue
+      return self.__report_error(item, e)
 
-  return p.report()
+    if existing_torrent_filepath:
+      item.new_torrent_filepath = existing_torrent_filepath
+      item.was_previously_generated = True
+      self.__once_all_items_fed(item, self.__written)
+    elif self.incomplete_sources and not self.__is_complete_in_client(item):
+      if self.incomplete_sources == DEFER_INCOMPLETE_SOURCES:
+        with self._report_lock:
+          self._deferred_items.append(item)
+      else:
+        self.__report_incomplete(item)
+    else:
+      self.lookups[item.new_tracker].put(item)
+
+  def __resume_deferred_items(self):
+    if not self._deferred_items:
+      return
+
+    # Downloads may have finished while the rest of the scan ran
+    try:
+      self.injector.refresh_snapshot()
+    except Exception as e:
+      for item in self._deferred_items:
+        self.__report_error(item, e)
+      return
+
+    for item in sorted(self._deferred_items, key=lambda item: item.number):
+      if self.__is_complete_in_client(item):
+        self.lookups[item.new_tracker].put(item)
+      else:
+        self.__report_incomplete(item)
 
+  def __is_complete_in_client(self, item):
+    torrent_info = self.__source_torrent_info_from_client(item)
+    return bool(torrent_info and torrent_info["complete"])
 
-def __collect_infohashes_from_files(files: list[str]) -> dict:
-  infohash_dict = {}
+  def __source_torrent_info_from_client(self, item):
+    return (self.client_torrents or {}).get((item.source_infohash or "").lower())
 
-  for filepath in files:
+  def __report_incomplete(self, item):
+    if self.__source_torrent_info_from_client(item) is None:
+      self.__report(item, INCOMPLETE, "Source torrent was not found in your torrent client.")
+    else:
+      self.__report(item, INCOMPLETE, "Source torrent is not complete in your torrent client.")
+
+    self.__land(item, abandoned=True)
+
+  def __lookup(self, item):
+    try:
+      # The input directory is still being walked while lookups wait for the rate limit, so the torrent
+      # may have turned up there since it was hashed
+      find_existing_torrent(item.all_possible_hashes, self.input_infohashes, {})
+
+      new_tracker_api = get_tracker_api(item.new_tracker, self.red_api, self.ops_api)
+      item.new_source, item.new_hash, item.api_response = find_torrent_on_tracker(
+        item.new_tracker, new_tracker_api, item.all_possible_hashes
+      )
+    except Exception as e:
+      return self.__report_error(item, e)
+
+    self.__once_all_items_fed(item, self.writing.put)
+
+  def __once_all_items_fed(self, item, next_step):
+    with self._report_lock:
+      if not self._all_items_fed:
+        self._held_items.append((item, next_step))
+        return
+
+    self.__recheck_input(item, next_step)
+
+  def __release_held_items(self):
+    with self._report_lock:
+      self._all_items_fed = True
+      held_items, self._held_items = self._held_items, []
+
+    for item, next_step in sorted(held_items, key=lambda held_item: held_item[0].number):
+      self.__recheck_input(item, next_step)
+
+  def __recheck_input(self, item, next_step):
+    # The input infohashes are complete by now, including counterparts walked after this torrent was checked
     try:
-      torrent_data = get_bencoded_data(filepath)
+      find_existing_torrent(item.all_possible_hashes, self.input_infohashes, {})
+    except Exception as e:
+      return self.__report_error(item, e)
+
+    next_step(item)
+
+  def __write(self, item):
+    try:
+      item.new_torrent_filepath, item.was_previously_generated = save_new_torrent(
+        item.source_torrent_path,
+        self.output_directory,
+        item.new_tracker,
+        get_tracker_api(item.new_tracker, self.red_api, self.ops_api),
+        item.new_source,
+        item.new_hash,
+        item.api_response,
+        self.output_infohashes,
+      )
+    except Exception as e:
+      return self.__report_error(item, e)
+
+    self.__written(item)
+
+  def __written(self, item):
+    if self.injector:
+      self.injection.put(item)
+    else:
+      self.__report_success(item)
+
+  def __inject(self, item):
+    try:
+      results = self.injector.queue_torrent(
+        item.source_torrent_path,
+        item.new_torrent_filepath,
+        item.new_tracker.site_shortname(),
+        key=item,
+      )
+    except Exception as e:
+      return self.__report_error(item, e)
+
+    self.__report_injections(results)
+
+  def __report_injections(self, results):
+    for item, result in results:
+      if isinstance(result, Exception):
+        self.__report_error(item, result)
+      else:
+        self.__report_success(item)
+
+  def __report_success(self, item):
+    if item.was_previously_generated:
+      if self.injector:
+        self.__report(
+          item, ALREADY_EXISTS, "Torrent was previously generated but was injected into your torrent client."
+        )
+      else:
+        self.__report(item, ALREADY_EXISTS, "Torrent was previously generated.")
+    else:
+      self.__report(
+        item,
+        GENERATED,
+        f"Torrent can be cross-seeded to {item.new_tracker.site_shortname()}; successfully generated as '{item.new_torrent_filepath}'.",
+      )
+
+    self.__land(item, result=(item.new_tracker, item.new_torrent_filepath, item.was_previously_generated))
+
+  def __report_error(self, item, error):
+    if isinstance(error, TorrentDecodingError):
+      outcome = ERROR
+    elif isinstance(error, UnknownTrackerError):
+      outcome = SKIPPED
+    elif isinstance(error, (TorrentAlreadyExistsError, TorrentExistsInClientError)):
+      outcome = ALREADY_EXISTS
+    elif isinstance(error, TorrentNotFoundError):
+      outcome = NOT_FOUND
+    else:
+      outcome = ERROR
+
+    self.__report(item, outcome, str(error))
+    self.__land(item, error=error)
+
+  def __report(self, item, outcome, message):
+    # Ledger outcomes share their names with the matching `Progress` statuses
+    status = getattr(self.progress, outcome)
 
-      if torrent_data:
-        infohash = calculate_infohash(torrent_data)
-        infohash_dict[infohash] = filepath
-    except Exception:
-      continue
+    if self.ledger:
+      injected = bool(self.injector) and outcome in INJECTABLE_OUTCOMES
+      self.ledger.record(item.source_torrent_path, outcome, item.source_infohash, injected)
 
-  return infohash_dict
+    with self._report_lock:
+      print(f"({item.number}/{self.progress.total}) {os.path.basename(item.source_torrent_path)}")
+      status.print(message)
@@ -0,0 +1,147 @@
+import threading
+
+
+class Flight:
+  """
+  A piece of work in progress under a `SingleFlight` key. Its leader lands it with a result or an error,
+  which every follower then receives as well.
+  """
+
+  def __init__(self):
+    self.result = None
+    self.error = None
+    self.abandoned = False
+    self.followers = 0
+
+    self._done = False
+    self._landed = threading.Event()
+    self._callbacks = []
+    self._lock = threading.Lock()
+
+  @property
+  def landed(self) -> bool:
+    return self._landed.is_set()
+
+  def wait(self, timeout: float | None = None):
+    """
+    Blocks until the flight has landed and returns its result.
+
+    Returns:
+      The leader's result.
+    Raises:
+      The leader's error, if it failed. `TimeoutError` if `timeout` seconds pass first.
+    """
+
+    if not self._landed.wait(timeout):
+      raise TimeoutError("Timed out waiting for a concurrent call to finish")
+    if self.error is not None:
+      raise self.error
+
+    return self.result
+
+  def on_land(self, callback) -> None:
+    """
+    Calls `callback(flight)` once the flight has landed, right away if it already has.
+
+    This lets followers that can't block (e.g. a pipeline stage) pick up the outcome later.
+    """
+
+    with self._lock:
+      if not self._done:
+        self._callbacks.append(callback)
+        return
+
+    callback(self)
+
+  def _land(self, result, error, abandoned):
+    with self._lock:
+      self.result = result
+      self.error = error
+      self.abandoned = abandoned
+      self._done = True
+      callbacks, self._callbacks = self._callbacks, []
+
+    try:
+      for callback in callbacks:
+        callback(self)
+    finally:
+      # Only now, so that whoever waits for the flight also sees what its callbacks did
+      self._landed.set()
+
+
+class SingleFlight:
+  """
+  Deduplicates concurrent work by key: while one caller (the leader) works on a key, every other caller
+  for the same key (a follower) joins its flight and gets the same result or error instead of doing
+  the work again.
+
+  Flights only last as long as the work does. Once one has landed, the next caller for its key leads a new one.
+  """
+
+  def __init__(self):
+    self._flights = {}
+    self._lock = threading.Lock()
+
+  def join(self, key) -> tuple[Flight, bool]:
+    """
+    Joins the flight for `key`, starting one if there's none in progress.
+
+    Returns:
+      A tuple of the `Flight` and whether the caller leads it. The leader must `land` it when done.
+    """
+
+    with self._lock:
+      flight = self._flights.get(key)
+      if flight is not None:
+        flight.followers += 1
+        return flight, False
+
+      flight = self._flights[key] = Flight()
+      return flight, True
+
+  def land(self, key, result=None, error: BaseException | None = None, abandoned: bool = False) -> None:
+    """
+    Ends the flight for `key`, handing `result` or `error` to its followers.
+
+    `abandoned` means the leader gave up without an outcome worth sharing, so followers have to do the work
+    themselves.
+    """
+
+    with self._lock:
+      flight = self._flights.pop(key, None)
+
+    if flight is not None:
+      flight._land(result, error, abandoned)
+
+  def do(self, key, func, *args, **kwargs):
+    """
+    Calls `func(*args, **kwargs)` unless a call for `key` is already in progress, in which case its
+    outcome is waited for and shared.
+
+    Returns:
+      The result of `func`, whichever caller ran it.
+    Raises:
+      Whatever `func` raised, whichever caller ran it.
+    """
+
+    while True:
+      flight, is_leader = self.join(key)
+
+      if is_leader:
+        try:
+          result = func(*args, **kwargs)
+        except BaseException as e:
+          self.land(key, error=e)
+          raise
+
+        self.land(key, result=result)
+        return result
+
+      flight.wait()
+      if not flight.abandoned:
+        return flight.result
+
+
+# Shared by everything that generates torrents in this process (webhooks and scans alike), keyed by the
+# infohash of the source torrent
+SOURCE_TORRENT_FLIGHTS = SingleFlight()
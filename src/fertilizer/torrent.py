@@ -1,14 +1,24 @@
-import copy
 import os
 from html import unescape
 
 from .api import RedAPI, OpsAPI
-from .errors import TorrentDecodingError, UnknownTrackerError, TorrentNotFoundError, TorrentAlreadyExistsError
+from .errors import (
+  TorrentDecodingError,
+  UnknownTrackerError,
+  TorrentNotFoundError,
+  TorrentAlreadyExistsError,
+  TorrentExistsInClientError,
+)
 from .filesystem import replace_extension
+from .index import MemoryInfohashIndex
 from .parser import (
+  ORIGIN_TRACKER_KEY_PATHS,
+  decode_bencoded_data,
   get_bencoded_data,
+  get_bencoded_values,
+  get_partial_bencoded_data,
   get_origin_tracker,
-  recalculate_hash_for_new_source,
+  calculate_source_variant_hashes,
   save_bencoded_data,
 )
 from .trackers import RedTracker, OpsTracker
@@ -21,6 +31,7 @@ def generate_new_torrent_from_file(
   ops_api: OpsAPI,
   input_infohashes=None,
   output_infohashes=None,
+  client_infohashes=None,
 ) -> tuple[OpsTracker | RedTracker, str, bool]:
   """
   Generates a new torrent file for the reciprocal tracker of the original torrent file if it exists on the reciprocal tracker.
@@ -31,7 +42,8 @@ def generate_new_torrent_from_file(
     `red_api` (`RedApi`): The pre-configured API object for RED.
     `ops_api` (`OpsApi`): The pre-configured API object for OPS.
     `input_infohashes` (`dict`, optional): A dictionary of infohashes and their filenames from the input directory for caching purposes. Defaults to an empty dictionary.
-    `output_infohashes` (`dict`, optional): A dictionary of infohashes and their filenames from the output directory for caching purposes. Defaults to an empty dictionary.
+    `output_infohashes` (`InfohashIndex`, `ResidentInfohashIndex` or `MemoryInfohashIndex`, optional): An index of the infohashes and filenames in the output directory for caching purposes. Newly generated torrents are added to it. Defaults to an empty `MemoryInfohashIndex`.
+    `client_infohashes` (`set`, `dict` or `ClientInfohashes`, optional): The lowercase infohashes of the torrents in the torrent client. Candidates found here are rejected before any tracker API call. Defaults to an empty set.
   Returns:
     A tuple containing the new tracker class (`RedTracker` or `OpsTracker`), the path to the new torrent file, and a boolean
     representing whether the torrent already existed (False: created just now, True: torrent file already existed).
@@ -40,54 +52,116 @@ def generate_new_torrent_from_file(
     `UnknownTrackerError`: if the original torrent file is not from OPS or RED.
     `TorrentNotFoundError`: if the original torrent file could not be found on the reciprocal tracker.
     `TorrentAlreadyExistsError`: if the new torrent file already exists in the input or output directory.
+    `TorrentExistsInClientError`: if the new torrent already exists in the torrent client.
     `Exception`: if an unknown error occurs.
   """
 
   if output_infohashes is None:
-    output_infohashes = {}
+    output_infohashes = MemoryInfohashIndex()
   if input_infohashes is None:
     input_infohashes = {}
+  source_torrent_data, new_tracker, all_possible_hashes = calculate_reciprocal_hashes(source_torrent_path)
+
+  existing_torrent_filepath = find_existing_torrent(
+    all_possible_hashes, input_infohashes, output_infohashes, client_infohashes
+  )
+  if existing_torrent_filepath:
+    return new_tracker, existing_torrent_filepath, True
+
+  new_tracker_api = get_tracker_api(new_tracker, red_api, ops_api)
+  new_source, new_hash, api_response = find_torrent_on_tracker(new_tracker, new_tracker_api, all_possible_hashes)
+  new_torrent_filepath, was_previously_generated = save_new_torrent(
+    source_torrent_path,
+    output_directory,
+    new_tracker,
+    new_tracker_api,
+    new_source,
+    new_hash,
+    api_response,
+    output_infohashes,
+    source_torrent_data,
+  )
+
+  return new_tracker, new_torrent_filepath, was_previously_generated
+
+
+def calculate_reciprocal_hashes(source_torrent_path: str) -> tuple[dict, OpsTracker | RedTracker, dict]:
+  """
+  Decodes a torrent file and calculates every infohash it could have on the reciprocal tracker.
+
+  Returns:
+    A tuple of the decoded torrent data, the reciprocal tracker class and a dictionary of each
+    source flag used for creation to the infohash the new torrent would have with it.
+  Raises:
+    `TorrentDecodingError`: if the torrent file could not be decoded.
+    `UnknownTrackerError`: if the torrent file is not from OPS or RED.
+  """
+
   source_torrent_data, source_tracker = __get_bencoded_data_and_tracker(source_torrent_path)
-  new_torrent_data = copy.deepcopy(source_torrent_data)
   new_tracker = source_tracker.reciprocal_tracker()
-  new_tracker_api = __get_new_tracker_api(new_tracker, red_api, ops_api)
-  stored_api_response = None
+  all_possible_hashes = calculate_source_variant_hashes(source_torrent_data, new_tracker.source_flags_for_creation())
+
+  return source_torrent_data, new_tracker, all_possible_hashes
 
-  all_possible_hashes = __calculate_all_possible_hashes(source_torrent_data, new_tracker.source_flags_for_creation())
-  found_input_hash = __check_matching_hashes(all_possible_hashes, input_infohashes)
-  found_output_hash = __check_matching_hashes(all_possible_hashes, output_infohashes)
+
+def find_existing_torrent(
+  all_possible_hashes: dict,
+  input_infohashes: dict,
+  output_infohashes: dict,
+  client_infohashes=None,
+) -> str | None:
+  """
+  Checks the candidate infohashes against the torrents that already exist locally.
+
+  Returns:
+    The path of the previously generated torrent in the output directory, or None.
+  Raises:
+    `TorrentAlreadyExistsError`: if the torrent already exists in the input directory.
+    `TorrentExistsInClientError`: if the torrent isn't in the output directory but is in the torrent client.
+  """
+
+  found_input_hash = __check_matching_hashes(all_possible_hashes.values(), input_infohashes)
+  found_output_hash = __check_matching_hashes(all_possible_hashes.values(), output_infohashes)
 
   if found_input_hash:
     raise TorrentAlreadyExistsError(
       f"Torrent already exists in input directory at {input_infohashes[found_input_hash]}"
     )
   if found_output_hash:
-    return new_tracker, output_infohashes[found_output_hash], True
+    return output_infohashes[found_output_hash]
 
-  for new_source in new_tracker.source_flags_for_creation():
-    new_hash = recalculate_hash_for_new_source(source_torrent_data, new_source)
-    stored_api_response = new_tracker_api.find_torrent(new_hash)
+  # Torrent clients report infohashes in lowercase
+  found_client_hash = __check_matching_hashes(
+    [h.lower() for h in all_possible_hashes.values()], client_infohashes or {}
+  )
+  if found_client_hash:
+    raise TorrentExistsInClientError(f"New torrent already exists in client ({found_client_hash})")
 
-    if stored_api_response["status"] == "success":
-      new_torrent_filepath = __generate_torrent_output_filepath(
-        stored_api_response,
-        new_tracker,
-        new_source.decode("utf-8"),
-        output_directory,
-      )
+  return None
 
-      if os.path.exists(new_torrent_filepath):
-        return new_tracker, new_torrent_filepath, True
 
-      if new_torrent_filepath:
-        torrent_id = __get_torrent_id(stored_api_response)
+def find_torrent_on_tracker(
+  new_tracker: OpsTracker | RedTracker,
+  new_tracker_api: RedAPI | OpsAPI,
+  all_possible_hashes: dict,
+) -> tuple[bytes, str, dict]:
+  """
+  Looks up each candidate infohash on the reciprocal tracker until one is found.
 
-        new_torrent_data[b"info"][b"source"] = new_source  # This is already bytes rather than str
-        new_torrent_data[b"announce"] = new_tracker_api.announce_url.encode()
-        new_torrent_data[b"comment"] = __generate_torrent_url(new_tracker_api.site_url, torrent_id).encode()
-        save_bencoded_data(new_torrent_filepath, new_torrent_data)
+  Returns:
+    A tuple of the matching source flag, its infohash and the API response.
+  Raises:
+    `TorrentNotFoundError`: if none of the infohashes exist on the tracker.
+    `Exception`: if an unknown error occurs.
+  """
 
-        return new_tracker, new_torrent_filepath, False
+  stored_api_response = None
+
+  for new_source, new_hash in all_possible_hashes.items():
+    stored_api_response = new_tracker_api.find_torrent(new_hash)
+
+    if stored_api_response["status"] == "success":
+      return new_source, new_hash, stored_api_response
 
   if stored_api_response["error"] in ("bad hash parameter", "bad parameters"):
     raise TorrentNotFoundError(f"Torrent could not be found on {new_tracker.site_shortname()}")
@@ -95,11 +169,64 @@ def generate_new_torrent_from_file(
   raise Exception(f"An unknown error occurred in the API response from {new_tracker.site_shortname()}")
 
 
-def __calculate_all_possible_hashes(source_torrent_data: dict, sources: list[str]) -> list[str]:
-  return [recalculate_hash_for_new_source(source_torrent_data, source) for source in sources]
+def save_new_torrent(
+  source_torrent_path: str,
+  output_directory: str,
+  new_tracker: OpsTracker | RedTracker,
+  new_tracker_api: RedAPI | OpsAPI,
+  new_source: bytes,
+  new_hash: str,
+  api_response: dict,
+  output_infohashes: dict,
+  source_torrent_data: dict | None = None,
+) -> tuple[str, bool]:
+  """
+  Writes the torrent found by `find_torrent_on_tracker` to the output directory.
+
+  Returns:
+    A tuple of the path to the new torrent file and whether it already existed.
+  Raises:
+    `TorrentDecodingError`: if `source_torrent_data` isn't given and the torrent file could not be decoded.
+  """
+
+  new_torrent_filepath = __generate_torrent_output_filepath(
+    api_response,
+    new_tracker,
+    new_source.decode("utf-8"),
+    output_directory,
+  )
+
+  if os.path.exists(new_torrent_filepath):
+    return new_torrent_filepath, True
+
+  if source_torrent_data is None:
+    source_torrent_data = get_bencoded_data(source_torrent_path)
+  if not source_torrent_data or not source_torrent_data.get(b"info"):
+    raise TorrentDecodingError("Error decoding torrent file")
+
+  torrent_id = __get_torrent_id(api_response)
+
+  # Only `info` is mutated below so shallow copies are enough to leave the source data untouched
+  new_torrent_data = {**source_torrent_data, b"info": {**source_torrent_data[b"info"]}}
+  new_torrent_data[b"info"][b"source"] = new_source  # This is already bytes rather than str
+  new_torrent_data[b"announce"] = new_tracker_api.announce_url.encode()
+  new_torrent_data[b"comment"] = __generate_torrent_url(new_tracker_api.site_url, torrent_id).encode()
+  save_bencoded_data(new_torrent_filepath, new_torrent_data)
+
+  # Indexes are told what they'd otherwise have to read back from the file that was just written
+  output_infohashes.add(new_hash, new_torrent_filepath, new_tracker.site_shortname(), new_source.decode("utf-8"))
+
+  return new_torrent_filepath, False
+
+
+def get_tracker_api(new_tracker: OpsTracker | RedTracker, red_api: RedAPI, ops_api: OpsAPI) -> RedAPI | OpsAPI:
+  if new_tracker == RedTracker:
+    return red_api
+
+  return ops_api
 
 
-def __check_matching_hashes(all_possible_hashes: list[str], infohashes: dict) -> str | None:
+def __check_matching_hashes(all_possible_hashes, infohashes: dict) -> str | None:
   for hash in all_possible_hashes:
     if hash in infohashes:
       return hash
@@ -138,25 +265,36 @@ def __get_bencoded_data_and_tracker(torrent_path):
   # qbit stores that information in a sidecar file that has the exact same name
   # as the torrent file but with a `.fastresume` extension instead. It's also stored
   # in a list of lists called `trackers` in this `.fastresume` file instead of `announce`.
+  #
+  # Only the keys needed to classify the torrent are decoded up front so torrents from other
+  # trackers (and every `.fastresume` file) never have their pieces or file lists materialized.
+  #
+  # The file is read once: its bytes are classified first and only fully decoded if it's from RED or OPS.
   fastresume_path = replace_extension(torrent_path, ".fastresume")
-  source_torrent_data = get_bencoded_data(torrent_path)
-  fastresume_data = get_bencoded_data(fastresume_path)
 
-  if not source_torrent_data or not source_torrent_data.get(b"info"):
+  try:
+    with open(torrent_path, "rb") as f:
+      torrent_bytes = f.read()
+
+    torrent_classification_data = get_bencoded_values(torrent_bytes, ORIGIN_TRACKER_KEY_PATHS)
+  except Exception:
+    torrent_classification_data = None
+
+  if not torrent_classification_data or b"info" not in torrent_classification_data:
     raise TorrentDecodingError("Error decoding torrent file")
 
-  torrent_tracker = get_origin_tracker(source_torrent_data)
-  fastresume_tracker = get_origin_tracker(fastresume_data) if fastresume_data else None
-  source_tracker = torrent_tracker or fastresume_tracker
+  source_tracker = get_origin_tracker(torrent_classification_data)
 
   if not source_tracker:
-    raise UnknownTrackerError("Torrent not from OPS or RED based on source or announce URL")
+    fastresume_data = get_partial_bencoded_data(fastresume_path, ORIGIN_TRACKER_KEY_PATHS)
+    source_tracker = get_origin_tracker(fastresume_data) if fastresume_data else None
 
-  return source_torrent_data, source_tracker
+  if not source_tracker:
+    raise UnknownTrackerError("Torrent not from OPS or RED based on source or announce URL")
 
+  source_torrent_data = decode_bencoded_data(torrent_bytes)
 
-def __get_new_tracker_api(new_tracker, red_api, ops_api):
-  if new_tracker == RedTracker:
-    return red_api
+  if not source_torrent_data or not source_torrent_data.get(b"info"):
+    raise TorrentDecodingError("Error decoding torrent file")
 
-  return ops_api
+  return source_torrent_data, source_tracker
@@ -1,23 +1,47 @@
+import json
 import logging
 import os
+import signal
+from collections import deque
+from queue import Queue
 
-from flask import Flask, request
+from flask import Flask, Response, request
 
-from fertilizer.errors import TorrentAlreadyExistsError, TorrentNotFoundError
+from fertilizer.errors import JobQueueFullError, TorrentAlreadyExistsError, TorrentNotFoundError
+from fertilizer.filesystem import mkdir_p
+from fertilizer.http_server import (
+  DEFAULT_SERVER_QUEUE_SIZE,
+  DEFAULT_SERVER_TIMEOUT,
+  DEFAULT_SERVER_WORKERS,
+  PooledWSGIServer,
+)
+from fertilizer.index import InfohashIndex, ResidentInfohashIndex
+from fertilizer.jobs import DEFAULT_JOB_WORKERS, JobQueue
 from fertilizer.parser import is_valid_infohash
 from fertilizer.scanner import scan_torrent_file
 
 app = Flask(__name__)
 
+# Long-polling callers are let go after this many seconds at most and can simply poll again
+MAX_JOB_WAIT = 300
+
 
 @app.before_request
 def log_request_info():
-  app.logger.info(f"Incoming webhook with body: {request.get_data()}")
+  # Batches can hold thousands of infohashes, each of which is reported on individually anyway
+  if request.endpoint == "webhook_batch":
+    app.logger.info(f"Incoming batch webhook of {request.content_length} bytes")
+  else:
+    app.logger.info(f"Incoming webhook with body: {request.get_data()}")
 
 
 @app.after_request
 def log_response_info(response):
-  app.logger.info(f"Responding: {response.get_data()}")
+  # Reading the body of a streamed response would consume the stream before it reaches the client
+  if response.is_streamed:
+    app.logger.info(f"Responding: streamed {response.mimetype}")
+  else:
+    app.logger.info(f"Responding: {response.get_data()}")
   return response
 
 
@@ -37,12 +61,147 @@ def webhook():
     return http_error(f"No torrent found at {filepath}", 404)
 
   try:
-    new_filepath = scan_torrent_file(
+    job = config["jobs"].submit(
+      __scan_webhook_torrent,
       filepath,
       config["output_dir"],
       config["red_api"],
       config["ops_api"],
       config["injector"],
+      config.get("output_infohashes"),
+    )
+  except JobQueueFullError as e:
+    return http_error(str(e), 503)
+
+  body, code = http_success("Job queued", 202, job=job.to_dict())
+  return body, code, {"Location": f"/api/jobs/{job.id}"}
+
+
+@app.route("/api/webhook/batch", methods=["POST"])
+def webhook_batch():
+  config = app.config
+  infohashes = __batch_infohashes()
+
+  if infohashes is None:
+    return http_error("Request must include a list of infohashes", 400)
+  if not infohashes:
+    return http_error("Request must include at least one infohash", 400)
+
+  scan_args = (
+    config["output_dir"],
+    config["red_api"],
+    config["ops_api"],
+    config["injector"],
+    config.get("output_infohashes"),
+  )
+  results = __stream_batch_results(infohashes, config["input_dir"], config["jobs"], scan_args)
+
+  return Response((json.dumps(result) + "\n" for result in results), mimetype="application/x-ndjson")
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+  job = app.config["jobs"].get(job_id)
+  if job is None:
+    return http_error(f"No job found with id {job_id}", 404)
+
+  wait = request.args.get("wait")
+  if wait is not None:
+    try:
+      wait = float(wait)
+    except ValueError:
+      return http_error("Invalid wait: Must be a number of seconds", 400)
+    if not 0 <= wait <= MAX_JOB_WAIT:
+      return http_error(f"Invalid wait: Must be between 0 and {MAX_JOB_WAIT} seconds", 400)
+
+    job.wait(wait)
+
+  if not job.done:
+    return http_success(f"Job is {job.status}", 202, job=job.to_dict())
+  if job.error is not None:
+    return http_error(str(job.error), 500, job=job.to_dict())
+
+  body, code = job.result
+  return {**body, "job": job.to_dict()}, code
+
+
+def __batch_infohashes():
+  if request.is_json:
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+      payload = payload.get("infohashes")
+    if not isinstance(payload, list):
+      return None
+  elif request.form:
+    payload = request.form.getlist("infohash")
+  else:
+    payload = request.get_data(as_text=True).splitlines()
+
+  # Deduplicated while keeping the order they were sent in
+  infohashes = (str(infohash).strip() for infohash in payload)
+  return list(dict.fromkeys(infohash for infohash in infohashes if infohash))
+
+
+def __stream_batch_results(infohashes, input_dir, jobs, scan_args):
+  """
+  Yields a result for every infohash of a batch as soon as it's known.
+
+  Infohashes that don't pass validation are reported right away. The others are scanned on the job queue,
+  but never more at once than it has workers, so a large batch neither fills up the queue nor holds up
+  webhooks arriving in the meantime. Their results are yielded in the order they complete.
+  """
+
+  pending = deque()
+  for infohash in infohashes:
+    # NOTE: always ensure safety checks are done before this filepath is ever used
+    filepath = f"{input_dir}/{infohash}.torrent"
+
+    if not is_valid_infohash(infohash):
+      yield __batch_result(infohash, http_error("Invalid infohash", 400))
+    elif not os.path.exists(filepath):
+      yield __batch_result(infohash, http_error(f"No torrent found at {filepath}", 404))
+    else:
+      pending.append((infohash, filepath))
+
+  completed = Queue()
+  in_flight = 0
+
+  def scan(infohash, filepath):
+    try:
+      completed.put((infohash, __scan_webhook_torrent(filepath, *scan_args)))
+    except BaseException as e:
+      completed.put((infohash, http_error(str(e), 500)))
+      raise
+
+  while pending or in_flight:
+    while pending and in_flight < jobs.workers:
+      infohash, filepath = pending.popleft()
+
+      try:
+        jobs.submit(scan, infohash, filepath)
+        in_flight += 1
+      except JobQueueFullError as e:
+        yield __batch_result(infohash, http_error(str(e), 503))
+
+    if in_flight:
+      yield __batch_result(*completed.get())
+      in_flight -= 1
+
+
+def __batch_result(infohash, response):
+  body, code = response
+  return {"infohash": infohash, **body, "code": code}
+
+
+def __scan_webhook_torrent(filepath, output_dir, red_api, ops_api, injector, output_infohashes):
+  try:
+    new_filepath = scan_torrent_file(
+      filepath,
+      output_dir,
+      red_api,
+      ops_api,
+      injector,
+      output_infohashes=output_infohashes,
     )
 
     return http_success(new_filepath, 201)
@@ -59,15 +218,27 @@ def page_not_found(_e):
   return http_error("Not found", 404)
 
 
-def http_success(message, code):
-  return {"status": "success", "message": message}, code
+def http_success(message, code, **extra):
+  return {"status": "success", "message": message, **extra}, code
 
 
-def http_error(message, code):
-  return {"status": "error", "message": message}, code
+def http_error(message, code, **extra):
+  return {"status": "error", "message": message, **extra}, code
 
 
-def run_webserver(input_dir, output_dir, red_api, ops_api, injector, host="0.0.0.0", port=9713):
+def run_webserver(
+  input_dir,
+  output_dir,
+  red_api,
+  ops_api,
+  injector,
+  host="0.0.0.0",
+  port=9713,
+  webhook_workers=DEFAULT_JOB_WORKERS,
+  server_workers=DEFAULT_SERVER_WORKERS,
+  server_queue_size=DEFAULT_SERVER_QUEUE_SIZE,
+  server_timeout=DEFAULT_SERVER_TIMEOUT,
+):
   app.logger.setLevel(logging.INFO)
   app.config.update(
     {
@@ -76,7 +247,26 @@ def run_webserver(input_dir, output_dir, red_api, ops_api, injector, host="0.0.0
       "red_api": red_api,
       "ops_api": ops_api,
       "injector": injector,
+      # Built once and kept up to date in memory, so requests don't each re-read the output directory
+      "output_infohashes": ResidentInfohashIndex(InfohashIndex(mkdir_p(output_dir))).start(),
+      # Webhooks are handled in the background so callers aren't held up by slow or backed off tracker requests
+      "jobs": JobQueue(webhook_workers),
     }
   )
 
-  app.run(debug=False, host=host, port=port)
+  server = PooledWSGIServer(
+    host, int(port), app, workers=server_workers, queue_size=server_queue_size, connection_timeout=server_timeout
+  )
+  # `serve_forever` already returns on Ctrl+C; SIGTERM (e.g. `docker stop`) gets the same graceful shutdown
+  previous_sigterm_handler = signal.signal(signal.SIGTERM, lambda *_args: server.stop())
+  app.logger.info(f"Serving on http://{host}:{server.port} with {server_workers} workers")
+
+  try:
+    server.serve_forever()
+  finally:
+    app.logger.info("Shutting down: finishing in-flight requests and jobs")
+    # Requests first, since they can still queue jobs
+    server.drain()
+    app.config["jobs"].shutdown(wait=True)
+    app.config["output_infohashes"].stop()
+    signal.signal(signal.SIGTERM, previous_sigterm_handler)
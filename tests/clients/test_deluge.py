@@ -9,6 +9,7 @@ from tests.support.deluge_matchers import (
   apply_label_matcher,
   auth_matcher,
   connected_matcher,
+  deluge_matcher,
   get_labels_matcher,
   label_plugin_matcher,
   torrent_info_matcher,
@@ -16,6 +17,7 @@ from tests.support.deluge_matchers import (
 
 from fertilizer.errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from fertilizer.clients.deluge import Deluge
+from fertilizer.parser import calculate_infohash_from_file
 
 
 @pytest.fixture
@@ -42,7 +44,7 @@ def torrent_info_response():
 
 class TestSetup(SetupTeardown):
   def test_sets_auth_cookie(self, api_url, deluge_client):
-    assert deluge_client._deluge_cookie is None
+    assert "Cookie" not in deluge_client._session.headers
 
     with requests_mock.Mocker() as m:
       m.post(
@@ -57,7 +59,7 @@ class TestSetup(SetupTeardown):
       response = deluge_client.setup()
 
       assert response
-      assert deluge_client._deluge_cookie is not None
+      assert deluge_client._session.headers["Cookie"] == "supersecret"
 
   def test_raises_exception_on_failed_auth(self, api_url, deluge_client):
     with requests_mock.Mocker() as m:
@@ -204,16 +206,47 @@ class TestGetTorrentInfo(SetupTeardown):
       m.post(api_url, additional_matcher=auth_matcher, json={"result": True}, headers={"Set-Cookie": "supersecret"})
       m.post(api_url, additional_matcher=connected_matcher, json={"result": True})
 
-      deluge_client._deluge_cookie = None
+      deluge_client._session.headers.pop("Cookie", None)
       with pytest.raises(TorrentClientAuthenticationError):
         deluge_client.get_torrent_info("foo")
 
-      assert deluge_client._deluge_cookie is not None
+      assert deluge_client._session.headers["Cookie"] == "supersecret"
       assert m.request_history[-3].json()["method"] == "auth.login"
       assert m.request_history[-2].json()["method"] == "web.connected"
       assert m.request_history[-1].json()["method"] == "web.update_ui"
 
 
+class TestGetAllTorrentInfo(SetupTeardown):
+  def test_returns_details_of_every_torrent_keyed_by_infohash(self, api_url, deluge_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(
+        api_url,
+        additional_matcher=torrent_info_matcher,
+        json={"result": {"torrents": {"ABC123": torrent_info_response}}},
+      )
+
+      response = deluge_client.get_all_torrent_info()
+
+      assert m.last_request.json()["params"][1] == {}
+      assert response == {
+        "abc123": {
+          "complete": True,
+          "label": "fertilizer",
+          "save_path": "/tmp/bar/",
+          "content_path": "/tmp/bar/foo",
+        }
+      }
+
+  def test_raises_on_unexpected_response(self, api_url, deluge_client):
+    with requests_mock.Mocker() as m:
+      m.post(api_url, additional_matcher=torrent_info_matcher, json={"result": {}})
+
+      with pytest.raises(TorrentClientError) as excinfo:
+        deluge_client.get_all_torrent_info()
+
+      assert "Client returned unexpected response" in str(excinfo.value)
+
+
 class TestInjectTorrent(SetupTeardown):
   def test_injects_torrent(self, api_url, deluge_client, torrent_info_response):
     torrent_path = get_torrent_path("red_source")
@@ -362,3 +395,56 @@ class TestInjectTorrent(SetupTeardown):
 
       assert m.request_history[-2].json()["params"] == ["fertilizer"]
       assert m.request_history[-2].json()["method"] == "label.add"
+
+
+class TestInjectTorrents(SetupTeardown):
+  def mock_client(self, m, api_url, torrent_info_response, add_torrents_result, added_torrents=None):
+    def torrents_matcher(request):
+      return torrent_info_matcher(request) and request.json()["params"][0] == ["name"]
+
+    def source_torrents_matcher(request):
+      return torrent_info_matcher(request) and request.json()["params"][0] != ["name"]
+
+    m.post(
+      api_url, additional_matcher=source_torrents_matcher, json={"result": {"torrents": {"foo": torrent_info_response}}}
+    )
+    m.post(api_url, additional_matcher=torrents_matcher, json={"result": {"torrents": added_torrents or {}}})
+    m.post(
+      api_url,
+      additional_matcher=lambda request: deluge_matcher(request, "core.add_torrent_files"),
+      json={"result": add_torrents_result},
+    )
+
+  def test_adds_all_torrents_in_one_request(self, api_url, deluge_client, torrent_info_response):
+    red_path, ops_path = get_torrent_path("red_source"), get_torrent_path("ops_source")
+
+    with requests_mock.Mocker() as m:
+      self.mock_client(m, api_url, torrent_info_response, [])
+
+      with deluge_client.snapshot():
+        results = deluge_client.inject_torrents([("foo", red_path, None), ("foo", ops_path, "/tmp/override/")])
+
+      add_requests = [request for request in m.request_history if deluge_matcher(request, "core.add_torrent_files")]
+
+    assert results == [calculate_infohash_from_file(path).lower() for path in (red_path, ops_path)]
+    assert len(add_requests) == 1
+    torrent_files = add_requests[0].json()["params"][0]
+    assert [torrent_file[0] for torrent_file in torrent_files] == [
+      "red_source.fertilizer.torrent",
+      "ops_source.fertilizer.torrent",
+    ]
+    assert torrent_files[1][2]["download_location"] == "/tmp/override/"
+
+  def test_reports_torrents_the_client_failed_to_add(self, api_url, deluge_client, torrent_info_response):
+    red_path, ops_path = get_torrent_path("red_source"), get_torrent_path("ops_source")
+    red_infohash = calculate_infohash_from_file(red_path).lower()
+
+    with requests_mock.Mocker() as m:
+      self.mock_client(m, api_url, torrent_info_response, ["Unable to add torrent"], {red_infohash: {"name": "foo"}})
+
+      with deluge_client.snapshot():
+        results = deluge_client.inject_torrents([("foo", red_path, None), ("foo", ops_path, None)])
+
+    assert results[0] == red_infohash
+    assert isinstance(results[1], TorrentClientError)
+    assert "Deluge failed to add torrent" in str(results[1])
@@ -6,6 +6,7 @@ from tests.helpers import SetupTeardown, get_torrent_path
 
 from fertilizer.errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from fertilizer.clients.qbittorrent import Qbittorrent
+from fertilizer.parser import calculate_infohash_from_file
 
 
 @pytest.fixture
@@ -45,7 +46,7 @@ class TestInit(SetupTeardown):
 
 class TestSetup(SetupTeardown):
   def test_sets_auth_cookie(self, qbit_client):
-    assert qbit_client._qbit_cookie is None
+    assert "Cookie" not in qbit_client._session.headers
 
     with requests_mock.Mocker() as m:
       m.post(re.compile("auth/login"), text="Ok.", headers={"Set-Cookie": "SID=1234;"})
@@ -53,7 +54,7 @@ class TestSetup(SetupTeardown):
       response = qbit_client.setup()
 
       assert response
-      assert qbit_client._qbit_cookie is not None
+      assert qbit_client._session.headers["Cookie"] == "SID=1234"
 
   def test_raises_exception_on_failed_auth(self, qbit_client):
     with requests_mock.Mocker() as m:
@@ -110,13 +111,118 @@ class TestGetTorrentInfo(SetupTeardown):
       assert "torrents/info" in m.request_history[-1].url
 
 
+class TestGetAllTorrentInfo(SetupTeardown):
+  def test_returns_details_of_every_torrent_keyed_by_infohash(self, qbit_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), json=[{**torrent_info_response, "hash": "ABC123"}])
+
+      response = qbit_client.get_all_torrent_info()
+
+      assert m.last_request.body is None
+      assert response == {
+        "abc123": {
+          "complete": True,
+          "label": "fertilizer",
+          "save_path": "/tmp/bar/",
+          "content_path": "/tmp/bar/foo",
+        }
+      }
+
+
+class TestSnapshot(SetupTeardown):
+  def test_answers_lookups_from_a_single_request(self, qbit_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), json=[{**torrent_info_response, "hash": "abc123"}])
+
+      with qbit_client.snapshot():
+        assert qbit_client.get_torrent_info("ABC123")["save_path"] == "/tmp/bar/"
+
+        with pytest.raises(TorrentClientError) as excinfo:
+          qbit_client.get_torrent_info("def456")
+
+      assert m.call_count == 1
+      assert "Torrent not found in client" in str(excinfo.value)
+
+  def test_includes_injected_torrents(self, qbit_client, torrent_info_response):
+    torrent_path = get_torrent_path("red_source")
+
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), json=[{**torrent_info_response, "hash": "foo"}])
+      m.post(re.compile("torrents/add"), text="Ok.")
+
+      with qbit_client.snapshot():
+        new_torrent_infohash = qbit_client.inject_torrent("foo", torrent_path, "/tmp/override/")
+
+        assert qbit_client.get_torrent_info(new_torrent_infohash)["content_path"] == "/tmp/override/foo"
+
+        with pytest.raises(TorrentExistsInClientError):
+          qbit_client.inject_torrent("foo", torrent_path)
+
+  def test_refreshes_the_open_snapshot_in_place(self, qbit_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(
+        re.compile("torrents/info"),
+        [
+          {
+            "json": [
+              {**torrent_info_response, "hash": "abc123", "progress": 0.5, "state": "downloading", "completion_on": 0}
+            ]
+          },
+          {"json": [{**torrent_info_response, "hash": "abc123"}]},
+        ],
+      )
+
+      with qbit_client.snapshot() as snapshot:
+        assert not snapshot["abc123"]["complete"]
+
+        qbit_client.refresh_snapshot()
+
+        assert snapshot["abc123"]["complete"]
+
+  def test_queries_the_client_again_once_closed(self, qbit_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), json=[{**torrent_info_response, "hash": "abc123"}])
+
+      with qbit_client.snapshot():
+        pass
+
+      qbit_client.get_torrent_info("abc123")
+
+      assert m.call_count == 2
+
+
+class TestSession(SetupTeardown):
+  def test_sends_every_request_through_one_session(self, qbit_client, torrent_info_response):
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("auth/login"), text="Ok.", headers={"Set-Cookie": "SID=1234;"})
+      m.post(re.compile("torrents/info"), json=[torrent_info_response])
+
+      qbit_client.setup()
+      qbit_client.get_torrent_info("foo")
+
+      assert m.last_request.headers["Cookie"] == "SID=1234"
+
+  def test_pools_connections_with_the_configured_size(self):
+    adapter = Qbittorrent("http://localhost:8080", pool_size=4)._session.get_adapter("http://localhost:8080")
+
+    assert adapter._pool_maxsize == 4
+
+  def test_only_retries_requests_that_cannot_have_reached_the_client(self):
+    retry = Qbittorrent("http://localhost:8080", retries=2)._session.get_adapter("https://localhost").max_retries
+
+    assert retry.connect == 2
+    assert retry.read == 0
+    assert 500 not in retry.status_forcelist
+    assert 503 in retry.status_forcelist
+
+
 class TestInjectTorrent(SetupTeardown):
   def test_injects_torrent(self, qbit_client, torrent_info_response):
     torrent_path = get_torrent_path("red_source")
 
     with requests_mock.Mocker() as m:
       m.post(re.compile("torrents/info"), [{"json": [torrent_info_response]}, {"json": []}])
-      m.post(re.compile("torrents/add"), json={"hash": "1234"})
+      m.post(re.compile("torrents/add"), text="Ok.")
 
       qbit_client.inject_torrent("foo", torrent_path)
 
@@ -131,13 +237,28 @@ class TestInjectTorrent(SetupTeardown):
 
     with requests_mock.Mocker() as m:
       m.post(re.compile("torrents/info"), [{"json": [torrent_info_response]}, {"json": []}])
-      m.post(re.compile("torrents/add"), json={"hash": "1234"})
+      m.post(re.compile("torrents/add"), text="Ok.")
 
       qbit_client.inject_torrent("foo", torrent_path, "/tmp/override/")
 
       assert "torrents/add" in m.request_history[-1].url
       assert b'name="savepath"\r\n\r\n/tmp/override/' in m.request_history[-1].body
 
+  def test_raises_if_the_client_fails_to_add_the_torrent(self, qbit_client, torrent_info_response):
+    torrent_path = get_torrent_path("red_source")
+
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), [{"json": [torrent_info_response]}, {"json": []}])
+      m.post(re.compile("torrents/add"), text="Fails.")
+
+      with pytest.raises(TorrentClientError) as excinfo:
+        qbit_client.inject_torrent("foo", torrent_path)
+
+      assert "torrents/info" in m.request_history[-1].url
+
+    assert "qBittorrent failed to add torrent" in str(excinfo.value)
+    assert "Fails." in str(excinfo.value)
+
   def test_raises_if_source_torrent_isnt_found_in_client(self, qbit_client):
     with requests_mock.Mocker() as m:
       m.post(re.compile("torrents/info"), json=[])
@@ -157,3 +278,82 @@ class TestInjectTorrent(SetupTeardown):
         qbit_client.inject_torrent("foo", torrent_path)
 
       assert "New torrent already exists in client" in str(excinfo.value)
+
+
+class TestInjectTorrents(SetupTeardown):
+  def test_adds_torrents_that_share_options_in_one_request(self, qbit_client, torrent_info_response):
+    red_path, ops_path, announce_path = (
+      get_torrent_path(name) for name in ("red_source", "ops_source", "red_announce")
+    )
+
+    red_hash, ops_hash = (calculate_infohash_from_file(path).lower() for path in (red_path, ops_path))
+
+    with requests_mock.Mocker() as m:
+      m.post(
+        re.compile("torrents/info"),
+        [
+          {"json": [{**torrent_info_response, "hash": "foo", "completion_on": 0}]},
+          # Asked which torrents of the first request were added
+          {"json": [{**torrent_info_response, "hash": red_hash}, {**torrent_info_response, "hash": ops_hash}]},
+        ],
+      )
+      m.post(re.compile("torrents/add"), text="Ok.")
+
+      with qbit_client.snapshot():
+        results = qbit_client.inject_torrents(
+          [("foo", red_path, None), ("foo", ops_path, None), ("foo", announce_path, "/tmp/override/")]
+        )
+
+      add_requests = [request for request in m.request_history if "torrents/add" in request.url]
+
+    assert results == [calculate_infohash_from_file(path).lower() for path in (red_path, ops_path, announce_path)]
+    assert len(add_requests) == 2
+    assert b'filename="red_source.fertilizer.torrent"' in add_requests[0].body
+    assert b'filename="ops_source.fertilizer.torrent"' in add_requests[0].body
+    assert b'name="savepath"\r\n\r\n/tmp/bar/' in add_requests[0].body
+    assert b'filename="red_announce.fertilizer.torrent"' in add_requests[1].body
+    assert b'name="savepath"\r\n\r\n/tmp/override/' in add_requests[1].body
+
+  def test_returns_errors_for_the_torrents_they_belong_to(self, qbit_client, torrent_info_response):
+    red_path, ops_path = get_torrent_path("red_source"), get_torrent_path("ops_source")
+
+    with requests_mock.Mocker() as m:
+      m.post(re.compile("torrents/info"), json=[{**torrent_info_response, "hash": "foo", "completion_on": 0}])
+      m.post(re.compile("torrents/add"), status_code=500)
+
+      with qbit_client.snapshot():
+        results = qbit_client.inject_torrents(
+          [("bar", red_path, None), ("foo", ops_path, None), ("foo", ops_path, None)]
+        )
+
+    assert "Torrent not found in client (bar)" in str(results[0])
+    assert isinstance(results[1], TorrentClientError)
+    assert "torrents/add" in str(results[1])
+    assert isinstance(results[2], TorrentExistsInClientError)
+
+  def test_returns_errors_for_torrents_the_client_failed_to_add(self, qbit_client, torrent_info_response):
+    red_path, ops_path = get_torrent_path("red_source"), get_torrent_path("ops_source")
+    red_hash, ops_hash = (calculate_infohash_from_file(path).lower() for path in (red_path, ops_path))
+
+    with requests_mock.Mocker() as m:
+      m.post(
+        re.compile("torrents/info"),
+        [
+          {"json": [{**torrent_info_response, "hash": "foo", "completion_on": 0}]},
+          {"json": [{**torrent_info_response, "hash": red_hash}]},
+        ],
+      )
+      m.post(re.compile("torrents/add"), text="Ok.")
+
+      with qbit_client.snapshot():
+        results = qbit_client.inject_torrents([("foo", red_path, None), ("foo", ops_path, None)])
+
+        assert qbit_client.get_torrent_info(red_hash)
+        with pytest.raises(TorrentClientError):
+          qbit_client.get_torrent_info(ops_hash)
+
+      assert f"hashes={red_hash}%7C{ops_hash}" in m.request_history[-1].text
+
+    assert results[0] == red_hash
+    assert isinstance(results[1], TorrentClientError)
+    assert f"qBittorrent failed to add torrent ({ops_hash})" in str(results[1])
@@ -0,0 +1,76 @@
+import http.server
+import re
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from tests.helpers import SetupTeardown, get_torrent_path
+
+from fertilizer.clients.qbittorrent import Qbittorrent
+from fertilizer.errors import TorrentClientError
+
+
+# These tests talk to a real local server, since retries happen below the adapters `requests_mock` replaces
+@pytest.fixture(autouse=True)
+def stub_or_disable_requests():
+  yield
+
+
+class FailingProxy(http.server.ThreadingHTTPServer):
+  # Answers every request with `status`, like a reverse proxy in front of an unavailable client
+  def __init__(self, status):
+    self.status = status
+    self.paths = []
+    self.cookies = []
+    super().__init__(("127.0.0.1", 0), FailingProxyHandler)
+
+
+class FailingProxyHandler(http.server.BaseHTTPRequestHandler):
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+    self.server.paths.append(self.path)
+    self.server.cookies.append(self.headers.get("Cookie"))
+    self.send_response(self.server.status)
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+  def log_message(self, *_args):
+    pass
+
+
+@pytest.fixture
+def failing_proxy():
+  server = FailingProxy(502)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  yield server
+  server.shutdown()
+  thread.join(5)
+  server.server_close()
+
+
+@pytest.fixture
+def qbit_client(failing_proxy):
+  client = Qbittorrent(f"http://127.0.0.1:{failing_proxy.server_address[1]}", retries=1)
+  client._session.headers["Cookie"] = "SID=1234"
+  return client
+
+
+class TestRetries(SetupTeardown):
+  def test_retries_read_only_requests_failed_by_a_proxy(self, qbit_client, failing_proxy):
+    with pytest.raises(TorrentClientError):
+      qbit_client.get_all_torrent_info()
+
+    assert failing_proxy.paths == ["/api/v2/torrents/info"] * 2
+
+  def test_doesnt_resend_torrents_to_add_after_a_proxy_fails_the_request(self, qbit_client, failing_proxy):
+    source_torrent_info = {"complete": True, "label": "", "save_path": "/tmp/bar/", "content_path": "/tmp/bar/foo"}
+
+    # The source torrent is found in a snapshot, so adding the new one is the only request
+    with patch.object(qbit_client, "get_all_torrent_info", return_value={"abc": source_torrent_info}):
+      with qbit_client.snapshot(), pytest.raises(TorrentClientError, match=re.escape("torrents/add")):
+        qbit_client.inject_torrent("abc", get_torrent_path("red_source"))
+
+    assert failing_proxy.paths == ["/api/v2/torrents/add"]
+    assert failing_proxy.cookies == ["SID=1234"]
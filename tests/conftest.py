@@ -29,6 +29,14 @@ def ops_api():
   return instance
 
 
+# Keeps the rate limit state of API objects built by tests away from that of a real running instance
+@pytest.fixture(autouse=True)
+def private_rate_limit_state(monkeypatch, tmp_path):
+  runtime_directory = tmp_path / "runtime"
+  runtime_directory.mkdir(mode=0o700)
+  monkeypatch.setenv("XDG_RUNTIME_DIR", str(runtime_directory))
+
+
 # This _should_ prevent all tests from making real requests to the internet.
 @pytest.fixture(autouse=True)
 def stub_or_disable_requests():
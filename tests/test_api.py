@@ -1,10 +1,14 @@
 import pytest
+import requests
 import requests_mock
 
 from .helpers import SetupTeardown
 
 from fertilizer.errors import AuthenticationError
-from fertilizer.api import GazelleAPI
+from fertilizer.api import GazelleAPI, OpsAPI, RedAPI
+from fertilizer.database import Database
+from fertilizer.ratelimit import TokenBucket
+from fertilizer.response_cache import ResponseCache
 
 
 class MockApi(GazelleAPI):
@@ -89,3 +93,64 @@ class TestGazelleAnnounceUrl(SetupTeardown):
 
       assert response == "https://baz.qux/mypasskey/announce"
       assert instance._announce_url == response
+
+
+class TestGazelleRateLimit(SetupTeardown):
+  def test_acquires_a_token_for_each_request(self, mock_api_instance):
+    acquired = []
+    mock_api_instance._rate_limiter.acquire = lambda: acquired.append(True)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json={})
+      mock_api_instance.find_torrent("321cba")
+      mock_api_instance.find_torrent("321cba")
+
+    assert len(acquired) == 2
+
+  def test_uses_the_given_rate_limiter(self):
+    limiter = TokenBucket(rate=0)
+    instance = GazelleAPI("https://foo.bar", "https://baz.qux", {}, rate_limit=2, rate_limiter=limiter)
+
+    assert instance._rate_limiter is limiter
+
+  def test_instances_for_the_same_site_and_account_share_a_rate_limiter(self):
+    assert RedAPI("foo")._rate_limiter is RedAPI("foo")._rate_limiter
+    assert RedAPI("foo")._rate_limiter is not RedAPI("bar")._rate_limiter
+    assert RedAPI("foo")._rate_limiter is not OpsAPI("foo")._rate_limiter
+
+  def test_backs_off_the_rate_limiter_on_errors(self, mock_api_instance, monkeypatch):
+    monkeypatch.setattr("fertilizer.errors.sleep", lambda _: None)
+    backoffs = []
+    mock_api_instance._rate_limiter.backoff = backoffs.append
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", exc=requests.exceptions.ConnectTimeout)
+
+      with pytest.raises(Exception, match="Maximum number of retries reached"):
+        mock_api_instance.find_torrent("321cba")
+
+    assert backoffs == [mock_api_instance._retry_wait_time(1)]
+
+
+class TestGazelleResponseCache(SetupTeardown):
+  def test_returns_cached_responses_without_a_request(self, mock_api_instance):
+    mock_api_instance.cache = ResponseCache(Database.for_directory("/tmp/output"), not_found_ttl=60)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json=self.TORRENT_KNOWN_BAD_RESPONSE)
+      first_response = mock_api_instance.find_torrent("321cba")
+      second_response = mock_api_instance.find_torrent("321cba")
+
+      assert m.call_count == 1
+      assert first_response == second_response == self.TORRENT_KNOWN_BAD_RESPONSE
+
+  def test_requests_again_if_response_was_not_cacheable(self, mock_api_instance):
+    mock_api_instance._rate_limiter = TokenBucket(rate=0)
+    mock_api_instance.cache = ResponseCache(Database.for_directory("/tmp/output"), not_found_ttl=60)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json=self.TORRENT_UNKNOWN_BAD_RESPONSE)
+      mock_api_instance.find_torrent("321cba")
+      mock_api_instance.find_torrent("321cba")
+
+      assert m.call_count == 2
@@ -64,3 +64,56 @@ class TestArgs(SetupTeardown):
     args = parse_args(["-i", "foo", "-o", "bar", "-c", "baz.json"])
 
     assert args.config_file == "baz.json"
+
+  def test_defaults_jobs_to_one(self):
+    args = parse_args(["-i", "foo", "-o", "bar"])
+
+    assert args.jobs == 1
+
+  def test_sets_jobs(self):
+    args = parse_args(["-i", "foo", "-o", "bar", "-j", "4"])
+
+    assert args.jobs == 4
+
+  def test_requires_positive_jobs(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["-i", "foo", "-o", "bar", "--jobs", "0"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "--jobs must be at least 1" in captured.err
+
+  def test_defaults_to_non_incremental_scans(self):
+    args = parse_args(["-i", "foo", "-o", "bar"])
+
+    assert not args.incremental
+    assert args.recheck_not_found_after is None
+
+  def test_sets_incremental_options(self):
+    args = parse_args(["-i", "foo", "-o", "bar", "--incremental", "--recheck-not-found-after", "2.5"])
+
+    assert args.incremental
+    assert args.recheck_not_found_after == 2.5
+
+  def test_requires_non_negative_recheck_age(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["-i", "foo", "-o", "bar", "--recheck-not-found-after", "-1"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "--recheck-not-found-after must not be negative" in captured.err
+
+  def test_sets_incomplete_sources_mode(self):
+    assert parse_args(["-i", "foo", "-o", "bar"]).incomplete_sources is None
+    assert parse_args(["-i", "foo", "-o", "bar", "--incomplete-sources", "defer"]).incomplete_sources == "defer"
+
+  def test_rejects_unknown_incomplete_sources_mode(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["-i", "foo", "-o", "bar", "--incomplete-sources", "wait"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "argument --incomplete-sources: invalid choice: 'wait'" in captured.err
@@ -1,6 +1,9 @@
+import json
+
 from .helpers import SetupTeardown
 
 from fertilizer.config import Config
+from fertilizer.config_validator import ConfigValidator
 
 
 class TestConfig(SetupTeardown):
@@ -12,6 +15,16 @@ class TestConfig(SetupTeardown):
 
   def test_returns_default_value_if_present(self):
     assert Config({}).server_port == "9713"
+    assert Config({}).not_found_cache_days == 7
+    assert Config({}).client_pool_size == 10
+    assert Config({}).client_retries == 3
+    assert Config({}).injection_batch_size == 10
+    assert Config({}).link_workers == 8
+    assert Config({}).link_torrent_files_only is False
+    assert Config({}).webhook_workers == 2
+    assert Config({}).server_workers == 8
+    assert Config({}).server_queue_size == 64
+    assert Config({}).server_timeout == 30
 
 
 class TestBuildFromSources(SetupTeardown):
@@ -32,6 +45,16 @@ class TestBuildFromSources(SetupTeardown):
         "QBITTORRENT_URL": "http://qbittorrent:8080",
         "INJECT_TORRENTS": "true",
         "INJECTION_LINK_DIRECTORY": "/my/cool/dir",
+        "NOT_FOUND_CACHE_DAYS": "3",
+        "CLIENT_POOL_SIZE": "4",
+        "CLIENT_RETRIES": "0",
+        "INJECTION_BATCH_SIZE": "25",
+        "LINK_WORKERS": "16",
+        "LINK_TORRENT_FILES_ONLY": "true",
+        "WEBHOOK_WORKERS": "4",
+        "SERVER_WORKERS": "16",
+        "SERVER_QUEUE_SIZE": "0",
+        "SERVER_TIMEOUT": "10",
       },
     )
 
@@ -42,6 +65,43 @@ class TestBuildFromSources(SetupTeardown):
     assert config_dict["qbittorrent_url"] == "http://qbittorrent:8080"
     assert config_dict["inject_torrents"]
     assert config_dict["injection_link_directory"] == "/my/cool/dir"
+    assert config_dict["not_found_cache_days"] == "3"
+    assert config_dict["client_pool_size"] == "4"
+    assert config_dict["client_retries"] == "0"
+    assert config_dict["injection_batch_size"] == "25"
+    assert config_dict["link_workers"] == "16"
+    assert config_dict["link_torrent_files_only"] is True
+    assert config_dict["webhook_workers"] == "4"
+    assert config_dict["server_workers"] == "16"
+    assert config_dict["server_queue_size"] == "0"
+    assert config_dict["server_timeout"] == "10"
+
+  def test_keeps_zero_and_false_values_from_config_file(self, tmp_path):
+    config_filepath = tmp_path / "config.json"
+    config_filepath.write_text(
+      json.dumps(
+        {
+          "red_key": "a" * 41,
+          "ops_key": "b" * 116,
+          "not_found_cache_days": 0,
+          "client_retries": 0,
+          "server_queue_size": 0,
+          "link_torrent_files_only": False,
+          "deluge_rpc_url": None,
+          "qbittorrent_url": "",
+        }
+      )
+    )
+
+    config_dict = Config.build_config_dict(str(config_filepath), {"LINK_TORRENT_FILES_ONLY": "true"})
+    config = Config(ConfigValidator(config_dict).validate())
+
+    assert config.not_found_cache_days == 0
+    assert config.client_retries == 0
+    assert config.server_queue_size == 0
+    assert config.link_torrent_files_only is False
+    assert "deluge_rpc_url" not in config_dict
+    assert "qbittorrent_url" not in config_dict
 
   def test_config_file_takes_precedence_over_env(self):
     config_dict = Config.build_config_dict("tests/support/config.json", {"RED_KEY": "env_red_key"})
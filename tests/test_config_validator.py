@@ -105,6 +105,56 @@ class TestValidate(SetupTeardown):
 
     assert '- "port": Invalid "port" (not_a_number): Not between 1 and 65535' in str(excinfo.value)
 
+  def test_raises_if_not_found_cache_days_isnt_valid(self, valid_config):
+    valid_config["not_found_cache_days"] = "-1"
+
+    validator = ConfigValidator(valid_config)
+
+    with pytest.raises(ValueError) as excinfo:
+      validator.validate()
+
+    assert '- "not_found_cache_days": Invalid number (-1): Must be 0 or greater' in str(excinfo.value)
+
+  def test_raises_if_client_session_options_arent_valid(self, valid_config):
+    valid_config["client_pool_size"] = "0"
+    valid_config["client_retries"] = "1.5"
+    valid_config["injection_batch_size"] = "none"
+
+    validator = ConfigValidator(valid_config)
+
+    with pytest.raises(ValueError) as excinfo:
+      validator.validate()
+
+    assert '- "client_pool_size": Invalid number (0): Must be a whole number of 1 or greater' in str(excinfo.value)
+    assert '- "client_retries": Invalid number (1.5): Must be a whole number of 0 or greater' in str(excinfo.value)
+    assert '- "injection_batch_size": Invalid number (none): Must be a whole number of 1 or greater' in str(
+      excinfo.value
+    )
+
+  def test_raises_if_webhook_workers_isnt_valid(self, valid_config):
+    valid_config["webhook_workers"] = "0"
+
+    validator = ConfigValidator(valid_config)
+
+    with pytest.raises(ValueError) as excinfo:
+      validator.validate()
+
+    assert '- "webhook_workers": Invalid number (0): Must be a whole number of 1 or greater' in str(excinfo.value)
+
+  def test_raises_if_server_options_arent_valid(self, valid_config):
+    valid_config["server_workers"] = "0"
+    valid_config["server_queue_size"] = "-1"
+    valid_config["server_timeout"] = "soon"
+
+    validator = ConfigValidator(valid_config)
+
+    with pytest.raises(ValueError) as excinfo:
+      validator.validate()
+
+    assert '- "server_workers": Invalid number (0): Must be a whole number of 1 or greater' in str(excinfo.value)
+    assert '- "server_queue_size": Invalid number (-1): Must be a whole number of 0 or greater' in str(excinfo.value)
+    assert '- "server_timeout": Invalid number (soon): Must be a whole number of 1 or greater' in str(excinfo.value)
+
   def test_raises_if_deluge_url_lacks_password(self, valid_config):
     valid_config["deluge_rpc_url"] = "http://deluge:8112"
 
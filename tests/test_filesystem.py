@@ -3,7 +3,13 @@ import pytest
 
 from .helpers import SetupTeardown
 
-from fertilizer.filesystem import sane_join, mkdir_p, assert_path_exists, list_files_of_extension, replace_extension
+from fertilizer.filesystem import (
+  sane_join,
+  mkdir_p,
+  assert_path_exists,
+  replace_extension,
+  walk_files_of_extension,
+)
 
 
 class TestSaneJoin(SetupTeardown):
@@ -51,35 +57,46 @@ class TestAssertPathExists(SetupTeardown):
     os.remove(path)
 
 
-class TestListFilesOfExtension(SetupTeardown):
-  def test_lists_files_of_extension(self):
-    input_directory = "tests/support/files"
+class TestReplaceExtension(SetupTeardown):
+  def test_replaces_extension(self):
+    filepath = "tests/support/files/test.torrent"
 
-    files = list_files_of_extension(input_directory)
+    new_filepath = replace_extension(filepath, ".json")
 
-    assert len(files) > 0
-    assert all([file.endswith(".torrent") for file in files])
+    assert new_filepath == "tests/support/files/test.json"
 
-  def test_allows_specifying_extension(self):
-    input_directory = "tests/support"
 
-    files = list_files_of_extension(input_directory, ".json")
+class TestWalkFilesOfExtension(SetupTeardown):
+  def test_yields_files_in_nested_directories(self):
+    open("/tmp/input/a.torrent", "w").close()
+    os.makedirs("/tmp/input/nested/deeper")
+    open("/tmp/input/nested/deeper/b.torrent", "w").close()
+    open("/tmp/input/nested/c.txt", "w").close()
 
-    assert len(files) > 0
-    assert all([file.endswith(".json") for file in files])
+    files = [filepath for filepath, _ in walk_files_of_extension("/tmp/input")]
 
-  def test_returns_empty_list_when_no_files_found(self):
-    input_directory = "tests/support"
+    assert files == ["/tmp/input/a.torrent", "/tmp/input/nested/deeper/b.torrent"]
 
-    files = list_files_of_extension(input_directory, ".txt")
+  def test_yields_stat_results(self):
+    with open("/tmp/input/a.torrent", "w") as f:
+      f.write("test")
 
-    assert len(files) == 0
+    [(_, stat)] = walk_files_of_extension("/tmp/input")
 
+    assert stat.st_size == 4
 
-class TestReplaceExtension(SetupTeardown):
-  def test_replaces_extension(self):
-    filepath = "tests/support/files/test.torrent"
+  def test_skips_excluded_directories(self):
+    os.makedirs("/tmp/input/output")
+    open("/tmp/input/output/a.torrent", "w").close()
 
-    new_filepath = replace_extension(filepath, ".json")
+    files = list(walk_files_of_extension("/tmp/input", excluded_directories=["/tmp/input/output/"]))
 
-    assert new_filepath == "tests/support/files/test.json"
+    assert files == []
+
+  def test_does_not_follow_symlinked_directories(self):
+    open("/tmp/input/a.torrent", "w").close()
+    os.symlink("/tmp/input", "/tmp/input/loop")
+
+    files = [filepath for filepath, _ in walk_files_of_extension("/tmp/input")]
+
+    assert files == ["/tmp/input/a.torrent"]
@@ -0,0 +1,183 @@
+import http.client
+import json
+import socket
+import threading
+from time import time
+
+import pytest
+
+from .helpers import SetupTeardown
+
+from fertilizer.http_server import PooledWSGIServer
+
+
+class SlowApp:
+  # A WSGI app whose requests only finish once `release` is set
+  def __init__(self):
+    self.entered = threading.Semaphore(0)
+    self.release = threading.Event()
+
+  def __call__(self, environ, start_response):
+    self.entered.release()
+    self.release.wait(5)
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+    return [b"ok"]
+
+
+@pytest.fixture()
+def slow_app():
+  app = SlowApp()
+  yield app
+  app.release.set()
+
+
+def start_server(app, **kwargs):
+  server = PooledWSGIServer("127.0.0.1", 0, app, **kwargs)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+
+  return server, thread
+
+
+def stop_server(server, thread):
+  server.shutdown()
+  thread.join(5)
+  server.drain()
+
+
+# `http.client` rather than `requests`, since every test runs with `requests` mocked out
+def get(port, connection=None):
+  connection = connection or http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+  connection.request("GET", "/")
+  response = connection.getresponse()
+  response.body = response.read()
+
+  return response
+
+
+def read_until_closed(connection):
+  data = b""
+  while chunk := connection.recv(1024):
+    data += chunk
+
+  return data
+
+
+def get_in_background(port, responses):
+  thread = threading.Thread(target=lambda: responses.append(get(port)))
+  thread.start()
+  return thread
+
+
+class TestPooledWSGIServer(SetupTeardown):
+  def test_serves_requests(self, slow_app):
+    slow_app.release.set()
+    server, thread = start_server(slow_app)
+
+    responses = [get(server.port) for _ in range(3)]
+
+    stop_server(server, thread)
+    assert [response.status for response in responses] == [200, 200, 200]
+    assert [response.body for response in responses] == [b"ok", b"ok", b"ok"]
+
+  def test_closes_each_connection_after_its_response(self, slow_app):
+    slow_app.release.set()
+    server, thread = start_server(slow_app)
+
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as connection:
+      connection.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+      response = read_until_closed(connection)
+
+    stop_server(server, thread)
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"\r\nConnection: close\r\n" in response
+    assert response.endswith(b"\r\n\r\nok")
+
+  def test_handles_requests_concurrently(self, slow_app):
+    server, thread = start_server(slow_app, workers=2)
+    responses = []
+
+    requests_threads = [get_in_background(server.port, responses) for _ in range(2)]
+    assert slow_app.entered.acquire(timeout=5)
+    assert slow_app.entered.acquire(timeout=5)
+    slow_app.release.set()
+
+    for request_thread in requests_threads:
+      request_thread.join(5)
+    stop_server(server, thread)
+    assert [response.status for response in responses] == [200, 200]
+
+  def test_rejects_requests_beyond_the_queue_with_429(self, slow_app):
+    server, thread = start_server(slow_app, workers=1, queue_size=0)
+    responses = []
+
+    request_thread = get_in_background(server.port, responses)
+    assert slow_app.entered.acquire(timeout=5)
+    rejected_response = get(server.port)
+
+    slow_app.release.set()
+    request_thread.join(5)
+    stop_server(server, thread)
+
+    assert rejected_response.status == 429
+    assert json.loads(rejected_response.body) == {"status": "error", "message": "Server is overloaded, try again later"}
+    assert rejected_response.getheader("Retry-After") == "1"
+    assert [response.status for response in responses] == [200]
+
+  def test_rejects_without_waiting_for_other_rejected_connections(self, slow_app, monkeypatch):
+    monkeypatch.setattr("fertilizer.http_server.REJECTION_READ_TIMEOUT", 5)
+    server, thread = start_server(slow_app, workers=1, queue_size=0)
+    responses = []
+
+    request_thread = get_in_background(server.port, responses)
+    assert slow_app.entered.acquire(timeout=5)
+
+    # A rejected client that never sends its request is answered all the same, and while its connection waits
+    # to be closed, other connections are still accepted and answered
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as silent_connection:
+      assert silent_connection.recv(1024).startswith(b"HTTP/1.1 429 Too Many Requests\r\n")
+
+      started_at = time()
+      rejected_response = get(server.port)
+      assert time() - started_at < 2
+
+    slow_app.release.set()
+    request_thread.join(5)
+    stop_server(server, thread)
+
+    assert rejected_response.status == 429
+    assert [response.status for response in responses] == [200]
+
+  def test_closes_idle_connections(self, slow_app):
+    server, thread = start_server(slow_app, connection_timeout=0.2)
+
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as connection:
+      assert connection.recv(1024) == b""
+
+    # `handle_request` still blocks until a connection arrives
+    assert server.timeout is None
+    stop_server(server, thread)
+
+  def test_drain_finishes_requests_in_progress(self, slow_app):
+    server, thread = start_server(slow_app)
+    responses = []
+
+    request_thread = get_in_background(server.port, responses)
+    assert slow_app.entered.acquire(timeout=5)
+    server.shutdown()
+    thread.join(5)
+
+    threading.Timer(0.1, slow_app.release.set).start()
+    server.drain()
+    request_thread.join(5)
+
+    assert [response.status for response in responses] == [200]
+
+  def test_stop_returns_right_away_and_ends_serving(self, slow_app):
+    server, thread = start_server(slow_app)
+
+    server.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    server.drain()
@@ -0,0 +1,217 @@
+import os
+import shutil
+import pytest
+from time import sleep, time
+from unittest import mock
+
+from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
+
+from fertilizer.database import Database
+from fertilizer.index import InfohashIndex, MemoryInfohashIndex, ResidentInfohashIndex
+
+RED_SOURCE_HASH = "F15A59B9620FBF4CB06407C10399607367D9204D"
+OPS_SOURCE_HASH = "2AEE440CDC7429B3E4A7E4D20E3839DBB48D72C2"
+
+
+class TestInfohashIndex(SetupTeardown):
+  def test_indexes_torrent_files_in_directory(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+
+    index = InfohashIndex("/tmp/output").refresh()
+
+    assert RED_SOURCE_HASH in index
+    assert index[RED_SOURCE_HASH] == "/tmp/output/red_source.torrent"
+
+  def test_indexes_nested_directories(self):
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/foo [OPS].torrent")
+
+    index = InfohashIndex("/tmp/output").refresh()
+
+    assert index.get(OPS_SOURCE_HASH) == "/tmp/output/OPS/foo [OPS].torrent"
+
+  def test_records_tracker_and_source(self):
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/foo [OPS].torrent")
+
+    index = InfohashIndex("/tmp/output").refresh()
+    rows = index._db.execute("SELECT tracker, source FROM infohash_index WHERE infohash = ?", (OPS_SOURCE_HASH,))
+
+    assert rows == [("OPS", "OPS")]
+
+  def test_ignores_other_extensions_and_undecodable_files(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.txt")
+    copy_and_mkdir(get_torrent_path("broken"), "/tmp/output/broken.torrent")
+
+    index = InfohashIndex("/tmp/output").refresh()
+
+    assert len(index) == 0
+    assert RED_SOURCE_HASH not in index
+
+  def test_raises_key_error_for_unknown_infohash(self):
+    index = InfohashIndex("/tmp/output").refresh()
+
+    with pytest.raises(KeyError):
+      index["abc"]
+
+  def test_persists_between_instances(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+    InfohashIndex("/tmp/output").refresh()
+
+    assert RED_SOURCE_HASH in InfohashIndex("/tmp/output")
+
+  def test_stores_state_inside_the_directory(self):
+    InfohashIndex("/tmp/output").refresh()
+
+    assert os.path.isfile(os.path.join("/tmp/output", Database.STATE_DIRECTORY, Database.STATE_FILENAME))
+
+  def test_picks_up_added_and_removed_files_on_refresh(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/RED/red_source.torrent")
+    index = InfohashIndex("/tmp/output").refresh()
+
+    os.remove("/tmp/output/RED/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/ops_source.torrent")
+    index.refresh()
+
+    assert RED_SOURCE_HASH not in index
+    assert OPS_SOURCE_HASH in index
+
+  def test_forgets_removed_directories(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/RED/red_source.torrent")
+    index = InfohashIndex("/tmp/output").refresh()
+
+    shutil.rmtree("/tmp/output/RED")
+    index.refresh()
+
+    assert index._db.execute("SELECT COUNT(*) FROM infohash_index")[0][0] == 0
+
+  def test_skips_unchanged_directories(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/RED/red_source.torrent")
+    index = InfohashIndex("/tmp/output")
+    index.RACY_MTIME_WINDOW_NS = -(10**18)
+    index.refresh()
+
+    # Removing the row directly simulates a file the index doesn't know about. Since no
+    # directory changed, the refresh must not notice it.
+    index._db.execute("DELETE FROM infohash_index")
+    index.refresh()
+
+    assert RED_SOURCE_HASH not in index
+
+  def test_picks_up_files_rewritten_in_place_in_unchanged_directories(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/RED/foo.torrent")
+    index = InfohashIndex("/tmp/output")
+    index.RACY_MTIME_WINDOW_NS = -(10**18)
+    index.refresh()
+    directory_mtime_ns = os.stat("/tmp/output/RED").st_mtime_ns
+
+    # Overwriting the existing file leaves its directory's mtime alone
+    with open(get_torrent_path("ops_source"), "rb") as source, open("/tmp/output/RED/foo.torrent", "wb") as f:
+      f.write(source.read())
+    os.utime("/tmp/output/RED/foo.torrent", (time() + 10, time() + 10))
+    index.refresh()
+
+    assert os.stat("/tmp/output/RED").st_mtime_ns == directory_mtime_ns
+    assert RED_SOURCE_HASH not in index
+    assert index[OPS_SOURCE_HASH] == "/tmp/output/RED/foo.torrent"
+
+  def test_does_not_return_files_deleted_since_refresh(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+    index = InfohashIndex("/tmp/output").refresh()
+
+    os.remove("/tmp/output/red_source.torrent")
+
+    assert RED_SOURCE_HASH not in index
+
+  def test_records_written_files(self):
+    index = InfohashIndex("/tmp/output").refresh()
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/foo [OPS].torrent")
+
+    index[OPS_SOURCE_HASH] = filepath
+
+    assert index[OPS_SOURCE_HASH] == filepath
+
+  def test_adds_files_without_reading_them(self):
+    index = InfohashIndex("/tmp/output").refresh()
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/foo [OPS].torrent")
+
+    with mock.patch.object(InfohashIndex, "_InfohashIndex__describe_file") as describe_mock:
+      index.add(OPS_SOURCE_HASH, filepath, "OPS", "OPS")
+
+    describe_mock.assert_not_called()
+    assert index[OPS_SOURCE_HASH] == filepath
+    assert index._db.execute("SELECT tracker, source FROM infohash_index") == [("OPS", "OPS")]
+
+  def test_ignores_written_files_outside_the_directory(self):
+    index = InfohashIndex("/tmp/output").refresh()
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+
+    index[OPS_SOURCE_HASH] = filepath
+
+    assert OPS_SOURCE_HASH not in index
+
+
+class TestMemoryInfohashIndex(SetupTeardown):
+  def test_adds_torrents_like_an_infohash_index(self):
+    index = MemoryInfohashIndex()
+
+    index.add(OPS_SOURCE_HASH, "/tmp/output/OPS/foo [OPS].torrent", "OPS", "OPS")
+
+    assert index == {OPS_SOURCE_HASH: "/tmp/output/OPS/foo [OPS].torrent"}
+
+
+class TestResidentInfohashIndex(SetupTeardown):
+  def test_loads_the_index_on_start(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+
+    index = ResidentInfohashIndex(InfohashIndex("/tmp/output")).start()
+
+    assert index[RED_SOURCE_HASH] == "/tmp/output/red_source.torrent"
+    assert len(index) == 1
+    index.stop()
+
+  def test_answers_lookups_from_memory(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+    persistent_index = InfohashIndex("/tmp/output")
+    index = ResidentInfohashIndex(persistent_index)
+    index.reconcile()
+
+    with mock.patch.object(persistent_index, "get") as get_mock:
+      assert RED_SOURCE_HASH in index
+
+    get_mock.assert_not_called()
+
+  def test_writes_added_torrents_through_to_the_persistent_index(self):
+    index = ResidentInfohashIndex(InfohashIndex("/tmp/output"))
+    index.reconcile()
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/OPS/foo [OPS].torrent")
+
+    index[OPS_SOURCE_HASH] = filepath
+
+    assert index[OPS_SOURCE_HASH] == filepath
+    assert InfohashIndex("/tmp/output").get(OPS_SOURCE_HASH) == filepath
+
+  def test_picks_up_changes_on_disk_when_reconciled(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+    index = ResidentInfohashIndex(InfohashIndex("/tmp/output"))
+    index.reconcile()
+
+    os.remove("/tmp/output/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+
+    assert RED_SOURCE_HASH not in index
+    assert OPS_SOURCE_HASH not in index
+
+    index.reconcile()
+
+    assert OPS_SOURCE_HASH in index
+    assert len(index) == 1
+
+  def test_reconciles_in_the_background(self):
+    index = ResidentInfohashIndex(InfohashIndex("/tmp/output"), reconcile_interval=0.01).start()
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+
+    deadline = time() + 5
+    while OPS_SOURCE_HASH not in index and time() < deadline:
+      sleep(0.01)
+
+    index.stop()
+    assert OPS_SOURCE_HASH in index
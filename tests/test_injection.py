@@ -8,7 +8,7 @@ from .helpers import get_torrent_path, get_support_file_path, copy_and_mkdir, Se
 from fertilizer.clients.deluge import Deluge
 from fertilizer.clients.qbittorrent import Qbittorrent
 from fertilizer.clients.transmission import TransmissionBt
-from fertilizer.errors import TorrentInjectionError
+from fertilizer.errors import TorrentClientError, TorrentInjectionError
 from fertilizer.injection import Injection
 
 
@@ -19,6 +19,11 @@ class ConfigMock:
     self.deluge_rpc_url = "http://:pass@localhost:8112/json"
     self.transmission_rpc_url = "http://:pass@localhost:51413/transmission/rpc"
     self.qbittorrent_url = "http://localhost:8080"
+    self.client_pool_size = 10
+    self.client_retries = 3
+    self.injection_batch_size = 2
+    self.link_workers = 4
+    self.link_torrent_files_only = False
 
 
 @pytest.fixture
@@ -76,6 +81,16 @@ class TestInjection(SetupTeardown):
     assert isinstance(Injection(qbit_config).client, Qbittorrent)
     assert isinstance(Injection(transmission_config).client, TransmissionBt)
 
+  def test_passes_session_options_to_torrent_client(self):
+    config = ConfigMock()
+    config.client_pool_size = 4
+    config.client_retries = 0
+
+    adapter = Injection(config).client._session.get_adapter("http://localhost")
+
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 0
+
 
 class TestSetup(SetupTeardown):
   def test_calls_torrent_client_setup(self, injector):
@@ -89,6 +104,19 @@ class TestSetup(SetupTeardown):
     assert injector.setup() == injector
 
 
+class TestClientInfohashes(SetupTeardown):
+  def test_asks_the_client_about_each_infohash(self, injector):
+    injector.client.get_torrent_info.return_value = {"complete": True}
+
+    assert "abc" in injector.client_infohashes()
+    injector.client.get_torrent_info.assert_called_once_with("abc")
+
+  def test_counts_infohashes_the_client_cant_find_as_missing(self, injector):
+    injector.client.get_torrent_info.side_effect = TorrentClientError("Torrent not found in client (abc)")
+
+    assert "abc" not in injector.client_infohashes()
+
+
 class TestInjectTorrent(SetupTeardown):
   def test_injects_torrent_and_returns_infohash(self, injector):
     source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
@@ -117,6 +145,39 @@ class TestInjectTorrent(SetupTeardown):
     assert os.path.exists("/tmp/injection/OPS/Big Buck Bunny/foo.txt")
     assert os.stat("/tmp/injection/OPS/Big Buck Bunny/foo.txt").st_nlink > 1
 
+  def test_records_link_stats(self, injector):
+    source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/foo.txt")
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/Extras/bar.txt")
+    injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
+
+    injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
+
+    assert injector.linker.workers == 4
+    assert injector.link_stats.torrent_count == 1
+    assert injector.link_stats.link_count == 2
+
+  def test_only_links_files_listed_in_the_torrent_if_configured(self, injector):
+    source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    os.makedirs("/tmp/input/Big Buck Bunny")
+    # Sparse files of the sizes listed in the torrent
+    for filename, size in (("Big Buck Bunny.en.srt", 140), ("Big Buck Bunny.mp4", 276134947), ("poster.jpg", 310380)):
+      with open(os.path.join("/tmp/input/Big Buck Bunny", filename), "wb") as f:
+        f.truncate(size)
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/Extras/notes.txt")
+    injector.link_torrent_files_only = True
+    injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
+
+    injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
+
+    assert sorted(os.listdir("/tmp/injection/OPS/Big Buck Bunny")) == [
+      "Big Buck Bunny.en.srt",
+      "Big Buck Bunny.mp4",
+      "poster.jpg",
+    ]
+
   def test_links_torrent_data_when_singular_file(self, injector):
     source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
     new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
@@ -150,17 +211,89 @@ class TestInjectTorrent(SetupTeardown):
 
     assert str(excinfo.value) == "Could not determine the location of the torrent data: /tmp/input/Big Buck Bunny"
 
-  def test_raises_error_if_output_directory_exists(self, injector):
+  def test_completes_a_partially_linked_output_directory(self, injector):
     source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
     new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
-    parent_dir = "/tmp/injection/OPS/Big Buck Bunny"
-
     copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/foo.txt")
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/bar.txt")
     injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
 
-    os.makedirs(parent_dir)
+    os.makedirs("/tmp/injection/OPS/Big Buck Bunny")
+    os.link("/tmp/input/Big Buck Bunny/foo.txt", "/tmp/injection/OPS/Big Buck Bunny/foo.txt")
+
+    injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
+
+    assert os.path.samefile("/tmp/input/Big Buck Bunny/bar.txt", "/tmp/injection/OPS/Big Buck Bunny/bar.txt")
+    assert injector.link_stats.link_count == 1
+    assert injector.link_stats.existing_count == 1
+    injector.client.inject_torrent.assert_called_once()
+
+  def test_raises_error_if_a_different_file_is_in_the_output_directory(self, injector):
+    source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    conflicting_file = "/tmp/injection/OPS/Big Buck Bunny/foo.txt"
+
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/foo.txt")
+    copy_and_mkdir(get_support_file_path("foo.txt"), conflicting_file)
+    injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
 
     with pytest.raises(TorrentInjectionError) as excinfo:
       injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
 
-    assert str(excinfo.value) == f"Cannot link given torrent since it's already been linked: {parent_dir}"
+    assert str(excinfo.value) == (f"Cannot link given torrent since a different file is in the way: {conflicting_file}")
+    injector.client.inject_torrent.assert_not_called()
+
+
+class TestQueueTorrent(SetupTeardown):
+  def setup_torrents(self, injector, count):
+    torrents = []
+    for i in range(count):
+      source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/red_source_{i}.torrent")
+      new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), f"/tmp/output/ops_source_{i}.torrent")
+      copy_and_mkdir(get_support_file_path("foo.txt"), f"/tmp/input/Big Buck Bunny {i}/foo.txt")
+      torrents.append((source_torrent_filepath, new_torrent_filepath))
+
+    injector.client.get_torrent_info.side_effect = [
+      {"content_path": f"/tmp/input/Big Buck Bunny {i}"} for i in range(count)
+    ]
+
+    return torrents
+
+  def test_links_data_when_queued_and_injects_once_the_batch_is_full(self, injector):
+    (first_source, first_new), (second_source, second_new) = self.setup_torrents(injector, 2)
+    injector.client.inject_torrents.return_value = ["abc123", "def456"]
+
+    assert injector.queue_torrent(first_source, first_new, "OPS", key="first") == []
+    assert os.path.exists("/tmp/injection/OPS/Big Buck Bunny 0/foo.txt")
+    injector.client.inject_torrents.assert_not_called()
+
+    results = injector.queue_torrent(second_source, second_new, "OPS", key="second")
+
+    assert results == [("first", "abc123"), ("second", "def456")]
+    injector.client.inject_torrents.assert_called_once_with(
+      [
+        ("F15A59B9620FBF4CB06407C10399607367D9204D", first_new, "/tmp/injection/OPS"),
+        ("F15A59B9620FBF4CB06407C10399607367D9204D", second_new, "/tmp/injection/OPS"),
+      ]
+    )
+
+  def test_flush_injects_a_partial_batch(self, injector):
+    ((source, new),) = self.setup_torrents(injector, 1)
+    error = TorrentInjectionError("Client rejected torrent")
+    injector.client.inject_torrents.return_value = [error]
+
+    injector.queue_torrent(source, new, "OPS", key="only")
+
+    assert injector.flush() == [("only", error)]
+    assert injector.flush() == []
+    injector.client.inject_torrents.assert_called_once()
+
+  def test_raises_errors_from_before_the_client_is_reached(self, injector):
+    source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
+
+    with pytest.raises(TorrentInjectionError):
+      injector.queue_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
+
+    assert injector.flush() == []
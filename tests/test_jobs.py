@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from .helpers import SetupTeardown
+
+from fertilizer.errors import JobQueueFullError
+from fertilizer.jobs import JobQueue
+
+
+class TestJobQueue(SetupTeardown):
+  def test_runs_jobs_and_keeps_their_result(self):
+    queue = JobQueue(2)
+
+    job = queue.submit(lambda a, b: a + b, 1, 2)
+
+    assert job.wait(5)
+    assert job.status == "finished"
+    assert job.result == 3
+    assert job.finished_at >= job.started_at >= job.created_at
+    assert queue.get(job.id) is job
+    queue.shutdown()
+
+  def test_records_errors(self):
+    queue = JobQueue(1)
+
+    def fail():
+      raise ValueError("nope")
+
+    job = queue.submit(fail)
+
+    assert job.wait(5)
+    assert job.status == "failed"
+    assert str(job.error) == "nope"
+    queue.shutdown()
+
+  def test_runs_jobs_concurrently(self):
+    barrier = threading.Barrier(3, timeout=5)
+    queue = JobQueue(3)
+
+    jobs = [queue.submit(barrier.wait) for _ in range(3)]
+
+    assert all(job.wait(5) for job in jobs)
+    assert all(job.status == "finished" for job in jobs)
+    queue.shutdown()
+
+  def test_rejects_jobs_once_full(self):
+    release = threading.Event()
+    queue = JobQueue(1, max_pending=2)
+
+    queue.submit(release.wait, 5)
+    queue.submit(release.wait, 5)
+
+    with pytest.raises(JobQueueFullError):
+      queue.submit(release.wait, 5)
+
+    assert queue.pending_count == 2
+    release.set()
+    queue.shutdown()
+    assert queue.pending_count == 0
+
+  def test_forgets_the_oldest_finished_jobs(self):
+    queue = JobQueue(1, max_finished=2)
+
+    jobs = [queue.submit(lambda: None) for _ in range(3)]
+    queue.shutdown()
+
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[1].id) is jobs[1]
+    assert queue.get(jobs[2].id) is jobs[2]
+
+  def test_returns_none_for_unknown_job(self):
+    assert JobQueue(1).get("unknown") is None
@@ -0,0 +1,90 @@
+import os
+
+from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
+
+from fertilizer.database import Database
+from fertilizer.ledger import ScanLedger, LedgerEntry
+
+
+def build_entry(outcome, scanned_at, injected=False):
+  return LedgerEntry(size=1, mtime_ns=1, infohash="abc", outcome=outcome, scanned_at=scanned_at, injected=injected)
+
+
+class TestScanLedger(SetupTeardown):
+  def test_records_outcome_and_file_details(self):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ledger = ScanLedger(Database.for_directory("/tmp/output"))
+
+    ledger.record(filepath, "generated", "abc")
+    entry = ledger.entries()[filepath]
+
+    assert entry.outcome == "generated"
+    assert entry.infohash == "abc"
+    assert entry.injected is False
+    assert ScanLedger.is_unchanged(entry, os.stat(filepath))
+
+  def test_ignores_missing_files(self):
+    ledger = ScanLedger(Database.for_directory("/tmp/output"))
+
+    ledger.record("/tmp/input/missing.torrent", "error")
+
+    assert ledger.entries() == {}
+
+  def test_detects_changed_files(self):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ledger = ScanLedger(Database.for_directory("/tmp/output"))
+    ledger.record(filepath, "generated", "abc")
+
+    with open(filepath, "ab") as f:
+      f.write(b"more")
+
+    assert not ScanLedger.is_unchanged(ledger.entries()[filepath], os.stat(filepath))
+
+  def test_final_outcomes_are_settled(self):
+    for outcome in ("generated", "already_exists", "skipped"):
+      assert ScanLedger.is_settled(build_entry(outcome, 0), not_found_recheck_age=60)
+
+  def test_records_whether_the_torrent_was_injected(self):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ledger = ScanLedger(Database.for_directory("/tmp/output"))
+
+    ledger.record(filepath, "generated", "abc", injected=True)
+
+    assert ledger.entries()[filepath].injected is True
+
+  def test_adds_the_injected_column_to_existing_ledgers(self):
+    database = Database.for_directory("/tmp/output")
+    database.execute(
+      """
+      CREATE TABLE scan_ledger (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        infohash TEXT,
+        outcome TEXT NOT NULL,
+        scanned_at REAL NOT NULL
+      )
+      """
+    )
+    database.execute("INSERT INTO scan_ledger VALUES ('/tmp/input/foo.torrent', 1, 1, 'abc', 'generated', 0)")
+
+    entry = ScanLedger(database).entries()["/tmp/input/foo.torrent"]
+
+    assert entry.outcome == "generated"
+    assert entry.injected is False
+
+  def test_uninjected_torrents_are_not_settled_when_injecting(self):
+    for outcome in ("generated", "already_exists"):
+      assert not ScanLedger.is_settled(build_entry(outcome, 0), not_found_recheck_age=60, injecting=True)
+      assert ScanLedger.is_settled(build_entry(outcome, 0, injected=True), not_found_recheck_age=60, injecting=True)
+
+    assert ScanLedger.is_settled(build_entry("skipped", 0), not_found_recheck_age=60, injecting=True)
+
+  def test_errors_are_never_settled(self):
+    assert not ScanLedger.is_settled(build_entry("error", 10**12), not_found_recheck_age=60)
+
+  def test_not_found_is_settled_until_old_enough(self, monkeypatch):
+    monkeypatch.setattr("fertilizer.ledger.time", lambda: 1000)
+
+    assert ScanLedger.is_settled(build_entry("not_found", 950), not_found_recheck_age=60)
+    assert not ScanLedger.is_settled(build_entry("not_found", 900), not_found_recheck_age=60)
@@ -0,0 +1,148 @@
+import os
+import pytest
+
+from unittest import mock
+
+from .helpers import SetupTeardown, get_support_file_path, copy_and_mkdir
+
+from fertilizer.errors import TorrentInjectionError
+from fertilizer.linker import LinkResult, LinkStats, Linker
+
+
+def make_tree(root, relative_paths):
+  for relative_path in relative_paths:
+    copy_and_mkdir(get_support_file_path("foo.txt"), os.path.join(root, relative_path))
+
+
+class TestLinker(SetupTeardown):
+  def test_links_a_single_file(self):
+    make_tree("/tmp/input", ["foo.txt"])
+
+    result = Linker().link("/tmp/input/foo.txt", "/tmp/injection/foo.txt")
+
+    assert result.link_count == 1
+    assert os.path.samefile("/tmp/input/foo.txt", "/tmp/injection/foo.txt")
+
+  @pytest.mark.parametrize("workers", [1, 4])
+  def test_links_every_file_of_a_directory_tree(self, workers):
+    relative_paths = ["a.txt", "CD1/01.flac", "CD1/02.flac", "CD2/01.flac", "CD2/Scans/front.jpg"]
+    make_tree("/tmp/input/Box Set", relative_paths)
+    os.makedirs("/tmp/input/Box Set/Empty")
+
+    result = Linker(workers).link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    assert result.link_count == len(relative_paths)
+    assert result.elapsed >= 0
+    assert os.path.isdir("/tmp/injection/Box Set/Empty")
+    for relative_path in relative_paths:
+      assert os.path.samefile(
+        os.path.join("/tmp/input/Box Set", relative_path), os.path.join("/tmp/injection/Box Set", relative_path)
+      )
+
+  def test_removes_everything_it_created_if_a_link_fails(self):
+    make_tree("/tmp/input/Box Set", ["CD1/01.flac", "CD1/02.flac", "CD2/01.flac"])
+    real_link = os.link
+
+    def failing_link(source, destination):
+      if destination.endswith("CD2/01.flac"):
+        raise OSError("No space left on device")
+      real_link(source, destination)
+
+    with mock.patch("fertilizer.linker.os.link", side_effect=failing_link):
+      with pytest.raises(OSError) as excinfo:
+        Linker(4).link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    assert "No space left on device" in str(excinfo.value)
+    assert not os.path.exists("/tmp/injection/Box Set")
+    assert os.path.exists("/tmp/input/Box Set/CD1/01.flac")
+
+  def test_only_links_files_that_arent_linked_yet(self):
+    make_tree("/tmp/input/Box Set", ["CD1/01.flac", "CD1/02.flac", "CD2/01.flac"])
+    make_tree("/tmp/injection/Box Set", ["other.txt"])
+    os.makedirs("/tmp/injection/Box Set/CD1")
+    os.link("/tmp/input/Box Set/CD1/01.flac", "/tmp/injection/Box Set/CD1/01.flac")
+
+    with mock.patch("fertilizer.linker.os.link", wraps=os.link) as link_mock:
+      result = Linker(4).link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    assert result.link_count == 2
+    assert result.existing_count == 1
+    assert link_mock.call_count == 3
+    assert os.path.samefile("/tmp/input/Box Set/CD2/01.flac", "/tmp/injection/Box Set/CD2/01.flac")
+    assert os.path.exists("/tmp/injection/Box Set/other.txt")
+
+  def test_does_nothing_if_everything_is_already_linked(self):
+    make_tree("/tmp/input/Box Set", ["CD1/01.flac", "02.flac"])
+    Linker().link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    result = Linker(4).link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    assert result.link_count == 0
+    assert result.existing_count == 2
+
+  def test_raises_if_a_different_file_is_in_the_way(self):
+    make_tree("/tmp/input/Box Set", ["01.flac", "02.flac"])
+    make_tree("/tmp/injection/Box Set", ["02.flac"])
+
+    with pytest.raises(TorrentInjectionError) as excinfo:
+      Linker(4).link("/tmp/input/Box Set", "/tmp/injection/Box Set")
+
+    assert "a different file is in the way: /tmp/injection/Box Set/02.flac" in str(excinfo.value)
+    assert not os.path.exists("/tmp/injection/Box Set/01.flac")
+    assert not os.path.samefile("/tmp/input/Box Set/02.flac", "/tmp/injection/Box Set/02.flac")
+
+
+class TestLinkerWithManifest(SetupTeardown):
+  def test_only_links_the_listed_files(self):
+    make_tree("/tmp/input/Box Set", ["CD1/01.flac", "CD1/02.flac", "Scans/front.jpg", "rip.log"])
+    size = os.path.getsize("/tmp/input/Box Set/rip.log")
+    manifest = [(os.path.join("CD1", "01.flac"), size), (os.path.join("CD1", "02.flac"), size)]
+
+    result = Linker(4).link("/tmp/input/Box Set", "/tmp/injection/Box Set", manifest)
+
+    assert result.link_count == 2
+    assert os.path.samefile("/tmp/input/Box Set/CD1/02.flac", "/tmp/injection/Box Set/CD1/02.flac")
+    assert sorted(os.listdir("/tmp/injection/Box Set")) == ["CD1"]
+
+  def test_links_a_single_file_torrent(self):
+    make_tree("/tmp/input", ["foo.txt"])
+
+    result = Linker().link(
+      "/tmp/input/foo.txt", "/tmp/injection/foo.txt", [("", os.path.getsize("/tmp/input/foo.txt"))]
+    )
+
+    assert result.link_count == 1
+    assert os.path.samefile("/tmp/input/foo.txt", "/tmp/injection/foo.txt")
+
+  def test_checks_sizes_before_linking_anything(self):
+    make_tree("/tmp/input/Box Set", ["01.flac", "02.flac"])
+    size = os.path.getsize("/tmp/input/Box Set/01.flac")
+
+    with pytest.raises(TorrentInjectionError) as excinfo:
+      Linker().link("/tmp/input/Box Set", "/tmp/injection/Box Set", [("01.flac", size), ("02.flac", size + 1)])
+
+    assert f"02.flac is {size} bytes, expected {size + 1}" in str(excinfo.value)
+    assert not os.path.exists("/tmp/injection/Box Set")
+
+  def test_raises_if_a_listed_file_is_missing(self):
+    make_tree("/tmp/input/Box Set", ["01.flac"])
+
+    with pytest.raises(TorrentInjectionError) as excinfo:
+      Linker().link("/tmp/input/Box Set", "/tmp/injection/Box Set", [("02.flac", 1)])
+
+    assert "Torrent data is missing a file: /tmp/input/Box Set/02.flac" in str(excinfo.value)
+
+
+class TestLinkStats(SetupTeardown):
+  def test_reports_totals(self):
+    stats = LinkStats()
+    stats.add(LinkResult(3, 0.5))
+    stats.add(LinkResult(1, 0.25))
+
+    assert stats.report() == "*\tLinked 4 files for 2 torrents in 0.75 seconds"
+
+  def test_reports_files_that_were_already_linked(self):
+    stats = LinkStats()
+    stats.add(LinkResult(1, 0.5, 2))
+
+    assert stats.report() == "*\tLinked 1 files (2 already linked) for 1 torrent in 0.50 seconds"
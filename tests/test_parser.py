@@ -1,7 +1,10 @@
 import os
 import pytest
+from hashlib import sha1
 
-from .helpers import get_torrent_path, SetupTeardown
+import bencoder
+
+from .helpers import get_torrent_path, get_support_file_path, SetupTeardown
 
 from fertilizer.errors import TorrentDecodingError
 from fertilizer.trackers import RedTracker, OpsTracker
@@ -9,12 +12,21 @@ from fertilizer.parser import (
   is_valid_infohash,
   get_source,
   get_name,
+  get_file_manifest,
   get_bencoded_data,
   get_announce_url,
   get_origin_tracker,
   recalculate_hash_for_new_source,
   save_bencoded_data,
   calculate_infohash,
+  calculate_infohash_from_bytes,
+  calculate_infohash_from_file,
+  find_info_span,
+  calculate_source_variant_hashes,
+  get_bencoded_values,
+  get_partial_bencoded_data,
+  ORIGIN_TRACKER_KEY_PATHS,
+  FILE_MANIFEST_KEY_PATHS,
 )
 
 
@@ -45,6 +57,41 @@ class TestGetName(SetupTeardown):
     assert get_name({}) is None
 
 
+class TestGetFileManifest(SetupTeardown):
+  def test_lists_files_of_multi_file_torrents(self):
+    with open(get_torrent_path("red_source"), "rb") as f:
+      torrent_data = get_bencoded_values(f.read(), FILE_MANIFEST_KEY_PATHS)
+
+    assert get_file_manifest(torrent_data) == [
+      ("Big Buck Bunny.en.srt", 140),
+      ("Big Buck Bunny.mp4", 276134947),
+      ("poster.jpg", 310380),
+    ]
+
+  def test_joins_nested_paths_and_skips_padding_files(self):
+    torrent_data = {
+      b"info": {
+        b"files": [
+          {b"length": 10, b"path": [b"CD1", b"01.flac"]},
+          {b"length": 6, b"path": [b".pad", b"6"], b"attr": b"p"},
+        ]
+      }
+    }
+
+    assert get_file_manifest(torrent_data) == [(os.path.join("CD1", "01.flac"), 10)]
+
+  def test_lists_single_file_torrents_as_the_content_itself(self):
+    assert get_file_manifest({b"info": {b"name": b"foo.flac", b"length": 10}}) == [("", 10)]
+
+  def test_raises_on_paths_outside_of_the_content(self):
+    with pytest.raises(TorrentDecodingError):
+      get_file_manifest({b"info": {b"files": [{b"length": 10, b"path": [b"..", b"etc"]}]}})
+
+  def test_raises_if_no_files_are_listed(self):
+    with pytest.raises(TorrentDecodingError):
+      get_file_manifest({b"info": {}})
+
+
 class TestGetAnnounceUrl(SetupTeardown):
   def test_returns_url_if_present_in_announce(self):
     assert get_announce_url({b"announce": b"https://foo.bar"}) == [b"https://foo.bar"]
@@ -79,6 +126,10 @@ class TestGetOriginTracker(SetupTeardown):
   def test_returns_ops_based_on_trackers(self):
     assert get_origin_tracker({b"trackers": [[b"https://home.opsfet.ch/123abc"], b"https://baz.qux"]}) == OpsTracker
 
+  def test_accepts_memoryview_values(self):
+    assert get_origin_tracker({b"info": {b"source": memoryview(b"RED")}}) == RedTracker
+    assert get_origin_tracker({b"announce": memoryview(b"https://home.opsfet.ch/123abc")}) == OpsTracker
+
   def test_returns_none_if_no_match(self):
     assert get_origin_tracker({}) is None
     assert get_origin_tracker({b"info": {b"source": b"FOO"}}) is None
@@ -101,6 +152,51 @@ class TestCalculateInfohash(SetupTeardown):
     assert "Torrent data does not contain 'info' key" in str(excinfo.value)
 
 
+class TestCalculateInfohashFromBytes(SetupTeardown):
+  def test_matches_decoded_infohash_for_all_support_torrents(self):
+    for name in ("red_source", "ops_source", "red_announce", "ops_announce", "no_source", "qbit_ops", "broken_name"):
+      torrent_path = get_torrent_path(name)
+
+      assert calculate_infohash_from_file(torrent_path) == calculate_infohash(get_bencoded_data(torrent_path))
+
+  def test_hashes_the_raw_info_bytes(self):
+    data = b"d8:announce3:foo4:infod4:name3:bar6:lengthi1eee"
+
+    assert calculate_infohash_from_bytes(data) == sha1(b"d4:name3:bar6:lengthi1ee").hexdigest().upper()
+
+  def test_raises_if_no_info_key(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      calculate_infohash_from_file(get_torrent_path("no_info"))
+
+    assert "Torrent data does not contain 'info' key" in str(excinfo.value)
+
+  def test_raises_if_data_is_not_bencoded(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      calculate_infohash_from_bytes(b"not a torrent")
+
+    assert "Error decoding torrent file" in str(excinfo.value)
+
+  def test_raises_if_data_is_truncated(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      calculate_infohash_from_bytes(b"d4:infod6:pieces20:abc")
+
+    assert "Error decoding torrent file" in str(excinfo.value)
+
+
+class TestFindInfoSpan(SetupTeardown):
+  def test_returns_offsets_of_info_value(self):
+    data = b"d8:announce3:foo4:infod6:source3:REDe7:privatei1ee"
+    start, end = find_info_span(data)
+
+    assert data[start:end] == b"d6:source3:REDe"
+
+  def test_skips_nested_values_before_info(self):
+    data = b"d13:announce-listll3:fooel3:baree8:creationi3e4:infod6:source3:REDee"
+    start, end = find_info_span(data)
+
+    assert data[start:end] == b"d6:source3:REDe"
+
+
 class TestRecalculateHashForNewSource(SetupTeardown):
   def test_replaces_source_and_returns_hash(self):
     torrent_data = {b"info": {b"source": b"RED"}}
@@ -119,6 +215,41 @@ class TestRecalculateHashForNewSource(SetupTeardown):
     assert torrent_data == {b"info": {b"source": b"RED"}}
 
 
+class TestCalculateSourceVariantHashes(SetupTeardown):
+  def __reencoded_hash(self, torrent_data, new_source):
+    info = {**torrent_data[b"info"], b"source": new_source}
+    return sha1(bencoder.encode(info)).hexdigest().upper()
+
+  def test_matches_reencoding_for_each_source(self):
+    torrent_data = get_bencoded_data(get_torrent_path("red_source"))
+    sources = [b"OPS", b"APL", b""]
+
+    result = calculate_source_variant_hashes(torrent_data, sources)
+
+    assert list(result.keys()) == sources
+    for source in sources:
+      assert result[source] == self.__reencoded_hash(torrent_data, source)
+
+  def test_handles_torrents_without_source(self):
+    torrent_data = get_bencoded_data(get_torrent_path("no_source"))
+
+    result = calculate_source_variant_hashes(torrent_data, [b"RED"])
+
+    assert result[b"RED"] == self.__reencoded_hash(torrent_data, b"RED")
+
+  def test_handles_keys_sorting_after_source(self):
+    torrent_data = {b"info": {b"name": b"foo", b"source": b"RED", b"x-cross-seed": b"abc"}}
+
+    result = calculate_source_variant_hashes(torrent_data, [b"OPS", "APL"])
+
+    assert result[b"OPS"] == self.__reencoded_hash(torrent_data, b"OPS")
+    assert result["APL"] == self.__reencoded_hash(torrent_data, "APL")
+
+  def test_raises_if_no_info_key(self):
+    with pytest.raises(TorrentDecodingError):
+      calculate_source_variant_hashes({}, [b"RED"])
+
+
 class TestGetTorrentData(SetupTeardown):
   def test_returns_torrent_data(self):
     result = get_bencoded_data(get_torrent_path("no_source"))
@@ -132,6 +263,61 @@ class TestGetTorrentData(SetupTeardown):
     assert result is None
 
 
+class TestGetBencodedValues(SetupTeardown):
+  def test_returns_only_requested_keys(self):
+    data = b"d8:announce3:foo7:comment3:bar4:infod6:pieces4:abcd6:source3:REDee"
+
+    result = get_bencoded_values(data, [(b"info", b"source"), (b"announce",)])
+
+    assert result == {b"announce": b"foo", b"info": {b"source": b"RED"}}
+
+  def test_returns_strings_as_memoryviews_of_the_data(self):
+    data = b"d8:announce3:fooe"
+
+    result = get_bencoded_values(data, [(b"announce",)])
+
+    assert isinstance(result[b"announce"], memoryview)
+    assert result[b"announce"].obj is data
+
+  def test_decodes_whole_value_at_end_of_path(self):
+    data = b"d8:trackersll3:fooel3:bari1eeee"
+
+    result = get_bencoded_values(data, [(b"trackers",)])
+
+    assert result == {b"trackers": [[b"foo"], [b"bar", 1]]}
+
+  def test_returns_empty_dict_for_present_parent_with_missing_child(self):
+    data = b"d4:infod4:name3:fooee"
+
+    assert get_bencoded_values(data, [(b"info", b"source")]) == {b"info": {}}
+
+  def test_ignores_paths_through_non_dictionaries(self):
+    data = b"d4:infoli1eee"
+
+    assert get_bencoded_values(data, [(b"info", b"source")]) == {}
+
+  def test_matches_full_decode_for_support_torrents(self):
+    for name in ("red_source", "ops_announce", "qbit_ops"):
+      full = get_bencoded_data(get_torrent_path(name))
+      partial = get_partial_bencoded_data(get_torrent_path(name), [(b"info", b"name"), (b"announce",)])
+
+      assert partial[b"info"][b"name"] == full[b"info"][b"name"]
+      assert partial.get(b"announce") == full.get(b"announce")
+
+  def test_classifies_fastresume_files(self):
+    fastresume_data = get_partial_bencoded_data(get_support_file_path("qbit_ops.fastresume"), ORIGIN_TRACKER_KEY_PATHS)
+
+    assert get_origin_tracker(fastresume_data) == OpsTracker
+
+  def test_raises_on_malformed_data(self):
+    with pytest.raises(TorrentDecodingError):
+      get_bencoded_values(b"d4:infod6:source3:RE", [(b"info", b"source")])
+
+  def test_partial_data_returns_none_on_error(self):
+    assert get_partial_bencoded_data(get_support_file_path("foo.txt"), [(b"info",)]) is None
+    assert get_partial_bencoded_data("/tmp/missing.torrent", [(b"info",)]) is None
+
+
 class TestSaveTorrentData(SetupTeardown):
   def test_saves_torrent_data(self):
     torrent_data = {b"info": {b"source": b"RED"}}
@@ -165,3 +351,24 @@ class TestSaveTorrentData(SetupTeardown):
     assert os.path.exists("/tmp/output/foo")
 
     os.remove(filename)
+
+  def test_replaces_existing_file_without_leaving_temporary_files(self):
+    filename = "/tmp/output/test_save_bencoded_data.torrent"
+    save_bencoded_data(filename, {b"info": {b"source": b"RED"}})
+
+    save_bencoded_data(filename, {b"info": {b"source": b"OPS"}})
+
+    with open(filename, "rb") as f:
+      assert f.read() == b"d4:infod6:source3:OPSee"
+    assert os.listdir("/tmp/output") == ["test_save_bencoded_data.torrent"]
+
+  def test_leaves_existing_file_untouched_if_writing_fails(self):
+    filename = "/tmp/output/test_save_bencoded_data.torrent"
+    save_bencoded_data(filename, {b"info": {b"source": b"RED"}})
+
+    with pytest.raises(Exception):
+      save_bencoded_data(filename, {b"info": {b"source": object()}})
+
+    with open(filename, "rb") as f:
+      assert f.read() == b"d4:infod6:source3:REDee"
+    assert os.listdir("/tmp/output") == ["test_save_bencoded_data.torrent"]
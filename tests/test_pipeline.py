@@ -0,0 +1,114 @@
+import threading
+
+from .helpers import SetupTeardown
+
+from fertilizer.pipeline import Pipeline, Stage
+
+
+class TestStage(SetupTeardown):
+  def test_handles_every_item(self):
+    handled = []
+    stage = Stage("test", handled.append).start()
+
+    for i in range(10):
+      stage.put(i)
+    stage.finish()
+
+    assert handled == list(range(10))
+    assert stage.processed == 10
+
+  def test_runs_multiple_workers(self):
+    barrier = threading.Barrier(3, timeout=5)
+    stage = Stage("test", lambda _item: barrier.wait(), workers=3).start()
+
+    for i in range(3):
+      stage.put(i)
+    stage.finish()
+
+    assert stage.processed == 3
+
+  def test_joins_without_stopping_workers(self):
+    handled = []
+    stage = Stage("test", handled.append).start()
+
+    stage.put(1)
+    stage.join()
+    assert handled == [1]
+
+    stage.put(2)
+    stage.finish()
+    assert handled == [1, 2]
+
+  def test_tracks_peak_queue_depth(self):
+    release = threading.Event()
+    stage = Stage("test", lambda _item: release.wait(5)).start()
+
+    for i in range(4):
+      stage.put(i)
+    release.set()
+    stage.finish()
+
+    assert 3 <= stage.peak_queue_depth <= 4
+
+  def test_reports_throughput_and_queue_depth(self):
+    stage = Stage("Hashing", lambda _item: None).start()
+    stage.put(1)
+    stage.finish()
+
+    report = stage.report()
+
+    assert "Hashing: 1 processed" in report
+    assert "/s)" in report
+    assert "peak queue depth" in report
+
+
+class TestPipeline(SetupTeardown):
+  def test_drains_stages_in_order(self):
+    results = []
+    second = Stage("second", results.append)
+    first = Stage("first", lambda item: second.put(item * 2))
+    pipeline = Pipeline([first, second]).start()
+
+    for i in range(5):
+      first.put(i)
+    pipeline.finish()
+
+    assert results == [0, 2, 4, 6, 8]
+
+
+class TestStageErrors(SetupTeardown):
+  def test_keeps_handling_items_after_the_handler_raises(self, caplog):
+    handled = []
+
+    def handle(item):
+      if item == 0:
+        raise ValueError("nope")
+      handled.append(item)
+
+    stage = Stage("test", handle).start()
+
+    for i in range(3):
+      stage.put(i)
+    stage.join()
+    stage.finish()
+
+    assert handled == [1, 2]
+    assert stage.processed == 2
+    assert stage.failed == 1
+    assert "test stage failed to handle 0" in caplog.text
+    assert "1 failed" in stage.report()
+
+  def test_passes_failed_items_to_on_error(self):
+    errors = []
+
+    def handle(_item):
+      raise ValueError("nope")
+
+    stage = Stage("test", handle, on_error=lambda item, error: errors.append((item, str(error)))).start()
+
+    stage.put(1)
+    stage.put(2)
+    stage.finish()
+
+    assert errors == [(1, "nope"), (2, "nope")]
+    assert stage.failed == 2
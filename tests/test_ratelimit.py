@@ -0,0 +1,174 @@
+import os
+import stat
+import threading
+from time import monotonic
+
+import pytest
+
+from .helpers import SetupTeardown
+
+from fertilizer.ratelimit import FileTokenBucket, TokenBucket, shared_state_directory, shared_token_bucket
+
+
+class TestTokenBucket(SetupTeardown):
+  def test_does_not_wait_while_tokens_remain(self):
+    bucket = TokenBucket(rate=1, burst=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+
+  def test_waits_for_the_next_token_once_empty(self):
+    bucket = TokenBucket(rate=20, burst=1)
+    bucket.acquire()
+
+    start = monotonic()
+    waited = bucket.acquire()
+
+    assert waited == pytest.approx(0.05, abs=0.01)
+    assert monotonic() - start >= 0.04
+
+  def test_refills_up_to_burst(self):
+    bucket = TokenBucket(rate=1000, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    bucket._updated_at -= 10
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() > 0
+
+  def test_zero_rate_is_unlimited(self):
+    bucket = TokenBucket.from_delay(0)
+
+    assert all(bucket.acquire() == 0 for _ in range(100))
+
+  def test_spaces_out_concurrent_callers(self):
+    bucket = TokenBucket(rate=50, burst=1)
+    finished_at = []
+
+    def worker():
+      bucket.acquire()
+      finished_at.append(monotonic())
+
+    start = monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    # One immediate token plus five at 20ms intervals
+    assert max(finished_at) - start >= 0.09
+
+  def test_rejects_invalid_limits(self):
+    with pytest.raises(ValueError):
+      TokenBucket(rate=-1)
+
+    with pytest.raises(ValueError):
+      TokenBucket(rate=1, burst=0)
+
+
+class TestSharedTokenBucket(SetupTeardown):
+  def test_returns_the_same_bucket_for_the_same_key(self):
+    assert shared_token_bucket("https://foo.bar", 2) is shared_token_bucket("https://foo.bar", 2)
+
+  def test_returns_different_buckets_for_different_keys_or_limits(self):
+    bucket = shared_token_bucket("https://foo.bar", 2)
+
+    assert bucket is not shared_token_bucket("https://baz.qux", 2)
+    assert bucket is not shared_token_bucket("https://foo.bar", 1)
+
+  def test_backoff_delays_the_next_token(self):
+    bucket = TokenBucket(rate=0)
+    bucket.backoff(0.05)
+
+    assert bucket.acquire() == pytest.approx(0.05, abs=0.01)
+    assert bucket.acquire() == 0
+
+
+class TestFileTokenBucket(SetupTeardown):
+  def test_shares_tokens_between_instances_using_the_same_file(self):
+    first = FileTokenBucket("/tmp/output/site.ratelimit", rate=20, burst=1)
+    second = FileTokenBucket("/tmp/output/site.ratelimit", rate=20, burst=1)
+
+    assert first.acquire() == 0
+    assert second.acquire() == pytest.approx(0.05, abs=0.01)
+
+  def test_shares_backoff_between_instances_using_the_same_file(self):
+    first = FileTokenBucket("/tmp/output/site.ratelimit", rate=0)
+    second = FileTokenBucket("/tmp/output/site.ratelimit", rate=0)
+
+    first.backoff(0.05)
+
+    assert second.acquire() == pytest.approx(0.05, abs=0.01)
+
+  def test_does_not_share_tokens_between_files(self):
+    first = FileTokenBucket("/tmp/output/foo.ratelimit", rate=1, burst=1)
+    second = FileTokenBucket("/tmp/output/bar.ratelimit", rate=1, burst=1)
+
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+
+  def test_starts_with_a_full_bucket_if_the_state_file_is_unreadable(self):
+    with open("/tmp/output/site.ratelimit", "w") as f:
+      f.write("garbage")
+
+    bucket = FileTokenBucket("/tmp/output/site.ratelimit", rate=1, burst=2)
+
+    assert [bucket.acquire(), bucket.acquire()] == [0, 0]
+
+  def test_never_follows_a_symlinked_state_file(self):
+    with open("/tmp/output/target", "w") as f:
+      f.write("untouched")
+    os.symlink("/tmp/output/target", "/tmp/output/site.ratelimit")
+
+    bucket = FileTokenBucket("/tmp/output/site.ratelimit", rate=20, burst=1)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.05, abs=0.01)
+    with open("/tmp/output/target") as f:
+      assert f.read() == "untouched"
+
+
+class TestSharedStateDirectory(SetupTeardown):
+  def test_uses_a_private_directory_in_the_runtime_directory(self, tmp_path):
+    directory = shared_state_directory()
+
+    assert directory == os.path.join(os.environ["XDG_RUNTIME_DIR"], "fertilizer")
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+  def test_falls_back_to_a_per_user_temp_directory(self, monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr("tempfile.gettempdir", lambda: str(tmp_path))
+
+    assert shared_state_directory() == os.path.join(str(tmp_path), f"fertilizer-{os.getuid()}")
+
+  def test_refuses_directories_others_can_access(self, monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr("tempfile.gettempdir", lambda: str(tmp_path))
+    os.mkdir(tmp_path / f"fertilizer-{os.getuid()}", mode=0o777)
+    os.chmod(tmp_path / f"fertilizer-{os.getuid()}", 0o777)
+
+    with pytest.raises(PermissionError):
+      shared_state_directory()
+
+    bucket = shared_token_bucket("https://shared.example", 2)
+    assert type(bucket) is TokenBucket
+
+  def test_refuses_symlinked_directories(self, monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr("tempfile.gettempdir", lambda: str(tmp_path))
+    os.mkdir(tmp_path / "elsewhere", mode=0o700)
+    os.symlink(tmp_path / "elsewhere", tmp_path / f"fertilizer-{os.getuid()}")
+
+    with pytest.raises(PermissionError):
+      shared_state_directory()
+
+  def test_keeps_accounts_apart(self):
+    first = shared_token_bucket("https://account.example", 2, account="first key")
+    second = shared_token_bucket("https://account.example", 2, account="second key")
+
+    assert first is not second
+    assert first.filepath != second.filepath
+    assert "first key" not in first.filepath
+    assert first.filepath.startswith(shared_state_directory())
@@ -0,0 +1,47 @@
+from .helpers import SetupTeardown
+
+from fertilizer.database import Database
+from fertilizer.response_cache import ResponseCache
+
+
+def build_cache(not_found_ttl=60):
+  return ResponseCache(Database.for_directory("/tmp/output"), not_found_ttl=not_found_ttl)
+
+
+class TestResponseCache(SetupTeardown):
+  def test_returns_none_for_unknown_entries(self):
+    assert build_cache().get("RED", "abc") is None
+
+  def test_caches_found_torrents(self):
+    cache = build_cache()
+    cache.set("RED", "abc", self.TORRENT_SUCCESS_RESPONSE)
+
+    assert cache.get("RED", "abc") == self.TORRENT_SUCCESS_RESPONSE
+    assert cache.get("OPS", "abc") is None
+
+  def test_keeps_found_torrents_regardless_of_ttl(self):
+    cache = build_cache(not_found_ttl=0)
+    cache.set("RED", "abc", self.TORRENT_SUCCESS_RESPONSE)
+
+    assert cache.get("RED", "abc") == self.TORRENT_SUCCESS_RESPONSE
+
+  def test_caches_not_found_torrents_until_they_expire(self):
+    cache = build_cache(not_found_ttl=60)
+    cache.set("RED", "abc", self.TORRENT_KNOWN_BAD_RESPONSE)
+
+    assert cache.get("RED", "abc") == self.TORRENT_KNOWN_BAD_RESPONSE
+
+    cache._db.execute("UPDATE api_responses SET fetched_at = fetched_at - 61")
+
+    assert cache.get("RED", "abc") is None
+
+  def test_does_not_cache_unknown_errors(self):
+    cache = build_cache()
+    cache.set("RED", "abc", self.TORRENT_UNKNOWN_BAD_RESPONSE)
+
+    assert cache.get("RED", "abc") is None
+
+  def test_persists_between_instances(self):
+    build_cache().set("RED", "abc", self.TORRENT_SUCCESS_RESPONSE)
+
+    assert build_cache().get("RED", "abc") == self.TORRENT_SUCCESS_RESPONSE
@@ -1,16 +1,67 @@
 import os
 import re
 import shutil
+import threading
 import pytest
 import requests_mock
+from time import sleep, time
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from colorama import Fore
 
 from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
 
+from fertilizer.database import Database
 from fertilizer.errors import TorrentExistsInClientError, TorrentDecodingError
-from fertilizer.scanner import scan_torrent_directory, scan_torrent_file
+from fertilizer.index import InfohashIndex
+from fertilizer.ledger import ScanLedger
+from fertilizer.parser import calculate_infohash_from_file, get_bencoded_data, save_bencoded_data
+from fertilizer.scanner import (
+  _calculate_reciprocal_hashes_without_data,
+  _process_pool,
+  scan_torrent_directory,
+  scan_torrent_file,
+)
+from fertilizer.singleflight import SOURCE_TORRENT_FLIGHTS, SingleFlight
+from fertilizer.trackers import OpsTracker
+
+
+def wait_for_follower(flight):
+  deadline = time() + 5
+  while not flight.followers and time() < deadline:
+    sleep(0.01)
+
+
+def mock_injector(batch_size=None):
+  # A mock `Injection` that queues torrents like the real one and injects them through its `inject_torrent`
+  injector_mock = MagicMock()
+  queue = []
+
+  def inject(batch):
+    results = []
+    for key, args in batch:
+      try:
+        results.append((key, injector_mock.inject_torrent(*args)))
+      except Exception as e:
+        results.append((key, e))
+
+    return results
+
+  def queue_torrent(*args, key=None):
+    queue.append((key, args))
+    if batch_size is None or len(queue) < batch_size:
+      return []
+
+    return flush()
+
+  def flush():
+    batch = queue[:]
+    queue.clear()
+    return inject(batch)
+
+  injector_mock.queue_torrent.side_effect = queue_torrent
+  injector_mock.flush.side_effect = flush
+  return injector_mock
 
 
 class TestScanTorrentFile(SetupTeardown):
@@ -43,6 +94,17 @@ class TestScanTorrentFile(SetupTeardown):
       assert os.path.isfile(filepath)
       assert filepath == "/tmp/output/OPS/foo [OPS].torrent"
 
+  def test_records_generated_torrent_in_output_index(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      filepath = scan_torrent_file("/tmp/input/red_source.torrent", "/tmp/output", red_api, ops_api, None)
+
+    assert InfohashIndex("/tmp/output").get("2AEE440CDC7429B3E4A7E4D20E3839DBB48D72C2") == filepath
+
   def test_calls_injector_if_provided(self, red_api, ops_api):
     injector_mock = MagicMock()
     injector_mock.inject_torrent = MagicMock()
@@ -75,6 +137,68 @@ class TestScanTorrentFile(SetupTeardown):
       "/tmp/input/red_source.torrent", "/tmp/output/ops_source.torrent", "OPS"
     )
 
+  def test_checks_the_client_before_tracker_lookups(self, red_api, ops_api):
+    injector_mock = MagicMock()
+    injector_mock.client_infohashes.return_value = {"2aee440cdc7429b3e4a7e4d20e3839dbb48d72c2"}
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      with pytest.raises(TorrentExistsInClientError):
+        scan_torrent_file("/tmp/input/red_source.torrent", "/tmp/output", red_api, ops_api, injector_mock)
+
+      assert m.call_count == 0
+
+    injector_mock.inject_torrent.assert_not_called()
+
+  def test_shares_the_result_of_a_concurrent_scan_of_the_same_torrent(self, red_api, ops_api):
+    injector_mock = MagicMock()
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    flights = SingleFlight()
+    flight, _ = flights.join(calculate_infohash_from_file("/tmp/input/red_source.torrent"))
+    results = []
+
+    with requests_mock.Mocker() as m:
+      thread = threading.Thread(
+        target=lambda: results.append(
+          scan_torrent_file(
+            "/tmp/input/red_source.torrent", "/tmp/output", red_api, ops_api, injector_mock, flights=flights
+          )
+        )
+      )
+      thread.start()
+      wait_for_follower(flight)
+      flights.land(
+        calculate_infohash_from_file("/tmp/input/red_source.torrent"),
+        result=(OpsTracker, "/tmp/output/OPS/foo [OPS].torrent", False),
+      )
+      thread.join(5)
+
+      assert m.call_count == 0
+
+    assert results == ["/tmp/output/OPS/foo [OPS].torrent"]
+    injector_mock.inject_torrent.assert_not_called()
+
+  def test_shares_the_error_of_a_concurrent_scan_of_the_same_torrent(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    flights = SingleFlight()
+    flight, _ = flights.join(calculate_infohash_from_file("/tmp/input/red_source.torrent"))
+    errors = []
+
+    def scan():
+      try:
+        scan_torrent_file("/tmp/input/red_source.torrent", "/tmp/output", red_api, ops_api, None, flights=flights)
+      except Exception as e:
+        errors.append(e)
+
+    thread = threading.Thread(target=scan)
+    thread.start()
+    wait_for_follower(flight)
+    error = TorrentExistsInClientError("Torrent exists in client")
+    flights.land(calculate_infohash_from_file("/tmp/input/red_source.torrent"), error=error)
+    thread.join(5)
+
+    assert errors == [error]
+
   def test_doesnt_blow_up_if_other_torrent_name_has_bad_encoding(self, red_api, ops_api):
     copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
     copy_and_mkdir(get_torrent_path("broken_name"), "/tmp/output/broken_name.torrent")
@@ -191,7 +315,7 @@ class TestScanTorrentDirectory(SetupTeardown):
     assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 1" in captured.out
 
   def test_returns_calls_injector_on_duplicate(self, capsys, red_api, ops_api):
-    injector_mock = MagicMock()
+    injector_mock = mock_injector()
     injector_mock.inject_torrent = MagicMock()
 
     copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
@@ -210,7 +334,7 @@ class TestScanTorrentDirectory(SetupTeardown):
     )
 
   def test_lists_torrents_that_already_exist_in_client(self, capsys, red_api, ops_api):
-    injector_mock = MagicMock()
+    injector_mock = mock_injector()
     injector_mock.inject_torrent = MagicMock()
     injector_mock.inject_torrent.side_effect = TorrentExistsInClientError("Torrent exists in client")
     copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
@@ -291,8 +415,141 @@ class TestScanTorrentDirectory(SetupTeardown):
 
       assert "Analyzed 0 local torrents" in captured.out
 
+  def test_scans_nested_input_directories(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/nested/no_source.torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+    captured = capsys.readouterr()
+
+    assert "Analyzed 1 local torrent " in captured.out
+    assert f"{Fore.LIGHTBLACK_EX}Skipped{Fore.RESET}: 1" in captured.out
+
+  def test_does_not_scan_output_directory_inside_input_directory(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/output/OPS/foo [OPS].torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/input/output", red_api, ops_api, None))
+    captured = capsys.readouterr()
+
+    assert "Analyzed 0 local torrents" in captured.out
+
+  def test_reports_pipeline_stages(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+    assert "Pipeline stages:" in captured.out
+    assert "Hashing: 1 processed" in captured.out
+    assert "OPS lookup: 1 processed" in captured.out
+    assert "RED lookup: 0 processed" in captured.out
+    assert "Writing: 1 processed" in captured.out
+    assert "Injection: 0 processed" in captured.out
+
+  def test_looks_up_both_trackers_concurrently(self, capsys):
+    # Each lookup only returns once a lookup on the other tracker is in flight at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def find_torrent(_infohash):
+      barrier.wait()
+      return self.TORRENT_KNOWN_BAD_RESPONSE
+
+    red_api, ops_api = MagicMock(), MagicMock()
+    red_api.find_torrent.side_effect = find_torrent
+    ops_api.find_torrent.side_effect = find_torrent
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    # Renamed so that it isn't a cross-seed of the RED torrent
+    ops_torrent_data = get_bencoded_data(get_torrent_path("ops_source"))
+    ops_torrent_data[b"info"][b"name"] = b"Something else"
+    save_bencoded_data("/tmp/input/ops_renamed.torrent", ops_torrent_data)
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.LIGHTRED_EX}Not found{Fore.RESET}: 2" in captured.out
+    assert red_api.find_torrent.call_count == 3
+    assert ops_api.find_torrent.call_count == 3
+
+  def test_looks_up_torrents_while_the_input_directory_is_still_walked(self, capsys, monkeypatch):
+    monkeypatch.setattr("fertilizer.scanner.INPUT_BATCH_SIZE", 1)
+    looked_up = threading.Event()
+    walk_outcome = []
+
+    def find_torrent(_infohash):
+      looked_up.set()
+      return self.TORRENT_KNOWN_BAD_RESPONSE
+
+    def walk_files_of_extension(*_args, **_kwargs):
+      filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+      yield filepath, os.stat(filepath)
+      # The rest of the walk only goes on once the first torrent has been looked up
+      walk_outcome.append(looked_up.wait(5))
+
+    monkeypatch.setattr("fertilizer.scanner.walk_files_of_extension", walk_files_of_extension)
+    red_api, ops_api = MagicMock(), MagicMock()
+    ops_api.find_torrent.side_effect = find_torrent
+    os.makedirs("/tmp/input", exist_ok=True)
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+    captured = capsys.readouterr()
+
+    assert walk_outcome == [True]
+    assert "Analyzed 1 local torrent " in captured.out
+
+  def test_considers_input_torrents_walked_after_a_lookup_as_already_existing(
+    self, capsys, monkeypatch, red_api, ops_api
+  ):
+    monkeypatch.setattr("fertilizer.scanner.INPUT_BATCH_SIZE", 1)
+    looked_up = threading.Event()
+
+    def find_torrent(_request, _context):
+      looked_up.set()
+      return self.TORRENT_SUCCESS_RESPONSE
+
+    def walk_files_of_extension(*_args, **_kwargs):
+      filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+      yield filepath, os.stat(filepath)
+      # Its counterpart only turns up once the first torrent was found on the tracker
+      looked_up.wait(5)
+      sleep(0.1)
+      filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+      yield filepath, os.stat(filepath)
+
+    monkeypatch.setattr("fertilizer.scanner.walk_files_of_extension", walk_files_of_extension)
+    injector_mock = mock_injector()
+    os.makedirs("/tmp/input", exist_ok=True)
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=find_torrent)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock))
+      captured = capsys.readouterr()
+
+    assert looked_up.is_set()
+    assert "Torrent already exists in input directory at /tmp/input/ops_source.torrent" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 2" in captured.out
+    assert not os.path.exists("/tmp/output/OPS")
+    injector_mock.inject_torrent.assert_not_called()
+
+  def test_hashes_input_torrents_with_worker_processes(self, capsys, monkeypatch, red_api, ops_api):
+    monkeypatch.setattr("fertilizer.scanner.PARALLEL_HASHING_THRESHOLD", 0)
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    copy_and_mkdir(get_torrent_path("broken"), "/tmp/input/broken.torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, jobs=2))
+    captured = capsys.readouterr()
+
+    assert "Torrent already exists in input directory at /tmp/input/red_source.torrent" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 2" in captured.out
+    assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
   def test_calls_injector_if_provided(self, red_api, ops_api):
-    injector_mock = MagicMock()
+    injector_mock = mock_injector()
     injector_mock.inject_torrent = MagicMock()
     copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
 
@@ -306,6 +563,93 @@ class TestScanTorrentDirectory(SetupTeardown):
       "/tmp/input/red_source.torrent", "/tmp/output/OPS/foo [OPS].torrent", "OPS"
     )
 
+  def test_looks_up_and_injects_duplicate_input_torrents_once(self, capsys, red_api, ops_api):
+    injector_mock = mock_injector()
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/copy/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock))
+      captured = capsys.readouterr()
+
+      assert len([request for request in m.request_history if "action=torrent" in request.url]) == 1
+
+    injector_mock.inject_torrent.assert_called_once()
+    assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 2" in captured.out
+
+  def test_follows_a_concurrent_scan_of_the_same_torrent(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    source_infohash = calculate_infohash_from_file("/tmp/input/red_source.torrent")
+    flight, _ = SOURCE_TORRENT_FLIGHTS.join(source_infohash)
+    reports = []
+
+    with requests_mock.Mocker() as m:
+      thread = threading.Thread(
+        target=lambda: reports.append(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      )
+      thread.start()
+      wait_for_follower(flight)
+      SOURCE_TORRENT_FLIGHTS.land(source_infohash, result=(OpsTracker, "/tmp/output/OPS/foo [OPS].torrent", False))
+      thread.join(5)
+
+      assert m.call_count == 0
+
+    assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 1" in reports[0]
+
+  def test_reports_torrents_injected_with_the_final_batch(self, capsys, red_api, ops_api):
+    injector_mock = mock_injector(batch_size=10)
+    injector_mock.inject_torrent.side_effect = TorrentExistsInClientError("Torrent exists in client")
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock))
+      captured = capsys.readouterr()
+
+    injector_mock.queue_torrent.assert_called_once()
+    injector_mock.flush.assert_called_once()
+    assert f"{Fore.LIGHTYELLOW_EX}Torrent exists in client{Fore.RESET}" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 1" in captured.out
+
+  def test_skips_tracker_lookups_for_torrents_already_in_client(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = mock_injector()
+    injector_mock.snapshot.return_value.__enter__.return_value = {"2aee440cdc7429b3e4a7e4d20e3839dbb48d72c2": {}}
+
+    with requests_mock.Mocker() as m:
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock))
+      captured = capsys.readouterr()
+
+      assert m.call_count == 0
+
+    assert "New torrent already exists in client (2aee440cdc7429b3e4a7e4d20e3839dbb48d72c2)" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 1" in captured.out
+    injector_mock.inject_torrent.assert_not_called()
+
+  def test_injects_within_a_client_snapshot(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    snapshot = MagicMock()
+    injector_mock = mock_injector()
+    injector_mock.snapshot.return_value = snapshot
+    snapshot_open_during_injection = []
+    injector_mock.inject_torrent.side_effect = lambda *_: snapshot_open_during_injection.append(
+      snapshot.__enter__.called and not snapshot.__exit__.called
+    )
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock)
+
+    assert snapshot_open_during_injection == [True]
+    snapshot.__exit__.assert_called_once()
+
   def test_doesnt_blow_up_if_other_torrent_name_has_bad_encoding(self, red_api, ops_api):
     copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
     copy_and_mkdir(get_torrent_path("broken_name"), "/tmp/input/broken_name.torrent")
@@ -339,3 +683,218 @@ class TestScanTorrentDirectory(SetupTeardown):
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
       scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+
+
+class TestIncrementalScanTorrentDirectory(SetupTeardown):
+  def test_closes_the_state_database(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+
+    with patch.object(Database, "close", autospec=True, side_effect=Database.close) as close:
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+
+    assert [database.filepath for (database,), _ in close.call_args_list] == ["/tmp/output/.fertilizer/state.db"]
+
+  def test_records_outcomes_in_the_ledger(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+
+    scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    entry = ScanLedger(Database.for_directory("/tmp/output")).entries()["/tmp/input/no_source.torrent"]
+
+    assert entry.outcome == "skipped"
+    assert entry.infohash is not None
+
+  def test_skips_unchanged_torrents_with_final_outcomes(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+      capsys.readouterr()
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, incremental=True))
+      captured = capsys.readouterr()
+
+      assert m.call_count == 2
+      assert "red_source.torrent" not in captured.out
+      assert f"{Fore.LIGHTBLACK_EX}Unchanged since last scan{Fore.RESET}: 1" in captured.out
+
+  def test_starts_no_worker_processes_if_nothing_has_to_be_read(self, capsys, monkeypatch, red_api, ops_api):
+    monkeypatch.setattr("fertilizer.scanner.PARALLEL_HASHING_THRESHOLD", 0)
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+
+    with requests_mock.Mocker() as m, patch("fertilizer.scanner._process_pool", side_effect=_process_pool) as pool:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+      capsys.readouterr()
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, jobs=2, incremental=True))
+      captured = capsys.readouterr()
+
+      pool.assert_not_called()
+
+      copy_and_mkdir(get_torrent_path("broken"), "/tmp/input/broken.torrent")
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, jobs=2, incremental=True)
+
+      pool.assert_called_once_with(2)
+
+    assert f"{Fore.LIGHTBLACK_EX}Unchanged since last scan{Fore.RESET}: 2" in captured.out
+
+  def test_injects_torrents_generated_by_a_scan_without_injection(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = mock_injector()
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incremental=True)
+      injector_mock.inject_torrent.assert_called_once()
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incremental=True))
+      captured = capsys.readouterr()
+
+    injector_mock.inject_torrent.assert_called_once()
+    assert f"{Fore.LIGHTBLACK_EX}Unchanged since last scan{Fore.RESET}: 1" in captured.out
+
+  def test_rescans_unchanged_torrents_if_not_incremental(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+
+    scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.LIGHTBLACK_EX}Skipped{Fore.RESET}: 1" in captured.out
+    assert f"{Fore.LIGHTBLACK_EX}Unchanged since last scan{Fore.RESET}: 0" in captured.out
+
+  def test_retries_errors(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("broken"), "/tmp/input/broken.torrent")
+
+    scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, incremental=True))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
+  def test_rechecks_not_found_torrents_once_old_enough(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+      lookups = m.call_count
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, incremental=True)
+      assert m.call_count == lookups
+
+      scan_torrent_directory(
+        "/tmp/input", "/tmp/output", red_api, ops_api, None, incremental=True, not_found_recheck_age=0
+      )
+      assert m.call_count == lookups * 2
+
+  def test_rescans_changed_torrents(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/foo.torrent")
+    scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+
+    shutil.copy(get_torrent_path("broken"), "/tmp/input/foo.torrent")
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, incremental=True))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
+
+class TestIncompleteSources(SetupTeardown):
+  RED_SOURCE_INFOHASH = "f15a59b9620fbf4cb06407c10399607367d9204d"
+
+  def build_injector(self, *snapshots):
+    injector_mock = mock_injector()
+    snapshot = dict(snapshots[0])
+    injector_mock.snapshot.return_value.__enter__.return_value = snapshot
+    injector_mock.refresh_snapshot.side_effect = lambda: snapshot.update(snapshots[1])
+    return injector_mock
+
+  def test_scans_incomplete_sources_by_default(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = self.build_injector({})
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock)
+
+    injector_mock.inject_torrent.assert_called_once()
+
+  def test_skips_incomplete_sources_before_tracker_lookups(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = self.build_injector({self.RED_SOURCE_INFOHASH: {"complete": False}})
+
+    with requests_mock.Mocker() as m:
+      print(
+        scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incomplete_sources="skip")
+      )
+      captured = capsys.readouterr()
+
+      assert m.call_count == 0
+
+    assert f"{Fore.LIGHTMAGENTA_EX}Source torrent is not complete in your torrent client.{Fore.RESET}" in captured.out
+    assert f"{Fore.LIGHTMAGENTA_EX}Incomplete in client{Fore.RESET}: 1" in captured.out
+    injector_mock.inject_torrent.assert_not_called()
+
+  def test_skips_sources_missing_from_client(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = self.build_injector({})
+
+    print(
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incomplete_sources="skip")
+    )
+    captured = capsys.readouterr()
+
+    assert f"{Fore.LIGHTMAGENTA_EX}Source torrent was not found in your torrent client.{Fore.RESET}" in captured.out
+
+  def test_deferred_sources_are_scanned_if_they_complete_during_the_scan(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = self.build_injector(
+      {self.RED_SOURCE_INFOHASH: {"complete": False}}, {self.RED_SOURCE_INFOHASH: {"complete": True}}
+    )
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(
+        scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incomplete_sources="defer")
+      )
+      captured = capsys.readouterr()
+
+    injector_mock.refresh_snapshot.assert_called_once()
+    injector_mock.inject_torrent.assert_called_once()
+    assert f"{Fore.LIGHTMAGENTA_EX}Incomplete in client{Fore.RESET}: 0" in captured.out
+
+  def test_deferred_sources_are_reported_if_still_incomplete(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector_mock = self.build_injector({self.RED_SOURCE_INFOHASH: {"complete": False}}, {})
+
+    with requests_mock.Mocker() as m:
+      print(
+        scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector_mock, incomplete_sources="defer")
+      )
+      captured = capsys.readouterr()
+
+      assert m.call_count == 0
+
+    assert f"{Fore.LIGHTMAGENTA_EX}Incomplete in client{Fore.RESET}: 1" in captured.out
+    entry = ScanLedger(Database.for_directory("/tmp/output")).entries()["/tmp/input/red_source.torrent"]
+    assert entry.outcome == "incomplete"
+
+
+class TestProcessPool(SetupTeardown):
+  def test_doesnt_fork_worker_processes_from_a_threaded_process(self):
+    with _process_pool(1) as pool:
+      assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+      assert pool.submit(_calculate_reciprocal_hashes_without_data, get_torrent_path("red_source")).result(30)
@@ -0,0 +1,136 @@
+import threading
+from time import sleep, time
+
+import pytest
+
+from .helpers import SetupTeardown
+
+from fertilizer.singleflight import SingleFlight
+
+
+def wait_until(predicate):
+  deadline = time() + 5
+  while not predicate() and time() < deadline:
+    sleep(0.01)
+
+
+class TestSingleFlight(SetupTeardown):
+  def test_runs_func_and_returns_its_result(self):
+    assert SingleFlight().do("key", lambda a, b: a + b, 1, 2) == 3
+
+  def test_shares_the_result_among_concurrent_callers(self):
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work():
+      calls.append(1)
+      release.wait(5)
+      return "result"
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", work))) for _ in range(3)]
+    threads[0].start()
+    wait_until(lambda: calls)
+
+    for thread in threads[1:]:
+      thread.start()
+    flight, _ = flights.join("key")
+    wait_until(lambda: flight.followers >= 3)
+
+    release.set()
+    for thread in threads:
+      thread.join(5)
+
+    assert calls == [1]
+    assert results == ["result", "result", "result"]
+
+  def test_shares_the_error_among_concurrent_callers(self):
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    errors = []
+
+    def follow():
+      try:
+        flights.do("key", lambda: "not called")
+      except ValueError as e:
+        errors.append(e)
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    wait_until(lambda: flight.followers)
+
+    error = ValueError("nope")
+    flights.land("key", error=error)
+    thread.join(5)
+
+    assert errors == [error]
+
+  def test_raises_the_error_of_its_own_call(self):
+    def fail():
+      raise ValueError("nope")
+
+    with pytest.raises(ValueError, match="nope"):
+      SingleFlight().do("key", fail)
+
+  def test_starts_a_new_flight_once_landed(self):
+    flights = SingleFlight()
+    calls = []
+
+    flights.do("key", calls.append, 1)
+    flights.do("key", calls.append, 2)
+
+    assert calls == [1, 2]
+
+  def test_keeps_keys_apart(self):
+    flights = SingleFlight()
+
+    first_flight, first_leads = flights.join("first")
+    second_flight, second_leads = flights.join("second")
+
+    assert first_leads and second_leads
+    assert first_flight is not second_flight
+
+  def test_followers_of_an_abandoned_flight_do_the_work_themselves(self):
+    flights = SingleFlight()
+    flights.join("key")
+    results = []
+
+    thread = threading.Thread(target=lambda: results.append(flights.do("key", lambda: "own result")))
+    thread.start()
+    flight, _ = flights.join("key")
+    wait_until(lambda: flight.followers >= 2)
+
+    flights.land("key", abandoned=True)
+    thread.join(5)
+
+    assert results == ["own result"]
+
+
+class TestFlight(SetupTeardown):
+  def test_calls_callbacks_once_landed(self):
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    landed = []
+
+    flight.on_land(lambda flight: landed.append(flight.result))
+    assert landed == []
+
+    flights.land("key", result="result")
+    assert landed == ["result"]
+
+  def test_calls_callbacks_right_away_if_already_landed(self):
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    flights.land("key", error=ValueError("nope"))
+    landed = []
+
+    flight.on_land(lambda flight: landed.append(str(flight.error)))
+
+    assert landed == ["nope"]
+
+  def test_times_out_waiting(self):
+    flight, _ = SingleFlight().join("key")
+
+    with pytest.raises(TimeoutError):
+      flight.wait(0.01)
@@ -2,13 +2,20 @@ import os
 import re
 import pytest
 import requests_mock
+from unittest import mock
 
 from .helpers import get_torrent_path, SetupTeardown, copy_and_mkdir
 
-from fertilizer.trackers import RedTracker
+from fertilizer.trackers import OpsTracker, RedTracker
 from fertilizer.parser import get_bencoded_data
-from fertilizer.errors import TorrentAlreadyExistsError, TorrentDecodingError, UnknownTrackerError, TorrentNotFoundError
-from fertilizer.torrent import generate_new_torrent_from_file
+from fertilizer.errors import (
+  TorrentAlreadyExistsError,
+  TorrentDecodingError,
+  UnknownTrackerError,
+  TorrentNotFoundError,
+  TorrentExistsInClientError,
+)
+from fertilizer.torrent import calculate_reciprocal_hashes, generate_new_torrent_from_file
 
 
 class TestGenerateNewTorrentFromFile(SetupTeardown):
@@ -162,6 +169,30 @@ class TestGenerateNewTorrentFromFile(SetupTeardown):
 
     assert previously_generated
 
+  def test_raises_error_without_api_calls_if_infohash_found_in_client(self, red_api, ops_api):
+    # The client knows the torrent by its "APL" source variant
+    client_hashes = {"84508469124335bde03043105c6e54e00c17b04c"}
+
+    with requests_mock.Mocker() as m:
+      with pytest.raises(TorrentExistsInClientError) as excinfo:
+        torrent_path = get_torrent_path("red_source")
+        generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api, {}, {}, client_hashes)
+
+      assert str(excinfo.value) == "New torrent already exists in client (84508469124335bde03043105c6e54e00c17b04c)"
+      assert m.call_count == 0
+
+  def test_prefers_output_torrents_over_client_matches(self, red_api, ops_api):
+    output_hashes = {"2AEE440CDC7429B3E4A7E4D20E3839DBB48D72C2": "bar"}
+    client_hashes = {"2aee440cdc7429b3e4a7e4d20e3839dbb48d72c2"}
+
+    torrent_path = get_torrent_path("red_source")
+    _, filepath, previously_generated = generate_new_torrent_from_file(
+      torrent_path, "/tmp", red_api, ops_api, {}, output_hashes, client_hashes
+    )
+
+    assert filepath == "bar"
+    assert previously_generated
+
   def test_returns_appropriately_if_torrent_already_exists(self, red_api, ops_api):
     torrent_path = get_torrent_path("red_source")
     copy_and_mkdir(torrent_path, "/tmp/OPS/foo [OPS].torrent")
@@ -202,3 +233,18 @@ class TestGenerateNewTorrentFromFile(SetupTeardown):
       generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api)
 
     assert str(excinfo.value) == "Error decoding torrent file"
+
+
+class TestCalculateReciprocalHashes(SetupTeardown):
+  def test_reads_the_torrent_file_once(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with mock.patch("builtins.open", wraps=open) as open_mock:
+      source_torrent_data, new_tracker, all_possible_hashes = calculate_reciprocal_hashes(
+        "/tmp/input/red_source.torrent"
+      )
+
+    open_mock.assert_called_once_with("/tmp/input/red_source.torrent", "rb")
+    assert source_torrent_data[b"info"][b"source"] == b"RED"
+    assert new_tracker == OpsTracker
+    assert all_possible_hashes
@@ -1,11 +1,17 @@
+import json
 import re
 import os
+import threading
 import pytest
 import requests_mock
+from unittest import mock
 
 from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
 
-from fertilizer.webserver import app as webserver_app
+from fertilizer.errors import TorrentAlreadyExistsError
+from fertilizer.index import InfohashIndex, ResidentInfohashIndex
+from fertilizer.jobs import JobQueue
+from fertilizer.webserver import app as webserver_app, run_webserver
 
 
 @pytest.fixture()
@@ -17,11 +23,15 @@ def app(red_api, ops_api):
       "red_api": red_api,
       "ops_api": ops_api,
       "injector": None,
+      "output_infohashes": None,
+      "jobs": JobQueue(1),
     }
   )
 
   yield webserver_app
 
+  webserver_app.config["jobs"].shutdown()
+
 
 @pytest.fixture()
 def client(app):
@@ -33,6 +43,16 @@ def infohash():
   return "0beec7b5ea3f0fdbc95d0dd47f3c5bc275da8a33"
 
 
+def run_webhook(client, data):
+  queued_response = client.post("/api/webhook", data=data)
+  assert queued_response.status_code == 202
+
+  response = client.get(f"/api/jobs/{queued_response.json['job']['id']}?wait=10")
+  body = {key: value for key, value in response.json.items() if key != "job"}
+
+  return response, body
+
+
 class TestWebserverNotFound(SetupTeardown):
   def test_returns_not_found(self, client):
     response = client.get("/api/does-not-exist")
@@ -69,9 +89,9 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response, body = run_webhook(client, {"infohash": infohash})
       assert response.status_code == 201
-      assert response.json == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
+      assert body == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
       assert os.path.exists("/tmp/output/OPS/foo [OPS].torrent")
 
   def test_returns_okay_if_torrent_already_found(self, client, infohash):
@@ -82,9 +102,30 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response, body = run_webhook(client, {"infohash": infohash})
       assert response.status_code == 201
-      assert response.json == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
+      assert body == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
+
+  def test_uses_and_updates_the_resident_output_index(self, app, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    output_infohashes = ResidentInfohashIndex(InfohashIndex("/tmp/output"))
+    output_infohashes.reconcile()
+    app.config["output_infohashes"] = output_infohashes
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      with mock.patch.object(InfohashIndex, "refresh") as refresh_mock:
+        first_response, _ = run_webhook(client, {"infohash": infohash})
+        _, second_body = run_webhook(client, {"infohash": infohash})
+
+      assert m.call_count == 2
+
+    refresh_mock.assert_not_called()
+    assert first_response.status_code == 201
+    assert second_body == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
+    assert output_infohashes["2AEE440CDC7429B3E4A7E4D20E3839DBB48D72C2"] == "/tmp/output/OPS/foo [OPS].torrent"
 
   def test_raises_error_if_torrent_not_found(self, client, infohash):
     copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
@@ -93,9 +134,9 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response, body = run_webhook(client, {"infohash": infohash})
       assert response.status_code == 404
-      assert response.json == {"status": "error", "message": "Torrent could not be found on OPS"}
+      assert body == {"status": "error", "message": "Torrent could not be found on OPS"}
 
   def test_raises_error_if_unknown_error(self, client, infohash):
     copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
@@ -104,6 +145,193 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_UNKNOWN_BAD_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response, body = run_webhook(client, {"infohash": infohash})
       assert response.status_code == 500
-      assert response.json == {"status": "error", "message": "An unknown error occurred in the API response from OPS"}
+      assert body == {"status": "error", "message": "An unknown error occurred in the API response from OPS"}
+
+
+class TestWebserverJobs(SetupTeardown):
+  def test_queues_webhook_and_returns_right_away(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    release = threading.Event()
+
+    def slow_scan(*_args, **_kwargs):
+      release.wait(5)
+      return "/tmp/output/OPS/foo [OPS].torrent"
+
+    with mock.patch("fertilizer.webserver.scan_torrent_file", side_effect=slow_scan):
+      queued_response = client.post("/api/webhook", data={"infohash": infohash})
+      job_id = queued_response.json["job"]["id"]
+      pending_response = client.get(f"/api/jobs/{job_id}")
+
+      release.set()
+      finished_response = client.get(f"/api/jobs/{job_id}?wait=5")
+
+    assert queued_response.status_code == 202
+    assert queued_response.headers["Location"] == f"/api/jobs/{job_id}"
+    assert queued_response.json["message"] == "Job queued"
+    assert pending_response.status_code == 202
+    assert pending_response.json["job"]["status"] in ("queued", "running")
+    assert finished_response.status_code == 201
+    assert finished_response.json["message"] == "/tmp/output/OPS/foo [OPS].torrent"
+    assert finished_response.json["job"]["status"] == "finished"
+
+  def test_rejects_webhook_when_job_queue_is_full(self, app, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    app.config["jobs"] = JobQueue(1, max_pending=1)
+    release = threading.Event()
+
+    with mock.patch("fertilizer.webserver.scan_torrent_file", side_effect=lambda *_args, **_kwargs: release.wait(5)):
+      first_response = client.post("/api/webhook", data={"infohash": infohash})
+      second_response = client.post("/api/webhook", data={"infohash": infohash})
+      release.set()
+
+    assert first_response.status_code == 202
+    assert second_response.status_code == 503
+    assert second_response.json == {
+      "status": "error",
+      "message": "Too many queued jobs (limit is 1), try again later",
+    }
+
+  def test_returns_not_found_for_unknown_job(self, client):
+    response = client.get("/api/jobs/does-not-exist")
+
+    assert response.status_code == 404
+    assert response.json == {"status": "error", "message": "No job found with id does-not-exist"}
+
+  def test_rejects_invalid_wait(self, app, client):
+    job = app.config["jobs"].submit(lambda: ({"status": "success", "message": "done"}, 201))
+
+    responses = [
+      client.get(f"/api/jobs/{job.id}?wait=soon"),
+      client.get(f"/api/jobs/{job.id}?wait=-1"),
+      client.get(f"/api/jobs/{job.id}?wait=301"),
+    ]
+
+    assert [response.status_code for response in responses] == [400, 400, 400]
+    assert responses[0].json == {"status": "error", "message": "Invalid wait: Must be a number of seconds"}
+    assert responses[1].json == {"status": "error", "message": "Invalid wait: Must be between 0 and 300 seconds"}
+
+
+class TestWebserverBatchWebhook(SetupTeardown):
+  def test_requires_list_of_infohashes(self, client):
+    responses = [
+      client.post("/api/webhook/batch", json={"infohashes": "abc"}),
+      client.post("/api/webhook/batch", json=42),
+    ]
+
+    for response in responses:
+      assert response.status_code == 400
+      assert response.json == {"status": "error", "message": "Request must include a list of infohashes"}
+
+  def test_requires_at_least_one_infohash(self, client):
+    responses = [
+      client.post("/api/webhook/batch", json=[]),
+      client.post("/api/webhook/batch", data="\n \n"),
+    ]
+
+    for response in responses:
+      assert response.status_code == 400
+      assert response.json == {"status": "error", "message": "Request must include at least one infohash"}
+
+  def test_streams_a_result_per_unique_infohash(self, client, infohash):
+    other_infohash = "62cdb7020ff920e5aa642c3d4066950dd1f01f4d"
+    missing_infohash = "f" * 40
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{other_infohash}.torrent")
+
+    def scan(filepath, *_args, **_kwargs):
+      if other_infohash in filepath:
+        raise TorrentAlreadyExistsError("Torrent already exists in output directory at foo")
+      return f"/tmp/output/{os.path.basename(filepath)}"
+
+    with mock.patch("fertilizer.webserver.scan_torrent_file", side_effect=scan) as scan_mock:
+      response = client.post(
+        "/api/webhook/batch",
+        json={"infohashes": [infohash, "abc", other_infohash, infohash, missing_infohash]},
+      )
+      results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert scan_mock.call_count == 2
+    assert sorted(results, key=lambda result: result["infohash"]) == [
+      {
+        "infohash": infohash,
+        "status": "success",
+        "message": f"/tmp/output/{infohash}.torrent",
+        "code": 201,
+      },
+      {
+        "infohash": other_infohash,
+        "status": "error",
+        "message": "Torrent already exists in output directory at foo",
+        "code": 409,
+      },
+      {"infohash": "abc", "status": "error", "message": "Invalid infohash", "code": 400},
+      {
+        "infohash": missing_infohash,
+        "status": "error",
+        "message": f"No torrent found at /tmp/input/{missing_infohash}.torrent",
+        "code": 404,
+      },
+    ]
+
+  def test_accepts_newline_delimited_and_form_bodies(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+
+    with mock.patch("fertilizer.webserver.scan_torrent_file", return_value="/tmp/output/foo.torrent"):
+      responses = [
+        client.post("/api/webhook/batch", data=f"{infohash}\r\n\n{infohash}\n", content_type="text/plain"),
+        client.post("/api/webhook/batch", data={"infohash": [infohash, infohash]}),
+      ]
+
+      for response in responses:
+        assert response.status_code == 200
+        assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == [
+          {"infohash": infohash, "status": "success", "message": "/tmp/output/foo.torrent", "code": 201}
+        ]
+
+  def test_generates_new_torrent_files(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      response = client.post("/api/webhook/batch", data=infohash)
+      results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert results == [
+      {"infohash": infohash, "status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent", "code": 201}
+    ]
+    assert os.path.exists("/tmp/output/OPS/foo [OPS].torrent")
+
+
+class TestRunWebserver(SetupTeardown):
+  def test_serves_with_pooled_server_and_drains_on_shutdown(self, red_api, ops_api):
+    calls = []
+
+    with mock.patch("fertilizer.webserver.PooledWSGIServer") as server_class:
+      server = server_class.return_value
+      server.port = 9713
+      server.serve_forever.side_effect = lambda: calls.append("serve")
+      server.drain.side_effect = lambda: calls.append("drain")
+
+      with mock.patch.object(JobQueue, "shutdown", side_effect=lambda wait: calls.append(("jobs", wait))):
+        run_webserver(
+          "/tmp/input",
+          "/tmp/output",
+          red_api,
+          ops_api,
+          None,
+          port="9713",
+          server_workers=4,
+          server_queue_size=16,
+          server_timeout=10,
+        )
+
+    server_class.assert_called_once_with(
+      "0.0.0.0", 9713, webserver_app, workers=4, queue_size=16, connection_timeout=10
+    )
+    assert calls == ["serve", "drain", ("jobs", True)]